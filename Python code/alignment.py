@@ -0,0 +1,174 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from run_loader import load_run, TIME_COLUMN, FORCE_COLUMN, VELOCITY_COLUMN
+from run_archive import expand_paths
+
+METHODS = ('linear', 'nearest', 'asof', 'mean')
+DEFAULT_METHOD = 'linear'
+CHANNEL_METHODS = {VELOCITY_COLUMN: 'asof'}  # The PLC velocity holds until the next value arrives
+TOLERANCE_PERIODS = 2.5  # Default tolerance in median sample periods of the source channel
+CHUNK_SAMPLES = 500000  # Target times per chunk, bounds the memory of long recordings
+ALIGNED_DIR = 'aligned'  # Default output folder of the CLI, next to the runs
+
+
+def align_channel(times, values, targets, method=DEFAULT_METHOD, tolerance=None, width=None):
+    """Values of one channel at the target times, NaN where no sample is close enough.
+
+    linear interpolates between the samples around a target if both are
+    within `tolerance` s of it, nearest takes the closest sample and asof
+    the last sample at or before the target, both within `tolerance`. mean
+    averages the samples in a bin of `width` s centered on each target, for
+    resampling a fast channel onto a slower grid. Sample times must be sorted.
+    """
+    result = np.full(len(targets), np.nan)
+    n = len(times)
+    if not n or not len(targets):
+        return result
+    if method == 'mean':
+        # Prefix sums, so every bin is two lookups
+        cumsum = np.concatenate([[0.0], np.cumsum(values, dtype=float)])
+        first = np.searchsorted(times, targets - width / 2)
+        last = np.searchsorted(times, targets + width / 2)
+        filled = last > first
+        result[filled] = (cumsum[last[filled]] - cumsum[first[filled]]) / (last[filled] - first[filled])
+        return result
+
+    tolerance = np.inf if tolerance is None else tolerance
+    right = np.searchsorted(times, targets, side='right')
+    left = right - 1
+    left_index = np.maximum(left, 0)
+    right_index = np.minimum(right, n - 1)
+    left_gap = np.where(left >= 0, targets - times[left_index], np.inf)
+    right_gap = np.where(right < n, times[right_index] - targets, np.inf)
+    if method == 'asof':
+        valid = left_gap <= tolerance
+        result[valid] = values[left_index[valid]]
+    elif method == 'nearest':
+        index = np.where(right_gap < left_gap, right_index, left_index)
+        valid = np.minimum(left_gap, right_gap) <= tolerance
+        result[valid] = values[index[valid]]
+    elif method == 'linear':
+        # A target on a sample needs no right neighbor, e.g. the last sample of a channel
+        valid = ((left_gap <= tolerance) & (right_gap <= tolerance)) | (left_gap == 0)
+        result[valid] = np.interp(targets[valid], times, values)
+    else:
+        raise ValueError(f"Unknown alignment method: {method}")
+    return result
+
+
+def default_tolerance(times):
+    if len(times) < 2:
+        return np.inf
+    return TOLERANCE_PERIODS * float(np.median(np.diff(times)))
+
+
+class Alignment:
+    """Channels of a run on one timeline: the samples of a channel (`on`) or a uniform grid (`rate` Hz).
+
+    `methods` and `tolerance` map column names to a method and a tolerance
+    in s, channels not in them use CHANNEL_METHODS / DEFAULT_METHOD and
+    TOLERANCE_PERIODS median sample periods. chunks() yields the aligned
+    table CHUNK_SAMPLES rows at a time, each chunk reads only the source
+    samples around its time range.
+    """
+
+    def __init__(self, run, on=FORCE_COLUMN, rate=None, columns=None, methods=None, tolerance=None, start=None, end=None):
+        self.run = run
+        self.columns = [column for column in (columns or run.channels) if run.has(column)]
+        self.methods = {column: (methods or {}).get(column, CHANNEL_METHODS.get(column, DEFAULT_METHOD)) for column in self.columns}
+        tolerance = tolerance if isinstance(tolerance, dict) else dict.fromkeys(self.columns, tolerance)
+        self.tolerance = {column: default_tolerance(run.times(column)) if tolerance.get(column) is None else tolerance[column]
+                          for column in self.columns}
+        self.rate = rate
+        if rate is None:
+            if 'mean' in self.methods.values():
+                raise ValueError("The mean method needs a uniform grid (rate)")
+            on_times = run.times(on)
+            first = np.searchsorted(on_times, start) if start is not None else 0
+            last = np.searchsorted(on_times, end, side='right') if end is not None else len(on_times)
+            self.on_times = on_times[first:last]
+            self.size = len(self.on_times)
+        else:
+            channel_times = [run.times(column) for column in self.columns if len(run.times(column))]
+            self.start = start if start is not None else min(times[0] for times in channel_times)
+            end = end if end is not None else max(times[-1] for times in channel_times)
+            self.size = int(np.floor((end - self.start) * rate)) + 1 if end >= self.start else 0
+
+    def targets(self, first, last):
+        if self.rate is None:
+            return self.on_times[first:last]
+        return self.start + np.arange(first, last) / self.rate
+
+    def align(self, column, targets):
+        times, values = self.run.times(column), self.run.values(column)
+        method = self.methods[column]
+        width = 1 / self.rate if self.rate else None
+        margin = width / 2 if method == 'mean' else self.tolerance[column]
+        first, last = 0, len(times)
+        if np.isfinite(margin):
+            # Source samples of this chunk plus one on each side for interpolation
+            first = max(int(np.searchsorted(times, targets[0] - margin)) - 1, 0)
+            last = int(np.searchsorted(times, targets[-1] + margin, side='right')) + 1
+        return align_channel(times[first:last], values[first:last], targets, method, self.tolerance[column], width)
+
+    def chunks(self, chunk_size=CHUNK_SAMPLES):
+        for first in range(0, self.size, chunk_size):
+            targets = self.targets(first, min(first + chunk_size, self.size))
+            yield pd.DataFrame({TIME_COLUMN: targets, **{column: self.align(column, targets) for column in self.columns}})
+
+    def frame(self):
+        chunks = list(self.chunks())
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=[TIME_COLUMN] + self.columns)
+
+
+def aligned(run, on=FORCE_COLUMN, rate=None, columns=None, methods=None, tolerance=None, start=None, end=None):
+    """All channels of a run as one table without blank cells, see Alignment."""
+    return Alignment(run, on, rate, columns, methods, tolerance, start, end).frame()
+
+
+def write_aligned(path, output_dir=None, on=FORCE_COLUMN, rate=None, methods=None, tolerance=None):
+    """Write the aligned table of one run as CSV chunk by chunk, return (output path, rows, coverage per column)."""
+    run = load_run(path)
+    alignment = Alignment(run, on, rate, methods=methods, tolerance=tolerance)
+    name = os.path.splitext(os.path.basename(path.rstrip(os.sep)))[0]
+    # Not next to the runs, where it would be taken for a run by the other scripts
+    output_dir = output_dir or os.path.join(os.path.dirname(os.path.abspath(path.rstrip(os.sep))), ALIGNED_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    output = os.path.join(output_dir, f'{name}_aligned.csv')
+    rows = 0
+    filled = dict.fromkeys(alignment.columns, 0)
+    with open(output, 'w', newline='', encoding='utf-8') as f:
+        for i, chunk in enumerate(alignment.chunks()):
+            chunk.to_csv(f, header=i == 0, index=False)
+            rows += len(chunk)
+            for column in alignment.columns:
+                filled[column] += int(chunk[column].notna().sum())
+    return output, rows, {column: count / rows if rows else np.nan for column, count in filled.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Put all channels of logged runs on one timeline and save them as CSV without blank cells.")
+    parser.add_argument('paths', nargs='+', help="Directories, CSV files, .run directories or glob patterns")
+    timeline = parser.add_mutually_exclusive_group()
+    timeline.add_argument('--on', default=FORCE_COLUMN, help="Channel whose sample times are the timeline (the force by default)")
+    timeline.add_argument('--rate', type=float, default=None, help="Uniform time grid in Hz instead of the samples of a channel")
+    parser.add_argument('--method', nargs=2, action='append', metavar=('COLUMN', 'METHOD'), default=[],
+                        help=f"Alignment method of a channel ({', '.join(METHODS)}), e.g. --method 'Temperatura Ch1 (°C)' nearest")
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help=f"Largest distance in s to a source sample (by default {TOLERANCE_PERIODS} sample periods of each channel)")
+    parser.add_argument('-o', '--output-dir', default=None, help=f"Directory for the aligned CSV files (an '{ALIGNED_DIR}' folder next to the runs by default)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    for column, method in args.method:
+        if method not in METHODS:
+            parser.error(f"Unknown method {method}, use one of {', '.join(METHODS)}")
+    runs = expand_paths(args.paths)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(write_aligned, run, args.output_dir, args.on, args.rate, dict(args.method), args.tolerance) for run in runs]
+        for future in futures:
+            output, rows, coverage = future.result()
+            print(f"{output}: {rows} rows, " + ', '.join(f"{column} {fraction:.0%}" for column, fraction in coverage.items()))
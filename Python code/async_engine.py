@@ -0,0 +1,129 @@
+import asyncio
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from stream_framing import FloatFrameReader
+
+
+class AsyncLoggerEngine:
+    """Event-driven variant of the logger threads on one asyncio loop.
+
+    The PLC control channel, the shear velocity channel and the force send
+    channel are asyncio streams, so start/stop signals and velocity values are
+    handled as soon as they arrive instead of being polled. Blocking NetFT and
+    TC-08 calls run in one executor thread per device, CSV logging of the
+    force buffer stays in its own thread. `logger` is drilling_logger, set up
+    by the logger script (regulation or constant_shear_velocity), whose signal
+    handlers, buffers and CSV state are reused as-is.
+    """
+
+    def __init__(self, logger, source, nula, streaming=False, continuous=False):
+        self.logger = logger
+        self.source = source
+        self.nula = nula
+        self.streaming = streaming
+        self.continuous = continuous
+        self.sensor_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='netft')
+        self.temperature_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tc08')
+
+    async def acquire_force(self):
+        loop = asyncio.get_running_loop()
+        scheduler = self.logger.schedulers.get('force')
+        while self.logger.running:
+            if self.streaming:
+                await loop.run_in_executor(self.sensor_executor, self.logger.read_axial_force_batch, self.source, self.nula)
+            else:
+                await loop.run_in_executor(self.sensor_executor, self.logger.read_axial_force, self.source, self.nula)
+                await scheduler.wait_async()
+
+    async def log_temperature(self):
+        loop = asyncio.get_running_loop()
+        scheduler = self.logger.schedulers['temperature']
+        while self.logger.running:
+            await loop.run_in_executor(self.temperature_executor, self.logger.log_temperature_sample)
+            await scheduler.wait_async()
+
+    async def plc_control(self, reader):
+        while self.logger.running:
+            data = await reader.readexactly(2)
+            if data == b'\x01\x00':  # Receiving TRUE signal
+                self.logger.start_logging()
+            elif data in getattr(self.logger.mode, 'PHASE_SIGNALS', {}):  # Interval drilling phase words
+                self.logger.mode.mark_phase_signal(data)
+            elif data == b'\x00\x00':  # Receiving FALSE signal
+                self.logger.mark_stop_signal()
+                # Post-stop tail for more temperature measurements, the other channels keep running
+                await asyncio.sleep(self.logger.POST_STOP_LOGGING_TIME)
+                await asyncio.get_running_loop().run_in_executor(None, self.logger.stop_logging)
+
+    async def send_force(self, writer):
+        buffer = self.logger.force_buffer
+        scheduler = self.logger.schedulers['plc']
+        while buffer.next_seq == 0:
+            await asyncio.sleep(0.01)
+        while self.logger.running:
+            timestamp, Z_sila, seq = buffer.latest()
+            pack_ns = time.time_ns()
+            writer.write(struct.pack('>f', Z_sila))
+            await writer.drain()
+            self.logger.plc_latency.record(int(timestamp * 1e9), pack_ns, time.time_ns())
+            await scheduler.wait_async()
+
+    async def receive_velocity(self, reader):
+        velocity_reader = FloatFrameReader()
+        while self.logger.running:
+            data = await reader.read(4096)
+            if not data:
+                raise ConnectionError("Velocity connection closed by the PLC")
+            timestamps, values = velocity_reader.feed(data)
+            self.logger.mode.log_shear_velocity_values(timestamps, values)
+
+    async def run(self):
+        logger = self.logger
+        force_reader, force_writer = await asyncio.open_connection(logger.SERVER_HOST, logger.PORT_FORCE)
+        print(f'Connected to server {logger.SERVER_HOST}:{logger.PORT_FORCE}')
+        tasks = [
+            self.acquire_force(),
+            self.log_temperature(),
+            self.plc_control(force_reader),
+            self.send_force(force_writer),
+        ]
+        if hasattr(logger.mode, 'PORT_VELOCITY'):
+            velocity_reader, velocity_writer = await asyncio.open_connection(logger.SERVER_HOST, logger.mode.PORT_VELOCITY)
+            print(f'Connected to server {logger.SERVER_HOST}:{logger.mode.PORT_VELOCITY}')
+            tasks.append(self.receive_velocity(velocity_reader))
+
+        # Disk I/O of the force samples stays off the event loop
+        threading.Thread(target=logger.log_axial_force, daemon=True).start()
+        if logger.breakthrough_detector is not None:
+            threading.Thread(target=logger.detect_breakthrough, daemon=True).start()
+        if self.continuous:
+            threading.Thread(target=logger.print_axial_force, daemon=True).start()
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            force_writer.close()
+
+    def shutdown(self):
+        self.logger.running = False
+        self.sensor_executor.shutdown(wait=True)
+        self.temperature_executor.shutdown(wait=True)
+        if self.streaming:
+            self.source.stop()
+        self.logger.finalize_csv_logging()
+        self.logger.shutdown()
+
+
+def run(logger, source, nula, streaming=False, continuous=False):
+    engine = AsyncLoggerEngine(logger, source, nula, streaming, continuous)
+    try:
+        asyncio.run(engine.run())
+    except KeyboardInterrupt:
+        print("\nReceived CTRL+C, shutting down...")
+    except (asyncio.IncompleteReadError, ConnectionError) as e:
+        print(f"PLC connection closed: {e}")
+    finally:
+        engine.shutdown()
+        print("Program successfully terminated.")
@@ -1,80 +1,79 @@
-import os
-import pandas as pd
-from tkinter import Tk
-from tkinter.filedialog import askdirectory
-
-def select_directory():
-    Tk().withdraw()  
-    return askdirectory(title="Odaberite glavnu mapu s CSV datotekama")
-
-def calculate_force_temp_and_drill_time(main_dir):
-  
-    total_max_force_sum = 0
-    total_temp_rise_sum = 0
-    total_max_temp_sum = 0
-    total_drill_time_sum = 0
-    total_csv_files = 0
-
-    
-    csv_files = [f for f in os.listdir(main_dir) if f.endswith('.csv')]
-    for file in csv_files:
-        filepath = os.path.join(main_dir, file)
-        try:
-            df = pd.read_csv(filepath, encoding="ISO-8859-1")  
-        except UnicodeDecodeError:
-            print(f"Greška kodiranja u datoteci: {filepath}")
-            continue  
-
-        
-        max_force = df.iloc[:, 1].max()
-        total_max_force_sum += max_force
-
-        
-        force_column = df.iloc[:, 1]
-        timestamp_column = df.iloc[:, 0]
-        signal_column = df.iloc[:, 4]  
-
-        
-        start_time = None
-        end_time = None
-        for i in range(len(force_column)):
-            if start_time is None and force_column[i] > 0.5:
-                start_time = timestamp_column[i]
-            if start_time is not None and signal_column[i] == "False Signal Received":
-                end_time = timestamp_column[i]
-                break  
-
-        if start_time and end_time:
-            drill_time = end_time - start_time
-            total_drill_time_sum += drill_time
-
-       
-        temp_column = df.iloc[:, 2].dropna()
-        if not temp_column.empty:
-            initial_temp = temp_column.iloc[0]
-            max_temp = temp_column.max()
-            temp_rise = max_temp - initial_temp
-            total_temp_rise_sum += temp_rise
-            total_max_temp_sum += max_temp
-
-        total_csv_files += 1
-
-    
-    avg_max_force = round(total_max_force_sum / total_csv_files, 2) if total_csv_files else 0
-    avg_temp_rise = round(total_temp_rise_sum / total_csv_files, 2) if total_csv_files else 0
-    avg_max_temp = round(total_max_temp_sum / total_csv_files, 2) if total_csv_files else 0
-    avg_drill_time = round(total_drill_time_sum / total_csv_files, 2) if total_csv_files else 0
-
-    return avg_max_force, avg_temp_rise, avg_max_temp, avg_drill_time, total_csv_files
-
-
-main_directory = select_directory()
-if main_directory:
-    avg_max_force, avg_temp_rise, avg_max_temp, avg_drill_time, file_count = calculate_force_temp_and_drill_time(main_directory)
-    print(f"Broj učitanih CSV datoteka: {file_count}")
-    print(f"Prosječna najviša aksijalna sila: {avg_max_force}")
-    print(f"Prosječno vrijeme bušenja: {avg_drill_time}")
-    print(f"Prosječno povišenje temperature: {avg_temp_rise}")
-    print(f"Prosječna maksimalna zabilježena temperatura: {avg_max_temp}")
-else:
-    print("Mapa nije odabrana.")
+import os
+import argparse
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from tkinter import Tk
+from tkinter.filedialog import askdirectory
+from run_loader import load_run, run_statistics
+from run_catalog import RunCatalog
+from run_archive import expand_paths
+
+def select_directory():
+    Tk().withdraw()
+    return askdirectory(title="Odaberite glavnu mapu s CSV datotekama")
+
+def analyze_run(filepath):
+    """Statistics of one run, None if the file cannot be decoded."""
+    try:
+        run = load_run(filepath)
+    except UnicodeDecodeError:
+        print(f"Greška kodiranja u datoteci: {filepath}")
+        return None
+
+    return {'file': os.path.basename(filepath), **run_statistics(run)}
+
+def analyze_runs(main_dir, workers=None):
+    """Per-run results table of the CSV files and .run directories in main_dir, processed in parallel.
+
+    The runs are listed like the catalog lists them (expand_paths), so --catalog gives the same results.
+    """
+    run_paths = expand_paths([main_dir])
+    if not run_paths:
+        return pd.DataFrame(columns=['file', 'max_force', 'drill_time', 'initial_temp', 'max_temp', 'temp_rise'])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(analyze_run, run_paths, chunksize=max(1, len(run_paths) // 32)))
+    return pd.DataFrame([result for result in results if result is not None])
+
+def calculate_force_temp_and_drill_time(main_dir, workers=None):
+    results = analyze_runs(main_dir, workers)
+    total_csv_files = len(results)
+
+    # Runs without a drill time or temperature count as 0, as before
+    avg_max_force = round(results['max_force'].sum() / total_csv_files, 2) if total_csv_files else 0
+    avg_temp_rise = round(results['temp_rise'].sum() / total_csv_files, 2) if total_csv_files else 0
+    avg_max_temp = round(results['max_temp'].sum() / total_csv_files, 2) if total_csv_files else 0
+    avg_drill_time = round(results['drill_time'].sum() / total_csv_files, 2) if total_csv_files else 0
+
+    return avg_max_force, avg_temp_rise, avg_max_temp, avg_drill_time, total_csv_files, results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Average force, drill time and temperature of all runs in a directory.")
+    parser.add_argument('directory', nargs='?', help="Directory with the CSV files (selected in a dialog if omitted)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes (all CPUs by default)")
+    parser.add_argument('-o', '--output', default=None, help="Save the per-run results table to this CSV file")
+    parser.add_argument('--catalog', default=None, help="SQLite run catalog (e.g. runs.sqlite), only new or changed files are analyzed")
+    args = parser.parse_args()
+
+    main_directory = args.directory or select_directory()
+    if main_directory:
+        if args.catalog:
+            catalog = RunCatalog(args.catalog)
+            catalog.update([main_directory], workers=args.workers)
+            results = catalog.runs(directory=main_directory)[['path', 'max_force', 'drill_time', 'initial_temp', 'max_temp', 'temp_rise']]
+            results.insert(0, 'file', results.pop('path').map(os.path.basename))
+            avg_max_force, avg_temp_rise, avg_max_temp, avg_drill_time, file_count = catalog.averages(directory=main_directory)
+            catalog.close()
+        else:
+            avg_max_force, avg_temp_rise, avg_max_temp, avg_drill_time, file_count, results = calculate_force_temp_and_drill_time(main_directory, args.workers)
+        if not results.empty:
+            print(results.round(2).to_string(index=False))
+        if args.output:
+            results.to_csv(args.output, index=False)
+        print(f"Broj učitanih CSV datoteka: {file_count}")
+        print(f"Prosječna najviša aksijalna sila: {avg_max_force}")
+        print(f"Prosječno vrijeme bušenja: {avg_drill_time}")
+        print(f"Prosječno povišenje temperature: {avg_temp_rise}")
+        print(f"Prosječna maksimalna zabilježena temperatura: {avg_max_temp}")
+    else:
+        print("Mapa nije odabrana.")
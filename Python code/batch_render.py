@@ -0,0 +1,81 @@
+import argparse
+import os
+import matplotlib
+matplotlib.use('Agg')  # Before pyplot is imported by the plot scripts, no display or Tk needed
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from run_loader import load_run, VELOCITY_COLUMN
+from run_archive import expand_paths
+from decimation import PLOT_POINTS
+import regulation_plot
+import constant_shear_velocity_plot
+
+FORMATS = ('png', 'pdf', 'svg')
+STYLES = {
+    'regulation': regulation_plot.create_figure,
+    'constant': constant_shear_velocity_plot.create_figure,
+}
+
+
+def output_paths(run_path, output_dir, formats):
+    name = os.path.splitext(os.path.basename(run_path.rstrip(os.sep)))[0]
+    directory = output_dir or os.path.dirname(os.path.abspath(run_path))
+    return [os.path.join(directory, f'{name}.{extension}') for extension in formats]
+
+
+def is_up_to_date(run_path, outputs):
+    source = os.path.join(run_path, 'header.json') if os.path.isdir(run_path) else run_path
+    source_mtime = os.path.getmtime(source)
+    return all(os.path.exists(output) and os.path.getmtime(output) >= source_mtime for output in outputs)
+
+
+def render_run(run_path, output_dir=None, formats=('png',), dpi=300, style='auto', force=False, points=PLOT_POINTS, method='minmax'):
+    """Render the figure of one run to every format, return (run_path, status)."""
+    outputs = output_paths(run_path, output_dir, formats)
+    if not force and is_up_to_date(run_path, outputs):
+        return run_path, 'up to date'
+    try:
+        if style == 'auto':
+            style = 'regulation' if load_run(run_path).has(VELOCITY_COLUMN) else 'constant'
+        fig = STYLES[style](run_path, points, method)
+        try:
+            for output in outputs:
+                # Same settings as the clipboard copy of the plot scripts
+                fig.savefig(output, dpi=dpi, bbox_inches='tight')
+        finally:
+            plt.close(fig)
+    except Exception as e:
+        return run_path, f'failed: {e}'
+    return run_path, 'rendered'
+
+
+def render_all(paths, output_dir=None, formats=('png',), dpi=300, style='auto', force=False, workers=None, points=PLOT_POINTS, method='minmax'):
+    runs = expand_paths(paths)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_run, run, output_dir, formats, dpi, style, force, points, method) for run in runs]
+        for future in futures:
+            run_path, status = future.result()
+            print(f"{run_path}: {status}")
+            yield run_path, status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render the figures of many runs without a display.")
+    parser.add_argument('paths', nargs='+', help="Directories, CSV files, .run directories or glob patterns")
+    parser.add_argument('-o', '--output-dir', default=None, help="Directory for the figures (next to each run by default)")
+    parser.add_argument('-f', '--format', dest='formats', nargs='+', choices=FORMATS, default=['png'], help="Output formats")
+    parser.add_argument('--dpi', type=int, default=300, help="Resolution of raster formats")
+    parser.add_argument('--style', choices=['auto'] + list(STYLES), default='auto',
+                        help="Figure of regulation_plot.py or constant_shear_velocity_plot.py (by the logged channels if auto)")
+    parser.add_argument('--force', action='store_true', help="Also render runs whose figures are newer than the run")
+    parser.add_argument('--points', type=int, default=PLOT_POINTS, help="Points per trace after decimation, 0 plots every sample")
+    parser.add_argument('--decimation', choices=['minmax', 'lttb'], default='minmax', help="Decimation method")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    statuses = [status for run_path, status in render_all(args.paths, args.output_dir, args.formats, args.dpi, args.style, args.force, args.workers,
+                                                                 args.points or None, args.decimation)]
+    print(f"{statuses.count('rendered')} rendered, {statuses.count('up to date')} up to date, "
+          f"{sum(status.startswith('failed') for status in statuses)} failed")
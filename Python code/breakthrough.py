@@ -0,0 +1,139 @@
+import argparse
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+from run_loader import load_run, FORCE_COLUMN
+from run_archive import expand_paths
+
+# --detector-stop: the stop command goes to the PLC as a word on its own connection, the force
+# channel used by the force regulation always carries the measured force. The PLC program has to
+# serve PORT_COMMAND and stop the feed on STOP_COMMAND (see README), until it does only the HIL
+# simulator, which sets SIMULATION_ENVIRONMENT, handles it.
+PORT_COMMAND = 2001
+STOP_COMMAND = b'\x01\x00'
+SIMULATION_ENVIRONMENT = 'DRILLING_HIL_SIMULATION'
+
+# Defaults for 200 Hz polling and 1 kHz streaming with the NetFT noise of about 0.3 N
+SLOPE_TIME_CONSTANT = 0.02  # s, EWMA of dF/dt
+CUSUM_DRIFT = 20.0  # N/s, slower force decreases never accumulate
+CUSUM_THRESHOLD = 4.0  # N, decrease beyond the drift at which the detector fires
+MIN_FORCE = 10.0  # N, the detector is armed once the force has been above it
+CONFIRM_TIME = 0.5  # s, a detection is confirmed if the force halves within this time
+
+
+def detector_stop_available():
+    """Whether the PLC handles STOP_COMMAND, so far only the simulated PLC of hil_simulator.py does."""
+    return os.environ.get(SIMULATION_ENVIRONMENT) == '1'
+
+
+class BreakthroughDetector:
+    """Streaming breakthrough detector, constant work per force sample.
+
+    The force slope dF/dt is smoothed with an exponentially weighted moving
+    average, and a one-sided CUSUM accumulates its decrease rate beyond
+    `drift` over time. The detector fires once the accumulated decrease
+    exceeds `threshold` N. It is armed only after the force has been above
+    `min_force`, so noise at zero load never fires it, and it fires once per
+    run, reset() starts a new run.
+    """
+
+    def __init__(self, threshold=CUSUM_THRESHOLD, drift=CUSUM_DRIFT, time_constant=SLOPE_TIME_CONSTANT, min_force=MIN_FORCE):
+        self.threshold = threshold
+        self.drift = drift
+        self.time_constant = time_constant
+        self.min_force = min_force
+        self.reset()
+
+    def reset(self):
+        self.previous_time = None
+        self.previous_force = None
+        self.slope = 0.0
+        self.cusum = 0.0
+        self.armed = False
+        self.detected_at = None  # Timestamp of the sample at which the detector fired
+
+    def update(self, timestamp, force):
+        """Add one sample, True only for the sample at which breakthrough is detected."""
+        if self.detected_at is not None:
+            return False
+        if self.previous_time is not None:
+            dt = timestamp - self.previous_time
+            if dt <= 0:
+                return False
+            # Time-based EWMA weight, so the filter is the same at any sample rate
+            weight = 1 - math.exp(-dt / self.time_constant)
+            self.slope += weight * ((force - self.previous_force) / dt - self.slope)
+            if self.armed:
+                self.cusum = max(0.0, self.cusum + (-self.slope - self.drift) * dt)
+        self.previous_time = timestamp
+        self.previous_force = force
+        if force > self.min_force:
+            self.armed = True
+        if self.cusum > self.threshold:
+            self.detected_at = timestamp
+            return True
+        return False
+
+
+def replay(path, **parameters):
+    """Run the detector over the force samples of a recorded run, as the logger does live.
+
+    The lead is the time between the detection and the PLC stop signal
+    ("False Signal Received"), positive if the detector was earlier. Runs
+    logged with --detect-breakthrough also have the lead of the live detector.
+    """
+    run = load_run(path)
+    times = run.times(FORCE_COLUMN)
+    forces = run.values(FORCE_COLUMN)
+    detector = BreakthroughDetector(**parameters)
+    samples = 0
+    started = time.perf_counter()
+    for timestamp, force in zip(times.tolist(), forces.tolist()):
+        samples += 1
+        if detector.update(timestamp, force):
+            break
+    elapsed = time.perf_counter() - started
+
+    detected_at = detector.detected_at
+    stop_time = run.stop_time
+    confirmed = False
+    if detected_at is not None:
+        before = forces[times <= detected_at]
+        after = forces[(times > detected_at) & (times <= detected_at + CONFIRM_TIME)]
+        confirmed = bool(len(after)) and after.min() < 0.5 * before.max()
+    return {
+        'file': path,
+        'detected_at': detected_at if detected_at is not None else np.nan,
+        'stop_time': stop_time if stop_time is not None else np.nan,
+        'lead_ms': (stop_time - detected_at) * 1000 if detected_at is not None and stop_time is not None else np.nan,
+        'logged_lead_ms': (stop_time - run.breakthrough_time) * 1000 if run.breakthrough_time is not None and stop_time is not None else np.nan,
+        'confirmed': confirmed,
+        'update_us': elapsed / samples * 1e6 if samples else np.nan,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay recorded runs through the breakthrough detector and compare it with the PLC signal.")
+    parser.add_argument('paths', nargs='+', help="Directories, CSV files, .run directories or glob patterns")
+    parser.add_argument('--threshold', type=float, default=CUSUM_THRESHOLD, help="CUSUM threshold in N")
+    parser.add_argument('--drift', type=float, default=CUSUM_DRIFT, help="CUSUM drift in N/s")
+    parser.add_argument('--time-constant', type=float, default=SLOPE_TIME_CONSTANT, help="Time constant of the slope EWMA in s")
+    parser.add_argument('--min-force', type=float, default=MIN_FORCE, help="Force in N that arms the detector")
+    parser.add_argument('-o', '--output', default=None, help="Save the per-run results to this CSV file")
+    args = parser.parse_args()
+
+    results = pd.DataFrame([replay(path, threshold=args.threshold, drift=args.drift, time_constant=args.time_constant,
+                                   min_force=args.min_force) for path in expand_paths(args.paths)])
+    if args.output:
+        results.to_csv(args.output, index=False)
+    print(results.round(3).to_string(index=False))
+
+    detected = results['detected_at'].notna()
+    compared = results['lead_ms'].notna()
+    print(f"Detected {detected.sum()} of {len(results)} runs, {(detected & ~results['confirmed']).sum()} not followed by a force drop")
+    if compared.any():
+        lead = results.loc[compared, 'lead_ms']
+        print(f"Lead over the PLC signal: median {lead.median():.1f} ms, min {lead.min():.1f} ms, max {lead.max():.1f} ms")
+    print(f"Detector update: {results['update_us'].mean():.2f} us per sample")
@@ -1,11 +1,12 @@
 import matplotlib.pyplot as plt
-import pandas as pd
+from run_loader import load_run
+from decimation import decimate
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 
 
 def choose_single_csv(prompt):
-        Tk().withdraw()
+    Tk().withdraw()
     file_path = askopenfilename(
         title=prompt,
         filetypes=[("CSV files", "*.csv")]
@@ -33,27 +34,18 @@ def plot_data(file_paths):
 
         for i, file_path in enumerate(file_paths):
             
-            data = pd.read_csv(file_path, encoding='ISO-8859-1')
+            run = load_run(file_path)
 
-            
-            if 'Vrijeme (s)' not in data.columns or 'Aksijalna sila (N)' not in data.columns or 'Signal Received Time' not in data.columns:
+            if not run.has('Aksijalna sila (N)') or run.signal_column is None:
                 raise ValueError(f"File {file_path} does not contain the required columns.")
 
-            
-            data = data.dropna(subset=['Aksijalna sila (N)'])
-
-            
-            if "False Signal Received" in data['Signal Received Time'].values:
-                end_index = data[data['Signal Received Time'] == "False Signal Received"].index.min()
-                signal_time = data.loc[end_index, 'Vrijeme (s)']  
-                data = data[data['Vrijeme (s)'] <= signal_time]  
+            # Only the drilling part, up to the PLC stop signal
+            data = run.channel('Aksijalna sila (N)', until=run.stop_time)
 
-            
             time = data['Vrijeme (s)']
             axial_force = data['Aksijalna sila (N)']
 
-            
-            ax1.plot(time, axial_force, color=colors[i], linewidth=3.5, label=labels[i])
+            ax1.plot(*decimate(time, axial_force), color=colors[i], linewidth=3.5, label=labels[i])
 
         
         ax1.set_xlabel('Vrijeme, s', labelpad=15, **font_properties)
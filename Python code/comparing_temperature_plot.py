@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
-import pandas as pd
+from run_loader import load_run
+from decimation import decimate
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 
@@ -34,27 +35,18 @@ def plot_data(file_paths):
 
         for i, file_path in enumerate(file_paths):
            
-            data = pd.read_csv(file_path, encoding='ISO-8859-1')
+            run = load_run(file_path)
 
-            
-            if 'Vrijeme (s)' not in data.columns or 'Temperatura Ch1 (°C)' not in data.columns or 'Signal Received Time' not in data.columns:
+            if not run.has('Temperatura Ch1 (°C)') or run.signal_column is None:
                 raise ValueError(f"File {file_path} does not contain the required columns.")
 
-            
-            data = data.dropna(subset=['Temperatura Ch1 (°C)'])
+            # Only the drilling part, up to the PLC stop signal
+            data = run.channel('Temperatura Ch1 (°C)', until=run.stop_time)
 
-            
-            if "False Signal Received" in data['Signal Received Time'].values:
-                end_index = data[data['Signal Received Time'] == "False Signal Received"].index.min()
-                signal_time = data.loc[end_index, 'Vrijeme (s)']  
-                data = data[data['Vrijeme (s)'] <= signal_time]  
-
-            
             time = data['Vrijeme (s)']
             temperature = data['Temperatura Ch1 (°C)']
 
-            
-            ax1.plot(time, temperature, color=colors[i], linewidth=3.5, label=labels[i])
+            ax1.plot(*decimate(time, temperature), color=colors[i], linewidth=3.5, label=labels[i])
 
         
         ax1.set_xlabel('Vrijeme, s', labelpad=15, **font_properties)
@@ -1,14 +1,14 @@
 import matplotlib.pyplot as plt
 from io import BytesIO
-from PIL import Image
-import pandas as pd
+from run_loader import load_run
+from decimation import decimate, keep_near, PLOT_POINTS
 from matplotlib.lines import Line2D
-from tkinter import Tk
-from tkinter.filedialog import askopenfilename
-import win32clipboard
 
 
 def copy_to_clipboard(fig):
+    from PIL import Image
+    import win32clipboard
+
     buf = BytesIO()
     fig.savefig(buf, format='png', bbox_inches='tight')
     buf.seek(0)
@@ -28,100 +28,97 @@ def copy_to_clipboard(fig):
     print("Diagram copied to clipboard!")
 
 
+def create_figure(csv_file_path, max_points=PLOT_POINTS, method='minmax'):
+    """Figure of one run, without showing it, also used by batch_render.py.
+
+    Every trace is decimated to about max_points points (None plots all samples).
+    """
+    run = load_run(csv_file_path)
+
+    # Cut all channels at the last timestamp of the temperature data
+    last_temp_time = run.temperature_end()
+
+    # Ignoring empty cells from CSV files
+    axial_force_clean = run.channel('Aksijalna sila (N)', until=last_temp_time)
+    time_axial_clean = axial_force_clean['Vrijeme (s)']
+    axial_force_clean_values = axial_force_clean['Aksijalna sila (N)']
+
+    temp_ch1_clean = run.channel('Temperatura Ch1 (°C)', until=last_temp_time)  # Bone temperature
+    time_temp_ch1_clean = temp_ch1_clean['Vrijeme (s)']
+    temperature_ch1_clean = temp_ch1_clean['Temperatura Ch1 (°C)']
+
+    temp_ch2_clean = run.channel('Temperatura Ch2 (°C)', until=last_temp_time)  # Room temperature
+    time_temp_ch2_clean = temp_ch2_clean['Vrijeme (s)']
+    temperature_ch2_clean = temp_ch2_clean['Temperatura Ch2 (°C)']
+
+    # Font
+    font_properties = {'fontname': 'Times New Roman', 'fontsize': 34}
+    tick_label_size = 22
+
+    # Diagram
+    fig, ax1 = plt.subplots(figsize=(12, 8))
+
+    # Define max values
+    global_max = max(axial_force_clean_values.max(), temperature_ch1_clean.max(), temperature_ch2_clean.max())
+
+    # Axial force
+    min_force = int(axial_force_clean_values.min() // 10 * 10)
+    max_force = int(global_max // 10 * 10 + 10)  
+    ax1.set_ylim(min_force, max_force)
+    ax1.set_yticks(range(min_force, max_force + 10, 10))
+    ax1.set_ylabel('Aksijalna sila, N', color='black', **font_properties)
+    keep = keep_near(time_axial_clean.to_numpy(), run.stop_time)
+    ax1.plot(*decimate(time_axial_clean, axial_force_clean_values, max_points, method, keep), color='black', linewidth=3.5, label='Aksijalna sila')
+    ax1.tick_params(axis='y', labelsize=tick_label_size)
+    ax1.tick_params(axis='x', labelsize=tick_label_size)
+
+    # Temperature
+    ax2 = ax1.twinx()
+    min_temp = max(20, int(min(temperature_ch1_clean.min(), temperature_ch2_clean.min()) // 10 * 10))
+    max_temp = int(global_max // 10 * 10 + 10)  
+    ax2.set_ylim(min_temp, max_temp)
+    ax2.set_yticks(range(min_temp, max_temp + 5, 5))  
+    ax2.set_ylabel('Temperatura, °C', color='black', labelpad=20, **font_properties)  
+    ax2.plot(*decimate(time_temp_ch1_clean, temperature_ch1_clean, max_points, method), color='red', linewidth=3.5, label='Temperatura uzorka')
+    ax2.plot(*decimate(time_temp_ch2_clean, temperature_ch2_clean, max_points, method), color='green', linestyle='dashed', linewidth=3.5, label='Temperatura prostorije')
+    ax2.tick_params(axis='y', labelsize=tick_label_size)
+
+
+    detection_time = run.stop_time
+    if detection_time is not None:
+        ax1.axvline(x=detection_time, color='gray', linestyle='dashed', linewidth=3.5, label='Detekcija proboja')
+
+    ax1.set_xlabel('Vrijeme, s', labelpad=15, **font_properties)
+    ax1.grid(True)
+
+
+    fig.tight_layout(rect=[-0.03, 0.2, 1.0, 1.0])  
+
+
+    legend_elements = [
+        Line2D([0], [0], color='black', lw=3.5, label='Aksijalna sila'),
+        Line2D([0], [0], color='red', lw=3.5, label='Temperatura uzorka'),
+        Line2D([0], [0], color='green', linestyle='dashed', lw=3.5, label='Temperatura prostorije'),
+        Line2D([0], [0], color='gray', linestyle='dashed', lw=3.5, label='Detekcija proboja')
+    ]
+
+    fig.legend(
+        handles=legend_elements,
+        loc='lower center',
+        ncol=2,
+        bbox_to_anchor=(0.49, 0.02),  
+        prop={'family': 'Times New Roman', 'size': 28},
+    )
+
+    return fig
+
+
 def plot_data(csv_file_path):
     try:
-        data = pd.read_csv(csv_file_path, encoding='ISO-8859-1')
-
-        # Data from CSV file
-        time = data['Vrijeme (s)']
-        axial_force = data['Aksijalna sila (N)']
-        temperature_ch1 = data['Temperatura Ch1 (°C)']  # Bone temperature
-        temperature_ch2 = data['Temperatura Ch2 (°C)']  # Room temperature
-
-        # Search for the last timestamp for temperature data
-        last_temp_ch1_time = data['Vrijeme (s)'][data['Temperatura Ch1 (°C)'].last_valid_index()]
-        last_temp_ch2_time = data['Vrijeme (s)'][data['Temperatura Ch2 (°C)'].last_valid_index()]
-
-        # Pick the earlier timestamp
-        last_temp_time = min(last_temp_ch1_time, last_temp_ch2_time)
-        filtered_data = data[data['Vrijeme (s)'] <= last_temp_time]
-
-        # Ignoring empty cells from CSV files
-        axial_force_clean = filtered_data.dropna(subset=['Aksijalna sila (N)'])
-        time_axial_clean = axial_force_clean['Vrijeme (s)']
-        axial_force_clean_values = axial_force_clean['Aksijalna sila (N)']
-
-        temp_ch1_clean = filtered_data.dropna(subset=['Temperatura Ch1 (°C)'])
-        time_temp_ch1_clean = temp_ch1_clean['Vrijeme (s)']
-        temperature_ch1_clean = temp_ch1_clean['Temperatura Ch1 (°C)']
-
-        temp_ch2_clean = filtered_data.dropna(subset=['Temperatura Ch2 (°C)'])
-        time_temp_ch2_clean = temp_ch2_clean['Vrijeme (s)']
-        temperature_ch2_clean = temp_ch2_clean['Temperatura Ch2 (°C)']
-
-        # Font
-        font_properties = {'fontname': 'Times New Roman', 'fontsize': 34}
-        tick_label_size = 22
-
-        # Diagram
-        fig, ax1 = plt.subplots(figsize=(12, 8))
-
-        # Define max values
-        global_max = max(axial_force_clean_values.max(), temperature_ch1_clean.max(), temperature_ch2_clean.max())
-
-        # Axial force
-        min_force = int(axial_force_clean_values.min() // 10 * 10)
-        max_force = int(global_max // 10 * 10 + 10)  
-        ax1.set_ylim(min_force, max_force)
-        ax1.set_yticks(range(min_force, max_force + 10, 10))
-        ax1.set_ylabel('Aksijalna sila, N', color='black', **font_properties)
-        ax1.plot(time_axial_clean, axial_force_clean_values, color='black', linewidth=3.5, label='Aksijalna sila')
-        ax1.tick_params(axis='y', labelsize=tick_label_size)
-        ax1.tick_params(axis='x', labelsize=tick_label_size)
-
-        # Temperature
-        ax2 = ax1.twinx()
-        min_temp = max(20, int(min(temperature_ch1_clean.min(), temperature_ch2_clean.min()) // 10 * 10))
-        max_temp = int(global_max // 10 * 10 + 10)  
-        ax2.set_ylim(min_temp, max_temp)
-        ax2.set_yticks(range(min_temp, max_temp + 5, 5))  
-        ax2.set_ylabel('Temperatura, °C', color='black', labelpad=20, **font_properties)  
-        ax2.plot(time_temp_ch1_clean, temperature_ch1_clean, color='red', linewidth=3.5, label='Temperatura uzorka')
-        ax2.plot(time_temp_ch2_clean, temperature_ch2_clean, color='green', linestyle='dashed', linewidth=3.5, label='Temperatura prostorije')
-        ax2.tick_params(axis='y', labelsize=tick_label_size)
-
-        
-        detection_index = data[data['Signal Received Time'] == "False Signal Received"].index
-        if not detection_index.empty:
-            detection_time = data.loc[detection_index[0], 'Vrijeme (s)']
-            ax1.axvline(x=detection_time, color='gray', linestyle='dashed', linewidth=3.5, label='Detekcija proboja')
-
-        ax1.set_xlabel('Vrijeme, s', labelpad=15, **font_properties)
-        ax1.grid(True)
-
-    
-        fig.tight_layout(rect=[-0.03, 0.2, 1.0, 1.0])  
-
-        
-        legend_elements = [
-            Line2D([0], [0], color='black', lw=3.5, label='Aksijalna sila'),
-            Line2D([0], [0], color='red', lw=3.5, label='Temperatura uzorka'),
-            Line2D([0], [0], color='green', linestyle='dashed', lw=3.5, label='Temperatura prostorije'),
-            Line2D([0], [0], color='gray', linestyle='dashed', lw=3.5, label='Detekcija proboja')
-        ]
-
-        fig.legend(
-            handles=legend_elements,
-            loc='lower center',
-            ncol=2,
-            bbox_to_anchor=(0.49, 0.02),  
-            prop={'family': 'Times New Roman', 'size': 28},
-        )
-
-        
+        fig = create_figure(csv_file_path)
+
         copy_to_clipboard(fig)
 
-        
         plt.show()
 
     except UnicodeDecodeError as e:
@@ -131,6 +128,9 @@ def plot_data(csv_file_path):
 
 
 def choose_csv_file():
+    from tkinter import Tk
+    from tkinter.filedialog import askopenfilename
+
     Tk().withdraw()
     filename = askopenfilename(
         title="Select a CSV file",
@@ -0,0 +1,159 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+
+class BatchedCSVWriter:
+    """Single writer thread for the run CSV, fed by the acquisition threads.
+
+    write_row only appends to an unbounded SimpleQueue, so producers never
+    wait on disk I/O or on each other. The writer thread writes rows in
+    batches and applies an explicit durability policy: rows reach the OS at
+    least every flush_interval seconds (or every batch_size rows), fsync runs
+    every fsync_interval seconds if set, and always when the file is closed.
+    """
+
+    def __init__(self, flush_interval=0.1, batch_size=500, fsync_interval=None, max_pending=100000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.max_pending = max_pending
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()  # Serializes open/close, never taken by write_row
+        self.path = None
+        self.dropped = 0
+        # Since the writer was created, for the metrics
+        self.dropped_total = 0
+        self.rows_written = 0
+        self.busy_time = 0.0  # s spent writing and flushing
+        self.thread = None
+        self.file = None
+        self.writer = None
+
+    @property
+    def is_open(self):
+        return self.path is not None
+
+    def open(self, path, header, metadata=None):
+        """Start a new file with the given column header.
+
+        metadata is an optional callable returning a dict that describes the
+        run, subclasses that store a header call it on open and again on close.
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='csv-writer', daemon=True)
+                self.thread.start()
+            self.path = path
+            self.queue.put(('open', path, header, metadata))
+
+    def write_row(self, row):
+        if self.path is None:
+            return
+        if self.queue.qsize() >= self.max_pending:
+            self.dropped += 1  # Disk cannot keep up, keep the acquisition threads running
+            self.dropped_total += 1
+            return
+        self.queue.put(row)
+
+    def close(self, timeout=10):
+        """Flush, fsync and close the file, return its path (None if nothing was open).
+
+        Blocks until the writer thread has closed the file, warning every
+        `timeout` seconds while it is still busy, so the caller never reports
+        a file whose tail is still queued. Returns None if the writer thread
+        died before closing it.
+        """
+        with self.lock:
+            path = self.path
+            if path is None:
+                return None
+            self.path = None
+            done = threading.Event()
+            self.queue.put(('close', done))
+        waited = 0
+        while not done.wait(timeout):
+            if not self.thread.is_alive():
+                print(f"CSV writer thread stopped before closing {path}, the end of the file may be missing")
+                return None
+            waited += timeout
+            print(f"Still writing {path} after {waited:.0f} s, {self.queue.qsize()} rows queued")
+        if self.dropped:
+            print(f"CSV writer dropped {self.dropped} rows, queue was full")
+            self.dropped = 0
+        return path
+
+    # The methods below only run on the writer thread
+
+    def open_file(self, path, header, metadata):
+        self.file = open(path, mode='a', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+
+    def write_batch(self, batch):
+        self.writer.writerows(batch)
+
+    def flush(self, fsync=False):
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def close_file(self):
+        self.flush(fsync=True)
+        self.file.close()
+
+    def run(self):
+        is_open = False
+        batch = []
+        last_flush = last_fsync = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            command = None
+            if isinstance(item, tuple):
+                command = item
+            elif item is not None:
+                batch.append(item)
+                # Take whatever else is already queued in one go
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, tuple):
+                        command = item
+                        break
+                    batch.append(item)
+
+            now = time.monotonic()
+            if command or len(batch) >= self.batch_size or now - last_flush >= self.flush_interval:
+                if is_open:
+                    if batch:
+                        self.write_batch(batch)
+                        self.rows_written += len(batch)
+                    fsync = self.fsync_interval is not None and now - last_fsync >= self.fsync_interval
+                    self.flush(fsync)
+                    if fsync:
+                        last_fsync = now
+                    self.busy_time += time.monotonic() - now
+                batch = []
+                last_flush = now
+
+            if command is None:
+                continue
+            if command[0] == 'open':
+                if is_open:
+                    self.close_file()
+                self.open_file(*command[1:])
+                is_open = True
+            elif command[0] == 'close':
+                if is_open:
+                    self.close_file()
+                    is_open = False
+                command[1].set()
@@ -0,0 +1,81 @@
+import numpy as np
+
+PLOT_POINTS = 2000  # Default number of points per trace, a 12 in figure cannot show more
+
+
+def minmax_indices(y, buckets):
+    """Index of the minimum and the maximum of y in each of `buckets` equal slices."""
+    n = len(y)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    valid = offsets < n
+    # All-NaN slices only occur in the padding at the end
+    padded = padded[valid]
+    offsets = offsets[valid]
+    return np.concatenate([offsets + np.nanargmin(padded, axis=1), offsets + np.nanargmax(padded, axis=1)])
+
+
+def lttb_indices(x, y, points):
+    """Largest-Triangle-Three-Buckets, one point per bucket, each bucket computed with NumPy."""
+    n = len(x)
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        # Twice the area of the triangle (previous point, candidate, mean of the next bucket)
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(area.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+def feature_indices(y):
+    """Points that must survive decimation: global extremes and the steepest drop (breakthrough)."""
+    indices = [0, len(y) - 1, int(np.argmax(y)), int(np.argmin(y))]
+    if len(y) > 1:
+        drop = int(np.argmin(np.diff(y)))
+        indices += [drop, drop + 1]
+    return np.array(indices)
+
+
+def decimate(x, y, points=PLOT_POINTS, method='minmax', keep=None):
+    """Reduce a trace to about `points` points while keeping its shape.
+
+    minmax keeps the minimum and maximum of every bucket, so no peak is lost,
+    lttb picks the visually most significant point per bucket. The global
+    extremes, the steepest drop and the indices in `keep` are always kept
+    exactly. Traces that are short enough are returned unchanged.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if points is None or len(x) <= points or points < 4:
+        return x, y
+    if method == 'minmax':
+        indices = minmax_indices(y, points // 2)
+    elif method == 'lttb':
+        indices = lttb_indices(x, y, points)
+    else:
+        raise ValueError(f"Unknown decimation method: {method}")
+    indices = np.union1d(indices, feature_indices(y))
+    if keep is not None:
+        indices = np.union1d(indices, np.asarray(keep, dtype=np.int64))
+    return x[indices], y[indices]
+
+
+def keep_near(x, times):
+    """Indices of the samples closest to the given times, e.g. the PLC stop signal."""
+    times = np.atleast_1d(np.asarray([t for t in np.atleast_1d(times) if t is not None], dtype=float))
+    if len(x) == 0 or len(times) == 0:
+        return np.zeros(0, dtype=np.int64)
+    indices = np.clip(np.searchsorted(x, times), 1, len(x) - 1)
+    return np.unique(np.concatenate([indices - 1, indices]))
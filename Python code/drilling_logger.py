@@ -0,0 +1,547 @@
+import NetFT
+import argparse
+import time
+import socket
+import struct
+import threading
+import os
+import sys
+import ctypes
+from picosdk.usbtc08 import usbtc08 as tc08
+from picosdk.functions import assert_pico2000_ok
+from force_buffer import ForceRingBuffer
+from netft_stream import NetFTStream
+from latency_histogram import ControlLoopLatency
+from periodic import PeriodicScheduler
+from tc08_stream import TC08Stream
+from csv_writer import BatchedCSVWriter
+from run_format import BinaryRunWriter
+from segmented_writer import SegmentedCSVWriter
+from live_dashboard import LiveFeed
+from shared_ring import RingPublisher, SHARED_RING_NAME
+from metrics import MetricsRegistry, MetricsServer, METRICS_PORT, register_logger_metrics
+from breakthrough import BreakthroughDetector, PORT_COMMAND, STOP_COMMAND, detector_stop_available
+from run_loader import BREAKTHROUGH_SIGNAL
+import async_engine
+import multiprocess_engine
+
+# Acquisition, recording and PLC communication shared by the logger scripts. The script sets
+# `mode` to itself, it provides the row layout of the CSV file and the hooks of its mode:
+#
+#   RUN_MODE, CSV_COLUMNS, DASHBOARD_OPTIONS     run metadata, CSV header, dashboard title and setpoint
+#   force_row, temperature_row, event_row        rows of the CSV file
+#   start_run()                                  at the start signal, returns the start time of the run
+#                                                (None: the first force sample of the run)
+#   optional: log_force_samples(samples)         each batch of force samples while logging
+#             run_summary()                      at the stop signal
+#             PHASE_SIGNALS, mark_phase_signal   PLC words besides start/stop (constant_shear_velocity.py)
+#             PORT_VELOCITY, log_shear_velocity,
+#             log_shear_velocity_values          shear velocity channel of the PLC (regulation.py)
+
+# TCP communication - server IP address
+SERVER_HOST = '192.168.0.2'
+PORT_FORCE = 2000
+BASE_CSV_DIR = r'C:\Users\Ivan\Desktop\data logging'
+
+# Default loop rates in Hz, the scheduler holds them regardless of how long each iteration takes
+FORCE_RATE = 200
+PLC_SEND_RATE = 65
+TEMPERATURE_RATE = 10
+POST_STOP_LOGGING_TIME = 11  # s
+TEMPERATURE_CHANNELS = [1, 2]  # Ch1 bone, Ch2 room, any of 1-8 can be added
+
+mode = None  # Logger script module
+running = True
+logging_active = False
+start_time = None
+nula = None  # Z force of the unloaded sensor
+temp_chandle = None  # Temperature sensor
+temp_stream = None  # TC-08 streaming mode (--temp-stream)
+temp_buffer = (ctypes.c_float * 9)()  # Reused by every get_single call
+
+csv_writer = BatchedCSVWriter()  # All CSV rows go through its writer thread
+force_buffer = ForceRingBuffer()  # Shared by the PLC sender, CSV logger and console printer
+plc_latency = ControlLoopLatency(1 / PLC_SEND_RATE)
+schedulers = {}  # Loop schedulers by name, reported when a run is finalized
+live_feed = None  # Live dashboard (--dashboard)
+shared_ring = None  # Shared memory ring buffer for reader processes (--shared-ring)
+metrics = MetricsRegistry()  # Acquisition health, served with --metrics and summarized in <run>_metrics.txt
+metrics_server = None
+run_metrics = None  # Metrics snapshot at the start of the run
+force_samples_lost = metrics.counter('drilling_samples_dropped_total', "Samples lost before they reached the logger", channel='force_buffer')
+temperature_samples = metrics.counter('drilling_samples_total', "Samples acquired per channel", channel='temperature')
+temperature_read_time = metrics.histogram('drilling_temperature_read_seconds', "Duration of a TC-08 get_single reading")
+plc_socket_timeouts = metrics.counter('drilling_plc_socket_timeouts_total', "Timeouts while waiting for PLC words on the control socket")
+breakthrough_detector = None  # --detect-breakthrough
+command_socket = None  # --detector-stop, connection for the stop command to the PLC
+
+# Checking if the desired directory exists
+def ensure_directory_exists(directory):
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+        print(f"Directory created: {directory}")
+    else:
+        print(f"Directory exists: {directory}")
+
+def connect_to_server(port):
+    """Connect to a server at a given port."""
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.connect((SERVER_HOST, port))
+    client_socket.settimeout(5)
+    print(f'Connected to server {SERVER_HOST}:{port}')
+    return client_socket
+
+def initialize_sensor(ip_address):
+    sensor = NetFT.Sensor(ip_address)
+    return sensor
+
+def initialize_temperature_sensor():
+    global temp_chandle
+    temp_chandle = ctypes.c_int16()
+    status = {}
+
+    status["open_unit"] = tc08.usb_tc08_open_unit()
+    assert_pico2000_ok(status["open_unit"])
+    temp_chandle = status["open_unit"]
+
+    status["set_mains"] = tc08.usb_tc08_set_mains(temp_chandle, 0)
+    assert_pico2000_ok(status["set_mains"])
+
+    # Type K thermocouples on the used channels
+    typeK = ctypes.c_int8(75)
+    for channel in TEMPERATURE_CHANNELS:
+        status[f"set_channel_{channel}"] = tc08.usb_tc08_set_channel(temp_chandle, channel, typeK)
+        assert_pico2000_ok(status[f"set_channel_{channel}"])
+
+    return status
+
+def get_temperatures():
+    overflow = ctypes.c_int16(0)
+    units = tc08.USBTC08_UNITS["USBTC08_UNITS_CENTIGRADE"]
+
+    status = {}
+    read_start = time.perf_counter()
+    status["get_single"] = tc08.usb_tc08_get_single(temp_chandle, ctypes.byref(temp_buffer), ctypes.byref(overflow), units)
+    temperature_read_time.observe(time.perf_counter() - read_start)
+    assert_pico2000_ok(status["get_single"])
+
+    return {channel: temp_buffer[channel] for channel in TEMPERATURE_CHANNELS}
+
+def get_unique_csv_file_path(base_dir):
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    return os.path.join(base_dir, f'output_{timestamp}.csv')
+
+def read_axial_force(sensor, nula):
+    """One sensor round trip, the sample goes into force_buffer."""
+    sensor.getForce()
+    sensor_data = sensor.force()
+    if len(sensor_data) > 2:
+        Z_sila = (nula - sensor_data[2]) / 1000000
+        force_buffer.append(time.time(), Z_sila)
+
+def acquire_axial_force(sensor, nula, scheduler):
+    """Single reader of the force sensor, fills force_buffer for all consumers."""
+    try:
+        while running:
+            read_axial_force(sensor, nula)
+            scheduler.wait()
+    except KeyboardInterrupt:
+        print("Exiting axial force acquisition.")
+
+def read_axial_force_batch(stream, nula):
+    """One batch of RDT packets, the samples go into force_buffer."""
+    timestamps, sequences, ft = stream.receive_batch()
+    if len(sequences):
+        force_buffer.extend(timestamps.tolist(), ((nula - ft[:, 2]) / 1000000).tolist())
+
+def acquire_axial_force_stream(stream, nula):
+    """Streaming variant of acquire_axial_force, RDT packets are decoded in batches."""
+    try:
+        while running:
+            read_axial_force_batch(stream, nula)
+    except KeyboardInterrupt:
+        print("Exiting axial force acquisition.")
+    finally:
+        stream.stop()
+        print(f"RDT packets received: {stream.received}, dropped: {stream.dropped}, late: {stream.late}")
+
+def log_axial_force():
+    global start_time, run_metrics
+
+    force_row = mode.force_row
+    log_force_samples = getattr(mode, 'log_force_samples', None)
+    next_seq = force_buffer.next_seq
+    try:
+        while running:
+            if logging_active:
+                if not csv_writer.is_open:
+                    csv_file_path = get_unique_csv_file_path(BASE_CSV_DIR)
+                    csv_writer.open(csv_file_path, mode.CSV_COLUMNS + extra_temperature_columns(), run_metadata)
+                    print(f"Logging data to {csv_writer.path}")
+                    # Only samples acquired after logging started go into the new file
+                    next_seq = force_buffer.next_seq
+                    plc_latency.reset()
+                    for scheduler in schedulers.values():
+                        scheduler.reset()
+                    run_metrics = metrics.snapshot()
+
+                requested_seq = next_seq
+                samples, next_seq = force_buffer.read_since(next_seq)
+                if samples:
+                    force_samples_lost.inc(samples[0][2] - requested_seq)  # Overwritten before they were read
+                    if start_time is None:
+                        start_time = samples[0][0]
+
+                    for timestamp, Z_sila, seq in samples:
+                        csv_writer.write_row(force_row(timestamp - start_time, Z_sila))
+                if log_force_samples is not None:
+                    log_force_samples(samples)
+            else:
+                next_seq = force_buffer.next_seq
+
+            force_buffer.wait_for(next_seq, timeout=0.1)
+    except KeyboardInterrupt:
+        print("Exiting axial force logging.")
+    finally:
+        finalize_csv_logging()
+
+def print_axial_force():
+    """Console printer for -c, shows the newest sample without slowing the logger."""
+    try:
+        while running:
+            sample = force_buffer.latest()
+            if logging_active and sample is not None and start_time is not None:
+                timestamp, Z_sila, seq = sample
+                print(f"Vrijeme: {timestamp - start_time:.2f} s, Aksijalna sila: {Z_sila:.6f} N")
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        print("Exiting axial force printing.")
+
+# Extra TC-08 channels go into additional columns after the standard ones
+def extra_temperature_columns():
+    return [f'Temperatura Ch{channel} (°C)' for channel in TEMPERATURE_CHANNELS if channel > 2]
+
+def extra_temperatures(readings):
+    return [readings.get(channel, '') for channel in TEMPERATURE_CHANNELS if channel > 2]
+
+def log_temperature_sample():
+    batch = {}
+    if temp_stream is not None:
+        # Drained even when not logging, so the device buffer never overflows
+        batch = temp_stream.read()
+    if logging_active and csv_writer.is_open and start_time is not None:
+        if temp_stream is None:
+            batch = {time.time(): get_temperatures()}
+
+        for timestamp, readings in batch.items():
+            # The device buffer can hold readings from before the force sample that started the run
+            if timestamp >= start_time:
+                csv_writer.write_row(mode.temperature_row(timestamp - start_time, readings))
+    temperature_samples.inc(len(batch))
+    if live_feed is not None:
+        live_feed.add_temperatures(batch)
+    if shared_ring is not None:
+        shared_ring.add_temperatures(batch)
+
+def log_temperature(scheduler):
+    try:
+        while running:
+            log_temperature_sample()
+            scheduler.wait()
+    except KeyboardInterrupt:
+        print("Exiting temperature logging.")
+    finally:
+        finalize_csv_logging()
+
+def send_data_to_plc(client_socket, scheduler):
+    try:
+        force_buffer.wait_for(0)
+        while running:
+            timestamp, Z_sila, seq = force_buffer.latest()
+            # Wall clock in ns, so the sensor read time from the acquisition thread is comparable
+            pack_ns = time.time_ns()
+            message = struct.pack('>f', Z_sila)
+            client_socket.sendall(message)
+            plc_latency.record(int(timestamp * 1e9), pack_ns, time.time_ns())
+            scheduler.wait()
+    except KeyboardInterrupt:
+        print('Exiting send_data_to_plc thread')
+    finally:
+        client_socket.close()
+
+def detect_breakthrough():
+    """Breakthrough detector on every force sample of a run (--detect-breakthrough)."""
+    next_seq = force_buffer.next_seq
+    try:
+        while running:
+            if logging_active and start_time is not None:
+                samples, next_seq = force_buffer.read_since(next_seq)
+                for timestamp, Z_sila, seq in samples:
+                    if breakthrough_detector.update(timestamp, Z_sila):
+                        if command_socket is not None:
+                            send_stop_command()
+                        csv_writer.write_row(mode.event_row(timestamp - start_time, BREAKTHROUGH_SIGNAL))
+                        if shared_ring is not None:
+                            shared_ring.add_event(timestamp, BREAKTHROUGH_SIGNAL)
+                        print(f"Breakthrough detected at {timestamp - start_time:.3f} s, {(time.time() - timestamp) * 1000:.1f} ms after the sample")
+            else:
+                next_seq = force_buffer.next_seq
+            force_buffer.wait_for(next_seq, timeout=0.1)
+    except KeyboardInterrupt:
+        print("Exiting breakthrough detection.")
+
+def send_stop_command():
+    """Stop command to the PLC on its own connection (--detector-stop)."""
+    try:
+        command_socket.sendall(STOP_COMMAND)
+    except OSError as e:
+        print(f"Error sending the stop command to the PLC: {e}")
+
+def run_metadata():
+    """Header of binary recordings (--format binary)."""
+    return {
+        'mode': mode.RUN_MODE,
+        'nula': int(nula),
+        'start_time': start_time,
+        'rates': {name: scheduler.rate for name, scheduler in schedulers.items()},
+        'temperature_channels': TEMPERATURE_CHANNELS,
+    }
+
+def finalize_csv_logging():
+    # Blocks until the writer thread has written, fsynced and closed the file
+    csv_file_path = csv_writer.close()
+    if csv_file_path:
+        print("Finalizing CSV logging...")
+        plc_latency.dump(os.path.splitext(csv_file_path)[0] + '_latency.txt')
+        if run_metrics is not None:
+            metrics.write_summary(os.path.splitext(csv_file_path)[0] + '_metrics.txt', run_metrics)
+        for scheduler in schedulers.values():
+            print(scheduler.summary())
+
+# PLC signal handlers, shared by the thread, asyncio and multiprocess engines
+def start_logging():
+    global logging_active, start_time
+    print("PLC Start Logging Signal Received (True)")
+    if breakthrough_detector is not None:
+        breakthrough_detector.reset()
+    if shared_ring is not None:
+        shared_ring.start_run(time.time())
+    start_time = mode.start_run()
+    logging_active = True
+
+def mark_stop_signal():
+    print("PLC Stop Logging Signal Received (False)")
+    false_signal_time = time.time() - start_time if start_time else 0
+    if live_feed is not None:
+        live_feed.add_event(time.time())
+    if shared_ring is not None:
+        shared_ring.add_event(time.time(), "False Signal Received")
+
+    csv_writer.write_row(mode.event_row(false_signal_time, "False Signal Received"))
+    if breakthrough_detector is not None:
+        if breakthrough_detector.detected_at is not None:
+            print(f"Breakthrough detector fired {(time.time() - breakthrough_detector.detected_at) * 1000:.0f} ms before the PLC signal")
+        else:
+            print("Breakthrough detector had not fired at the PLC signal")
+    if hasattr(mode, 'run_summary'):
+        mode.run_summary()
+
+def stop_logging():
+    global logging_active
+    logging_active = False
+    finalize_csv_logging()
+
+def shutdown():
+    """Teardown of every engine: TC-08 stream, dashboard, shared ring and metrics server."""
+    if temp_stream is not None:
+        temp_stream.stop()
+    if live_feed is not None:
+        live_feed.stop()
+    if shared_ring is not None:
+        shared_ring.stop()
+    if metrics_server is not None:
+        metrics_server.stop()
+
+def receive_plc_data(client_socket):
+    phase_signals = getattr(mode, 'PHASE_SIGNALS', {})
+    try:
+        while running:
+            try:
+                data = client_socket.recv(2)
+                if data:
+                    if data == b'\x01\x00':  # Receiving TRUE signal
+                        start_logging()
+                    elif data in phase_signals:  # Interval drilling phase words
+                        mode.mark_phase_signal(data)
+                    elif data == b'\x00\x00':  # Receiving FALSE signal
+                        mark_stop_signal()
+
+                        # Continue logging data for 11 seconds after receiving FALSE signal, mostly used to get more temperature measurements
+                        extended_logging_start = time.time()
+                        while time.time() - extended_logging_start < POST_STOP_LOGGING_TIME:
+                            time.sleep(0.1)
+                        stop_logging()
+            except socket.timeout:
+                plc_socket_timeouts.inc()
+                print("Socket timeout, continuing...")
+            time.sleep(0.001)
+    except socket.error as e:
+        print(f"Error receiving PLC data: {e}")
+    finally:
+        try:
+            client_socket.close()
+        except Exception as close_error:
+            print(f"Error closing socket: {close_error}")
+
+def argument_parser():
+    """Options of both logger scripts, the script adds those of its mode."""
+    parser = argparse.ArgumentParser(description="Read data from ATI NetFT sensors, temperature sensor, and PLC.", add_help=False)
+    parser.add_argument('ip', metavar='ip address', type=str, help="The IP address of the sensor")
+    parser.add_argument('-c', '--continuous', dest='continuous', action='store_true', help="Print data continuously")
+    parser.add_argument('-s', '--stream', dest='stream', action='store_true', help="Use high-speed RDT streaming instead of polling the sensor")
+    parser.add_argument('--rate', type=int, default=1000, help="RDT output rate configured on the sensor in Hz (used with -s)")
+    parser.add_argument('--force-rate', type=float, default=FORCE_RATE, help="Force sensor polling rate in Hz")
+    parser.add_argument('--plc-rate', type=float, default=PLC_SEND_RATE, help="Rate of force values sent to the PLC in Hz")
+    parser.add_argument('--temp-rate', type=float, default=TEMPERATURE_RATE, help="Temperature sampling rate in Hz")
+    parser.add_argument('--temp-stream', action='store_true', help="Use TC-08 streaming mode instead of single readings")
+    parser.add_argument('--temp-channels', default='1,2', help="Comma separated TC-08 channels (1-8), 1 and 2 are always used")
+    parser.add_argument('--temp-interval', type=int, default=None, help="TC-08 sample interval in ms in streaming mode (device minimum by default)")
+    parser.add_argument('-a', '--asyncio', dest='use_asyncio', action='store_true', help="Event-driven asyncio engine instead of polling threads")
+    parser.add_argument('-m', '--multiprocess', action='store_true',
+                        help="Run the sensor -> PLC control loop, the TC-08 and the PLC velocity in their own processes (see multiprocess_engine.py)")
+    parser.add_argument('--control-cpu', type=int, default=None, help="Pin the control process to this CPU with --multiprocess, the other processes to the rest")
+    parser.add_argument('--plc-host', default=SERVER_HOST, help="IP address of the PLC")
+    parser.add_argument('--output-dir', default=BASE_CSV_DIR, help="Directory for the CSV files")
+    parser.add_argument('--format', choices=['csv', 'binary'], default='csv', help="Record runs as CSV or as binary channel streams (convert with run_format.py)")
+    parser.add_argument('--flush-interval', type=float, default=100, help="Longest time rows wait before the CSV writer flushes them, in ms")
+    parser.add_argument('--detect-breakthrough', action='store_true', help="Detect breakthrough from the force slope on the host and log it")
+    parser.add_argument('--detector-stop', action='store_true', help=f"Send the stop command to the PLC on port {PORT_COMMAND} when breakthrough is detected, implies --detect-breakthrough "
+                        "(HIL simulation only until the PLC program handles it, see README)")
+    parser.add_argument('--detector-threshold', type=float, default=None, help="CUSUM threshold of the breakthrough detector in N")
+    parser.add_argument('--detector-drift', type=float, default=None, help="CUSUM drift of the breakthrough detector in N/s")
+    parser.add_argument('--shared-ring', nargs='?', const=SHARED_RING_NAME, default=None, metavar='NAME',
+                        help="Publish the samples in a shared memory ring buffer for other processes (see shared_ring.py)")
+    parser.add_argument('--metrics', nargs='?', type=int, const=METRICS_PORT, default=None, metavar='PORT',
+                        help=f"Serve acquisition health metrics in the Prometheus text format on http://127.0.0.1:PORT/metrics ({METRICS_PORT} by default)")
+    parser.add_argument('--dashboard', action='store_true', help="Show force, velocity and temperatures live in a separate window (about 20 FPS)")
+    parser.add_argument('--fsync-interval', type=float, default=None, help="Also fsync the CSV file every N s while logging (always done at stop)")
+    parser.add_argument('--segment-size', type=float, default=None, help="Record the CSV in checksummed segments of N MB, joined at stop (see segmented_writer.py)")
+    parser.add_argument('--segment-time', type=float, default=None, help="Start a new CSV segment every N s")
+    return parser
+
+def run(parser, args):
+    """Main block of the logger scripts, after the script has set up its mode from `args`."""
+    global SERVER_HOST, BASE_CSV_DIR, TEMPERATURE_CHANNELS, running, nula, csv_writer, plc_latency
+    global temp_stream, breakthrough_detector, command_socket, live_feed, shared_ring, metrics_server
+
+    if args.multiprocess and args.use_asyncio:
+        parser.error("--multiprocess and --asyncio are different engines, use one of them")
+    if args.detector_stop and not detector_stop_available():
+        parser.error(f"--detector-stop needs a PLC program that handles the stop command on port {PORT_COMMAND} (see README), "
+                     "so far only the HIL simulation does. Use --detect-breakthrough to log the detections")
+    SERVER_HOST = args.plc_host
+    BASE_CSV_DIR = args.output_dir
+    TEMPERATURE_CHANNELS = sorted({int(channel) for channel in args.temp_channels.split(',')} | {1, 2})
+
+    if not args.stream:
+        schedulers['force'] = PeriodicScheduler(args.force_rate, 'Force acquisition')
+    schedulers['plc'] = PeriodicScheduler(args.plc_rate, 'PLC send')
+    schedulers['temperature'] = PeriodicScheduler(args.temp_rate, 'Temperature')
+    plc_latency = ControlLoopLatency(1 / args.plc_rate)
+    if args.format == 'binary':
+        if args.segment_size or args.segment_time:
+            parser.error("--segment-size and --segment-time only apply to CSV recording")
+        csv_writer = BinaryRunWriter(args.flush_interval / 1000, fsync_interval=args.fsync_interval)
+    elif args.segment_size or args.segment_time:
+        csv_writer = SegmentedCSVWriter(args.flush_interval / 1000, fsync_interval=args.fsync_interval,
+                                        segment_size=args.segment_size * 1e6 if args.segment_size else None, segment_time=args.segment_time)
+    else:
+        csv_writer = BatchedCSVWriter(args.flush_interval / 1000, fsync_interval=args.fsync_interval)
+
+    if args.stream:
+        stream = NetFTStream(args.ip, sample_rate=args.rate)
+        stream.start()
+        timestamps, sequences, ft = stream.receive_batch()
+        if len(sequences):
+            nula = int(ft[-1, 2])
+        else:
+            print("Error: Unable to read initial Z-force")
+            stream.stop()
+            exit(1)
+    else:
+        sensor = initialize_sensor(args.ip)
+        sensor.getForce()
+        a = sensor.force()
+        if len(a) > 2:
+            nula = a[2]
+        else:
+            print("Error: Unable to read initial Z-force")
+            exit(1)
+
+    if not args.multiprocess:
+        # With --multiprocess the temperature process opens the TC-08
+        initialize_temperature_sensor()
+        if args.temp_stream:
+            temp_stream = TC08Stream(temp_chandle, TEMPERATURE_CHANNELS, args.temp_interval)
+            temp_stream.start()
+    ensure_directory_exists(BASE_CSV_DIR)
+    if args.detect_breakthrough or args.detector_stop:
+        detector_options = {'threshold': args.detector_threshold, 'drift': args.detector_drift}
+        breakthrough_detector = BreakthroughDetector(**{name: value for name, value in detector_options.items() if value is not None})
+        if args.detector_stop:
+            command_socket = connect_to_server(PORT_COMMAND)
+    if args.dashboard:
+        live_feed = LiveFeed(force_buffer, lambda: start_time, **mode.DASHBOARD_OPTIONS)
+        live_feed.start()
+    if args.shared_ring and not args.multiprocess:
+        shared_ring = RingPublisher(force_buffer, args.shared_ring, TEMPERATURE_CHANNELS)
+        shared_ring.start()
+    register_logger_metrics(metrics, sys.modules[__name__], stream if args.stream and not args.multiprocess else None)
+    if args.metrics:
+        metrics_server = MetricsServer(metrics, args.metrics)
+        metrics_server.start()
+
+    if args.use_asyncio:
+        async_engine.run(sys.modules[__name__], stream if args.stream else sensor, nula, args.stream, args.continuous)
+        exit(0)
+    if args.multiprocess:
+        if args.stream:
+            stream.stop()  # The control process opens its own stream
+        multiprocess_engine.run(sys.modules[__name__], args, nula)
+        exit(0)
+
+    threads = []
+    try:
+        client_socket_force = connect_to_server(PORT_FORCE)
+
+        threads.append(threading.Thread(target=receive_plc_data, args=(client_socket_force,)))
+        if args.stream:
+            threads.append(threading.Thread(target=acquire_axial_force_stream, args=(stream, nula)))
+        else:
+            threads.append(threading.Thread(target=acquire_axial_force, args=(sensor, nula, schedulers['force'])))
+        threads.append(threading.Thread(target=log_axial_force))
+        if breakthrough_detector is not None:
+            threads.append(threading.Thread(target=detect_breakthrough))
+        if args.continuous:
+            threads.append(threading.Thread(target=print_axial_force))
+        threads.append(threading.Thread(target=log_temperature, args=(schedulers['temperature'],)))
+        if hasattr(mode, 'PORT_VELOCITY'):
+            velocity_socket = connect_to_server(mode.PORT_VELOCITY)
+            threads.append(threading.Thread(target=mode.log_shear_velocity, args=(velocity_socket,)))
+        threads.append(threading.Thread(target=send_data_to_plc, args=(client_socket_force, schedulers['plc'])))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        while running:
+            time.sleep(1)
+
+    except KeyboardInterrupt:
+        print("\nReceived CTRL+C, shutting down...")
+        running = False
+        for thread in threads:
+            thread.join(timeout=2)
+    finally:
+        shutdown()
+        print("Program successfully terminated.")
+        time.sleep(0.1)
@@ -0,0 +1,64 @@
+import threading
+from array import array
+
+
+class ForceRingBuffer:
+    """Preallocated ring buffer of (timestamp, Fz, sequence) force samples.
+
+    One acquisition thread writes, the PLC sender, CSV logger and console
+    printer read from it, so every consumer sees the same sensor reading.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.forces = array('d', bytes(8 * capacity))
+        self.sequences = array('q', bytes(8 * capacity))
+        self.next_seq = 0  # Sequence number of the next sample to be written
+        self.condition = threading.Condition()
+
+    def append(self, timestamp, force):
+        with self.condition:
+            i = self.next_seq % self.capacity
+            self.timestamps[i] = timestamp
+            self.forces[i] = force
+            self.sequences[i] = self.next_seq
+            self.next_seq += 1
+            self.condition.notify_all()
+
+    def extend(self, timestamps, forces):
+        with self.condition:
+            for timestamp, force in zip(timestamps, forces):
+                i = self.next_seq % self.capacity
+                self.timestamps[i] = timestamp
+                self.forces[i] = force
+                self.sequences[i] = self.next_seq
+                self.next_seq += 1
+            self.condition.notify_all()
+
+    def latest(self):
+        """Return the newest (timestamp, force, sequence) or None if empty."""
+        with self.condition:
+            if self.next_seq == 0:
+                return None
+            i = (self.next_seq - 1) % self.capacity
+            return self.timestamps[i], self.forces[i], self.sequences[i]
+
+    def read_since(self, seq):
+        """Return samples with sequence >= seq and the sequence to continue from.
+
+        Samples already overwritten are skipped, the number of lost samples can
+        be seen as the gap between seq and the first returned sequence.
+        """
+        with self.condition:
+            start = max(seq, self.next_seq - self.capacity, 0)
+            samples = []
+            for s in range(start, self.next_seq):
+                i = s % self.capacity
+                samples.append((self.timestamps[i], self.forces[i], s))
+            return samples, self.next_seq
+
+    def wait_for(self, seq, timeout=None):
+        """Block until a sample with sequence >= seq exists."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.next_seq > seq, timeout)
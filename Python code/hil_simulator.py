@@ -0,0 +1,550 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import math
+import os
+import random
+import runpy
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from breakthrough import PORT_COMMAND, STOP_COMMAND, SIMULATION_ENVIRONMENT  # Stop command of --detector-stop
+
+PLC_HOST = '127.0.0.1'
+PORT_FORCE = 2000
+PORT_VELOCITY = 3000
+TAIL_TIME = 11  # Logging continues 11 s after the PLC stop signal
+FORCE_SETPOINT = 40
+PLC_BREAKTHROUGH_FORCE = 0.5 * FORCE_SETPOINT  # --plc-detection force: stop once the force falls below it
+FEED_TIME = 1.0  # s, 'interval' profile: feed interval, then retract/pause
+PAUSE_TIME = 1.0  # s
+
+
+class ScaledClock:
+    """Runs time.time/sleep/perf_counter faster than real time by a fixed factor."""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.real_time = time.time
+        self.real_sleep = time.sleep
+        self.real_perf_counter = time.perf_counter
+        self.real_perf_counter_ns = time.perf_counter_ns
+        self.real_monotonic = time.monotonic
+        self.origin = self.real_time()
+        self.perf_origin = self.real_perf_counter_ns()
+
+    def time(self):
+        return self.origin + (self.real_time() - self.origin) * self.speed
+
+    def time_ns(self):
+        return int(self.time() * 1e9)
+
+    def sleep(self, seconds):
+        self.real_sleep(max(0.0, seconds) / self.speed)
+
+    def perf_counter_ns(self):
+        return self.perf_origin + int((self.real_perf_counter_ns() - self.perf_origin) * self.speed)
+
+    def perf_counter(self):
+        return self.perf_counter_ns() / 1e9
+
+    def monotonic(self):
+        return self.perf_counter()
+
+    def install(self):
+        time.time = self.time
+        time.time_ns = self.time_ns
+        time.sleep = self.sleep
+        time.perf_counter = self.perf_counter
+        time.perf_counter_ns = self.perf_counter_ns
+        time.monotonic = self.monotonic
+
+
+def force_profile(name, t, start_delay, drill_time, force=FORCE_SETPOINT):
+    """Axial force in N at time t (s) since the simulation started."""
+    t = t - start_delay
+    if t < 0 or name == 'idle':
+        return 0.0
+    if name == 'constant':
+        return force
+    if name == 'ramp':
+        return force * min(t / drill_time, 1.0)
+    if name == 'interval':
+        # Force builds up in every feed interval and is zero while the drill is retracted
+        if t >= drill_time or t % (FEED_TIME + PAUSE_TIME) >= FEED_TIME:
+            return 0.0
+        return force * (1 - math.exp(-(t % (FEED_TIME + PAUSE_TIME)) / 0.2))
+    # 'drilling': rise to the setpoint, breakthrough drop at the end of the cut
+    if t < drill_time:
+        return force * (1 - math.exp(-t / 0.5))
+    return force * math.exp(-(t - drill_time) / 0.1)
+
+
+class FakeSensor:
+    """Stand-in for NetFT.Sensor with a configurable force profile and noise."""
+
+    profile = 'drilling'
+    start_delay = 1.0
+    drill_time = 5.0
+    force_setpoint = FORCE_SETPOINT
+    noise = 0.3  # Standard deviation in N
+    offset = 5000000  # Raw Z counts at zero load
+    latency = 0.002  # Round trip of a single request in s
+
+    def __init__(self, ip_address):
+        self.ip_address = ip_address
+        self.origin = time.time()
+        self.data = [0, 0, self.offset]
+
+    def getForce(self):
+        time.sleep(self.latency)
+        t = time.time() - self.origin
+        force = force_profile(self.profile, t, self.start_delay, self.drill_time, self.force_setpoint)
+        force += random.gauss(0, self.noise)
+        self.data = [0, 0, int(self.offset - force * 1000000)]
+        return self.data
+
+    def force(self):
+        return self.data
+
+
+class FakeTC08:
+    """Stand-in for the picosdk.usbtc08 calls used by the logger scripts."""
+
+    USBTC08_UNITS = {"USBTC08_UNITS_CENTIGRADE": 0}
+
+    room_temperature = 22.0
+    temperature_rise = 25.0
+    start_delay = 1.0
+    drill_time = 5.0
+    cooling_time = 4.0  # s, time constant of the 'interval' profile pauses
+    profile = 'drilling'
+    latency = 0.05  # A get_single conversion takes a while on the real device
+
+    def __init__(self):
+        self.origin = time.time()
+
+    def usb_tc08_open_unit(self):
+        self.origin = time.time()  # Same time base as the sensor, which is opened just before
+        return 1
+
+    def usb_tc08_set_mains(self, handle, sixty_hertz):
+        return 1
+
+    def usb_tc08_set_channel(self, handle, channel, tc_type):
+        return 1
+
+    def bone_temperature(self, t):
+        t = t - self.start_delay
+        if t < 0:
+            return self.room_temperature
+        if self.profile == 'interval':
+            return self.interval_temperature(t)
+        if t < self.drill_time:
+            return self.room_temperature + self.temperature_rise * t / self.drill_time
+        return self.room_temperature + self.temperature_rise * math.exp(-(t - self.drill_time) / 20)
+
+    def interval_temperature(self, t):
+        # Heats up linearly in the feed intervals, cools down exponentially in the pauses and after the last interval
+        rate = self.temperature_rise / self.drill_time * (FEED_TIME + PAUSE_TIME) / FEED_TIME
+        temperature = self.room_temperature
+        phase_start = 0.0
+        while phase_start < t:
+            feeding = phase_start < self.drill_time and phase_start % (FEED_TIME + PAUSE_TIME) < FEED_TIME
+            duration = min(FEED_TIME if feeding else PAUSE_TIME, t - phase_start)
+            if phase_start >= self.drill_time:
+                duration = t - phase_start
+            if feeding:
+                temperature += rate * duration
+            else:
+                temperature = self.room_temperature + (temperature - self.room_temperature) * math.exp(-duration / self.cooling_time)
+            phase_start += duration
+        return temperature
+
+    def channel_temperature(self, channel, t):
+        if channel == 1:
+            return self.bone_temperature(t) + random.gauss(0, 0.05)
+        return self.room_temperature + random.gauss(0, 0.05)
+
+    def usb_tc08_get_single(self, handle, temp_buffer, overflow, units):
+        time.sleep(self.latency)
+        t = time.time() - self.origin
+        buffer = temp_buffer._obj
+        buffer[0] = self.room_temperature  # Cold junction
+        for channel in range(1, 9):
+            buffer[channel] = self.channel_temperature(channel, t)
+        return 1
+
+    def usb_tc08_get_minimum_interval_ms(self, handle):
+        return 100
+
+    def usb_tc08_run(self, handle, interval_ms):
+        self.interval_ms = interval_ms
+        self.run_origin = time.time()
+        self.returned = {}  # Index of the last sample returned per channel
+        return interval_ms
+
+    def usb_tc08_get_temp(self, handle, temp_buffer, times_buffer, buffer_length, overflow, channel, units, fill_missing):
+        temps = temp_buffer._obj
+        times = times_buffer._obj
+        first = self.returned.get(channel, -1) + 1
+        newest = int((time.time() - self.run_origin) * 1000) // self.interval_ms
+        count = max(0, min(newest - first + 1, buffer_length))
+        for i in range(count):
+            t_ms = (first + i) * self.interval_ms
+            temps[i] = self.channel_temperature(channel, self.run_origin - self.origin + t_ms / 1000)
+            times[i] = t_ms
+        self.returned[channel] = first + count - 1
+        return count
+
+    def usb_tc08_stop(self, handle):
+        return 1
+
+
+def assert_pico2000_ok(status):
+    if status <= 0:
+        raise Exception("PicoSDK returned an error status")
+
+
+def install_fakes(profile='drilling', start_delay=1.0, drill_time=5.0, noise=0.3):
+    """Register fake NetFT and picosdk modules so the logger scripts import them."""
+    FakeSensor.profile = FakeTC08.profile = profile
+    FakeSensor.start_delay = FakeTC08.start_delay = start_delay
+    FakeSensor.drill_time = FakeTC08.drill_time = drill_time
+    FakeSensor.noise = noise
+
+    netft = types.ModuleType('NetFT')
+    netft.Sensor = FakeSensor
+
+    picosdk = types.ModuleType('picosdk')
+    usbtc08 = types.ModuleType('picosdk.usbtc08')
+    usbtc08.usbtc08 = FakeTC08()
+    functions = types.ModuleType('picosdk.functions')
+    functions.assert_pico2000_ok = assert_pico2000_ok
+    picosdk.usbtc08 = usbtc08
+    picosdk.functions = functions
+
+    sys.modules['NetFT'] = netft
+    sys.modules['picosdk'] = picosdk
+    sys.modules['picosdk.usbtc08'] = usbtc08
+    sys.modules['picosdk.functions'] = functions
+
+
+class FakePLC:
+    """Imitates the S7-1200: start/stop on PORT_FORCE, shear velocity on PORT_VELOCITY, stop command on PORT_COMMAND.
+
+    Received big-endian force floats are recorded with their arrival time so
+    throughput and jitter of the control loop can be measured. The stop signal
+    is sent drill_time after the start ('timer' detection), or once the
+    received force has reached the setpoint and fallen below
+    PLC_BREAKTHROUGH_FORCE ('force' detection), or at once when the logger
+    sends STOP_COMMAND on PORT_COMMAND (--detector-stop). With `phases` the
+    start of every feed interval and retract/pause of the 'interval' profile
+    is also sent, as the interval drilling PLC program can.
+    """
+
+    def __init__(self, host=PLC_HOST, port_force=PORT_FORCE, port_velocity=PORT_VELOCITY, port_command=PORT_COMMAND, speed=1.0,
+                 start_delay=1.0, drill_time=5.0, velocity_rate=20, split_frames=False, detection='timer',
+                 phases=False):
+        self.host = host
+        self.port_force = port_force
+        self.port_velocity = port_velocity
+        self.port_command = port_command
+        self.speed = speed
+        self.start_delay = start_delay
+        self.drill_time = drill_time
+        self.velocity_rate = velocity_rate
+        self.force_times = []
+        self.forces = []
+        self.drilling = False
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+        self.last_force = 0.0
+        self.velocity = 1.0
+        self.velocities_sent = 0
+        self.split_frames = split_frames  # Send velocity values in random pieces to exercise stream framing
+        self.detection = detection
+        self.loaded = False  # Force has reached the setpoint, for 'force' detection
+        self.stop_request = threading.Event()
+        self.stop_command_received = False
+        self.phases = phases
+
+    def listen(self, port):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, port))
+        server.listen(1)
+        server.settimeout(0.5)
+        return server
+
+    def start(self):
+        self.force_server = self.listen(self.port_force)
+        self.velocity_server = self.listen(self.port_velocity)
+        self.command_server = self.listen(self.port_command)
+        threading.Thread(target=self.serve_force, daemon=True).start()
+        threading.Thread(target=self.serve_velocity, daemon=True).start()
+        threading.Thread(target=self.serve_command, daemon=True).start()
+
+    def accept(self, server):
+        while not self.stopped.is_set():
+            try:
+                connection, address = server.accept()
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return connection
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # Server socket closed by stop()
+        return None
+
+    def serve_force(self):
+        connection = self.accept(self.force_server)
+        if connection is None:
+            return
+        threading.Thread(target=self.receive_forces, args=(connection,), daemon=True).start()
+
+        time.sleep(self.start_delay / self.speed)
+        print("Simulated PLC: start signal")
+        self.drilling = True
+        connection.sendall(b'\x01\x00')
+        if self.phases:
+            threading.Thread(target=self.send_phases, args=(connection,), daemon=True).start()
+
+        # 'force' detection gives up a few seconds after the end of the cut, e.g. for the constant profile
+        self.stop_request.wait((self.drill_time if self.detection == 'timer' else self.drill_time + 5) / self.speed)
+        print("Simulated PLC: stop signal" + (" (stop command from the logger)" if self.stop_command_received else ""))
+        self.drilling = False
+        connection.sendall(b'\x00\x00')
+        self.finished.set()
+
+    def send_phases(self, connection):
+        # Feed word at the start of every interval, pause word at the start of every retract, until the stop signal
+        phase_start = 0.0
+        while phase_start < self.drill_time:
+            for word, duration in ((b'\x02\x00', FEED_TIME), (b'\x03\x00', PAUSE_TIME)):
+                if not self.drilling:
+                    return
+                connection.sendall(word)
+                if self.stop_request.wait(duration / self.speed):
+                    return
+            phase_start += FEED_TIME + PAUSE_TIME
+
+    def receive_forces(self, connection):
+        pending = b''
+        try:
+            while not self.stopped.is_set():
+                data = connection.recv(4096)
+                if not data:
+                    break
+                now = time.perf_counter()
+                pending += data
+                count = len(pending) // 4
+                for (force,) in struct.iter_unpack('>f', pending[:count * 4]):
+                    self.force_times.append(now)
+                    self.forces.append(force)
+                    self.last_force = force
+                    if self.detection == 'force' and self.drilling:
+                        if force >= FORCE_SETPOINT * 0.95:
+                            self.loaded = True
+                        elif self.loaded and force < PLC_BREAKTHROUGH_FORCE:
+                            self.stop_request.set()
+                pending = pending[count * 4:]
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+    def serve_command(self):
+        # Only the logger with --detector-stop connects
+        connection = self.accept(self.command_server)
+        if connection is None:
+            return
+        pending = b''
+        try:
+            while not self.stopped.is_set():
+                data = connection.recv(64)
+                if not data:
+                    break
+                pending += data
+                while len(pending) >= 2:
+                    word, pending = pending[:2], pending[2:]
+                    if word == STOP_COMMAND and self.drilling:
+                        self.stop_command_received = True
+                        self.stop_request.set()
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+    def serve_velocity(self):
+        connection = self.accept(self.velocity_server)
+        if connection is None:
+            return
+        pending = b''
+        try:
+            while not self.stopped.is_set():
+                if self.drilling:
+                    # Simple proportional regulation of the feed towards the force setpoint
+                    self.velocity = min(max(self.velocity + 0.01 * (FORCE_SETPOINT - self.last_force), 0.0), 2.0)
+                    pending += struct.pack('>f', self.velocity)
+                    self.velocities_sent += 1
+                if pending:
+                    size = random.randint(1, len(pending)) if self.split_frames else len(pending)
+                    connection.sendall(pending[:size])
+                    pending = pending[size:]
+                time.sleep(1.0 / self.velocity_rate / self.speed)
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.force_server.close()
+        self.velocity_server.close()
+        self.command_server.close()
+
+    def report(self):
+        """Throughput and jitter of the force values received from the logger."""
+        intervals = [b - a for a, b in zip(self.force_times, self.force_times[1:])]
+        if not intervals:
+            print("Simulated PLC: no force values received")
+            return
+        intervals = sorted(i * self.speed for i in intervals)
+        mean = sum(intervals) / len(intervals)
+        jitter = math.sqrt(sum((i - mean) ** 2 for i in intervals) / len(intervals))
+        p99 = intervals[min(len(intervals) - 1, int(0.99 * len(intervals)))]
+        print(f"Force values received by PLC: {len(self.forces)}, velocity values sent: {self.velocities_sent}")
+        print(f"Send rate: {1 / mean:.1f} Hz, period {mean * 1000:.2f} ms, jitter (std) {jitter * 1000:.2f} ms, "
+              f"p99 {p99 * 1000:.2f} ms, max {intervals[-1] * 1000:.2f} ms")
+
+
+def report_csv(csv_file_path):
+    """Sample counts and rates per channel of a logged run."""
+    import pandas as pd
+
+    data = pd.read_csv(csv_file_path, encoding='ISO-8859-1')
+    print(f"Logged run: {csv_file_path}")
+    duration = data['Vrijeme (s)'].max() - data['Vrijeme (s)'].min()
+    for column in data.columns[1:]:
+        count = data[column].notna().sum()
+        print(f"  {column}: {count} samples ({count / duration:.1f} Hz)" if duration > 0 else f"  {column}: {count} samples")
+
+
+def install_logging_load(milliseconds):
+    """Busy Python work holding the GIL in every CSV batch, as a heavy logging or analysis thread would."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from csv_writer import BatchedCSVWriter
+
+    write_batch = BatchedCSVWriter.write_batch
+
+    def loaded_write_batch(self, batch):
+        end = time.perf_counter() + milliseconds / 1000
+        while time.perf_counter() < end:
+            pass
+        write_batch(self, batch)
+
+    BatchedCSVWriter.write_batch = loaded_write_batch
+
+
+def run_logger(script, speed, profile, start_delay, drill_time, noise, extra_args, logging_load=0):
+    """Child process: logger script with fake hardware modules and a scaled clock."""
+    os.environ[SIMULATION_ENVIRONMENT] = '1'
+    if speed != 1.0:
+        ScaledClock(speed).install()
+    install_fakes(profile, start_delay, drill_time, noise)
+    if logging_load:
+        install_logging_load(logging_load)
+    sys.argv = [script] + extra_args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    runpy.run_path(script, run_name='__main__')
+
+
+def simulate(script, speed, profile, start_delay, drill_time, noise, stream, output_dir, continuous, use_asyncio=False,
+             split_frames=False, extra_logger_args=(), detection='timer', phases=False, logging_load=0):
+    """Run one drilling cycle of the logger script against the simulated hardware.
+
+    Options the simulator does not know (e.g. --temp-stream) are passed on to the logger.
+    """
+    plc = FakePLC(speed=speed, start_delay=start_delay, drill_time=drill_time, split_frames=split_frames, detection=detection,
+                  phases=phases)
+    plc.start()
+
+    stream_stop = None
+    logger_args = ['127.0.0.1', '--plc-host', PLC_HOST, '--output-dir', output_dir]
+    if continuous:
+        logger_args.append('-c')
+    if use_asyncio:
+        logger_args.append('-a')
+    if stream:
+        from netft_stream import run_simulated_sensor
+        stream_stop = threading.Event()
+        threading.Thread(target=run_simulated_sensor, kwargs={'stop_event': stream_stop}, daemon=True).start()
+        logger_args.append('-s')
+
+    logger_args += extra_logger_args
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--child',
+                              '--speed', str(speed), '--profile', profile, '--start-delay', str(start_delay),
+                              '--drill-time', str(drill_time), '--noise', str(noise), '--logging-load', str(logging_load),
+                              script, '--'] + logger_args)
+    try:
+        while not plc.finished.wait(0.5):
+            if child.poll() is not None:
+                raise RuntimeError(f"Logger exited early with code {child.returncode}")
+        # Wait for the post-stop tail and CSV finalization, then stop the logger like an operator would
+        time.sleep((TAIL_TIME + 1) / speed)
+        child.send_signal(signal.SIGINT)
+        child.wait(timeout=10)
+    finally:
+        if child.poll() is None:
+            child.kill()
+        plc.stop()
+        if stream_stop:
+            stream_stop.set()
+
+    plc.report()
+    runs = sorted(glob.glob(os.path.join(output_dir, 'output_*.csv')) + glob.glob(os.path.join(output_dir, 'output_*.run')),
+                  key=os.path.getmtime)
+    if runs:
+        if runs[-1].endswith('.run'):
+            from run_format import export_csv
+            report_csv(export_csv(runs[-1]))
+        else:
+            report_csv(runs[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Hardware-in-the-loop simulation of the PLC, NetFT and TC-08 for the logger scripts.")
+    parser.add_argument('script', nargs='?', default='regulation.py', help="Logger script to run (regulation.py or constant_shear_velocity.py)")
+    parser.add_argument('--speed', type=float, default=1.0, help="Simulation speed, 1 = real time")
+    parser.add_argument('--profile', choices=['drilling', 'interval', 'constant', 'ramp', 'idle'], default='drilling', help="Force profile of the fake sensor")
+    parser.add_argument('--start-delay', type=float, default=1.0, help="Seconds before the PLC start signal")
+    parser.add_argument('--drill-time', type=float, default=5.0, help="Seconds between the PLC start and stop signals")
+    parser.add_argument('--noise', type=float, default=0.3, help="Force noise standard deviation in N")
+    parser.add_argument('--stream', action='store_true', help="Use the simulated RDT streaming sensor (-s)")
+    parser.add_argument('--output-dir', default=None, help="Directory for the logged CSV (temporary by default)")
+    parser.add_argument('-c', '--continuous', action='store_true', help="Pass -c to the logger")
+    parser.add_argument('--split-frames', action='store_true', help="PLC sends velocity values split across TCP segments")
+    parser.add_argument('--plc-detection', choices=['timer', 'force'], default='timer',
+                        help="PLC stop signal after --drill-time, or when the received force falls below half the setpoint")
+    parser.add_argument('--plc-phases', action='store_true', help="PLC sends the feed and pause words of the interval profile")
+    parser.add_argument('-a', '--asyncio', action='store_true', help="Pass -a to the logger")
+    parser.add_argument('--logging-load', type=float, default=0,
+                        help="Busy ms added to every CSV batch of the logger, to see the control loop jitter under logging load")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args, logger_args = parser.parse_known_args()
+
+    if args.child:
+        run_logger(args.script, args.speed, args.profile, args.start_delay, args.drill_time, args.noise, logger_args, args.logging_load)
+    else:
+        output_dir = args.output_dir or tempfile.mkdtemp(prefix='hil_')
+        simulate(args.script, args.speed, args.profile, args.start_delay, args.drill_time, args.noise,
+                 args.stream, output_dir, args.continuous, args.asyncio, args.split_frames, logger_args, args.plc_detection,
+                 args.plc_phases, args.logging_load)
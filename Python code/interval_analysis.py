@@ -0,0 +1,182 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from run_loader import load_run, FORCE_COLUMN, TEMPERATURE_CH1_COLUMN
+from run_archive import expand_paths
+
+# The drill is in contact with the sample (feed phase) once the force rises above
+# CONTACT_FORCE, and retracted (pause phase) once it falls below RELEASE_FORCE again
+CONTACT_FORCE = 2.0  # N
+RELEASE_FORCE = 0.5  # N, above the noise of the NetFT at zero load
+MIN_COOLING_SAMPLES = 3  # Temperature readings a pause needs for a cooling rate
+
+
+class PhaseTracker:
+    """Streaming feed/pause detection from the axial force, with hysteresis.
+
+    Used by constant_shear_velocity.py --interval when the PLC does not send
+    phase words.
+    update() returns 'feed' or 'pause' for the sample at which a phase starts,
+    None otherwise. The tracker starts in the pause phase, so the approach
+    before the first contact is not a feed interval.
+    """
+
+    def __init__(self, contact_force=CONTACT_FORCE, release_force=RELEASE_FORCE):
+        self.contact_force = contact_force
+        self.release_force = release_force
+        self.reset()
+
+    def reset(self):
+        self.phase = 'pause'
+        self.intervals = 0  # Feed intervals started in this run
+
+    def update(self, force):
+        if self.phase == 'pause' and force > self.contact_force:
+            self.phase = 'feed'
+            self.intervals += 1
+            return 'feed'
+        if self.phase == 'feed' and force < self.release_force:
+            self.phase = 'pause'
+            return 'pause'
+        return None
+
+
+def force_phases(times, forces, contact_force=CONTACT_FORCE, release_force=RELEASE_FORCE):
+    """Feed and pause start times found in the force, as PhaseTracker finds them live.
+
+    Runs logged without phase events (e.g. by constant_shear_velocity.py
+    without --interval) are split this way.
+    """
+    # 1 above the contact force, 0 below the release force, the last of them in between
+    state = np.where(forces > contact_force, 1, np.where(forces < release_force, 0, -1))
+    known = np.flatnonzero(state >= 0)
+    if not len(known):
+        return np.zeros(0), np.zeros(0)
+    filled = state[known[np.maximum(np.searchsorted(known, np.arange(len(state)), side='right') - 1, 0)]]
+    filled[:known[0]] = 0
+    change = np.flatnonzero(np.diff(filled)) + 1
+    return times[change[filled[change] == 1]], times[change[filled[change] == 0]]
+
+
+def phase_edges(run):
+    """Feed and pause start times of a run, from its phase events if it has them.
+
+    The PLC stop signal ends a last feed that has no pause after it, the
+    PLC sends no pause word when it stops during a feed.
+    """
+    feed_times, pause_times = run.feed_times, run.pause_times
+    if not len(feed_times):
+        feed_times, pause_times = force_phases(run.times(FORCE_COLUMN), run.values(FORCE_COLUMN))
+    stop_time = run.stop_time
+    if len(feed_times) and stop_time is not None and stop_time > feed_times[-1] \
+            and not (len(pause_times) and pause_times[-1] > feed_times[-1]):
+        pause_times = np.append(pause_times, stop_time)
+    return feed_times, pause_times
+
+
+def segment_reduce(times, values, starts, ends, ufunc):
+    """ufunc.reduce of the values in each [start, end) time segment, NaN for empty segments."""
+    first = np.searchsorted(times, starts)
+    last = np.searchsorted(times, ends)
+    result = np.full(len(starts), np.nan)
+    filled = last > first
+    if filled.any():
+        # Segments do not overlap, so one reduceat over the segment starts and ends covers all of them
+        bounds = np.column_stack([first[filled], last[filled]]).ravel()
+        reduced = ufunc.reduceat(np.append(values, values[-1]), bounds)
+        result[filled] = reduced[::2]
+    return result
+
+
+def segment_slopes(times, values, starts, ends):
+    """Least squares slope of the values in each [start, end) segment, all segments in one pass."""
+    labels = np.searchsorted(starts, times, side='right') - 1
+    inside = labels >= 0
+    inside[inside] = times[inside] < ends[labels[inside]]
+    labels = labels[inside]
+    x = times[inside] - starts[labels]  # Relative to the segment start, so the sums keep their precision
+    y = values[inside]
+    size = len(starts)
+    n = np.bincount(labels, minlength=size)
+    sx = np.bincount(labels, weights=x, minlength=size)
+    sy = np.bincount(labels, weights=y, minlength=size)
+    sxx = np.bincount(labels, weights=x * x, minlength=size)
+    sxy = np.bincount(labels, weights=x * y, minlength=size)
+    denominator = n * sxx - sx ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (n * sxy - sx * sy) / denominator
+    slopes[(n < MIN_COOLING_SAMPLES) | ~(denominator > 0)] = np.nan
+    return slopes
+
+
+def interval_statistics(path):
+    """One row per feed interval and the pause after it, an empty list if the run has none."""
+    run = load_run(path)
+    feed_times, pause_times = phase_edges(run)
+    if not len(feed_times):
+        return []
+    force_times, forces = run.times(FORCE_COLUMN), run.values(FORCE_COLUMN)
+    end = force_times[-1]
+    if run.has(TEMPERATURE_CH1_COLUMN) and len(run.times(TEMPERATURE_CH1_COLUMN)):
+        # The last pause lasts until the end of the post-stop tail
+        end = max(end, run.times(TEMPERATURE_CH1_COLUMN)[-1])
+
+    # Each feed ends at the first pause after it, each pause at the next feed
+    feed_ends = pause_times[np.minimum(np.searchsorted(pause_times, feed_times, side='right'), len(pause_times) - 1)] \
+        if len(pause_times) else np.full(len(feed_times), end)
+    feed_ends = np.where(feed_ends > feed_times, feed_ends, end)
+    pause_ends = np.append(feed_times[1:], end)
+    pause_ends = np.where(pause_ends > feed_ends, pause_ends, feed_ends)
+    samples = np.searchsorted(force_times, feed_ends) - np.searchsorted(force_times, feed_times)
+
+    table = pd.DataFrame({
+        'file': os.path.basename(path.rstrip(os.sep)),
+        'interval': np.arange(1, len(feed_times) + 1),
+        'feed_start': feed_times,
+        'feed_time': feed_ends - feed_times,
+        'peak_force': segment_reduce(force_times, forces, feed_times, feed_ends, np.maximum),
+        'mean_force': segment_reduce(force_times, forces, feed_times, feed_ends, np.add) / np.maximum(samples, 1),
+        'pause_time': pause_ends - feed_ends,
+        'temp_feed_start': np.nan,
+        'temp_peak': np.nan,
+        'temp_pause_end': np.nan,
+        'cooling_rate': np.nan,
+    })
+    if run.has(TEMPERATURE_CH1_COLUMN) and len(run.times(TEMPERATURE_CH1_COLUMN)):
+        times, temperature = run.times(TEMPERATURE_CH1_COLUMN), run.values(TEMPERATURE_CH1_COLUMN)
+        table['temp_feed_start'] = np.interp(feed_times, times, temperature)
+        # The thermocouple lags the cut, so the peak of an interval is often early in the pause
+        table['temp_peak'] = segment_reduce(times, temperature, feed_times, pause_ends, np.maximum)
+        table['temp_pause_end'] = np.interp(pause_ends, times, temperature)
+        # °C/s, positive while the sample cools down
+        table['cooling_rate'] = -segment_slopes(times, temperature, feed_ends, pause_ends)
+    return table.to_dict('records')
+
+
+def analyze_runs(paths, workers=None):
+    """Per-interval table of many runs, processed in parallel."""
+    runs = expand_paths(paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(interval_statistics, runs, chunksize=max(1, len(runs) // 32))
+        return pd.DataFrame([interval for run_intervals in results for interval in run_intervals])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-interval force peaks and cooling rates of interval drilling runs.")
+    parser.add_argument('paths', nargs='+', help="Directories, CSV files, .run directories or glob patterns")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes (all CPUs by default)")
+    parser.add_argument('-o', '--output', default=None, help="Save the per-interval table to this CSV file")
+    args = parser.parse_args()
+
+    results = analyze_runs(args.paths, args.workers)
+    if results.empty:
+        print("No runs with feed intervals found")
+    else:
+        if args.output:
+            results.to_csv(args.output, index=False)
+        print(results.round(3).to_string(index=False))
+        print()
+        print("Mean per interval:")
+        print(results.drop(columns=['file', 'feed_start']).groupby('interval').mean().round(3).to_string())
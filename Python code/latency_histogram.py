@@ -0,0 +1,127 @@
+import math
+import threading
+
+
+class LatencyHistogram:
+    """HDR-style histogram of integer values (nanoseconds) with bounded relative error.
+
+    Values below 2 * 10**significant_digits are counted exactly, larger values
+    go into log-linear buckets, so recording is O(1) and memory stays fixed.
+    """
+
+    def __init__(self, name, highest_value=10 * 10**9, significant_digits=2):
+        self.name = name
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10**significant_digits))
+        self.sub_bucket_count = 1 << self.sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count // 2
+        self.highest_value = highest_value
+        self.counts = [0] * (self.index_of(highest_value) + 1)
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def index_of(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return (shift + 1) * self.sub_bucket_half + (value >> shift) - self.sub_bucket_half
+
+    def value_at(self, index):
+        """Lowest value that falls into the bucket at index."""
+        if index < self.sub_bucket_count:
+            return index
+        shift = (index - self.sub_bucket_count) // self.sub_bucket_half + 1
+        return ((index - self.sub_bucket_count) % self.sub_bucket_half + self.sub_bucket_half) << shift
+
+    def record(self, value):
+        value = min(max(int(value), 0), self.highest_value)
+        self.counts[self.index_of(value)] += 1
+        self.total += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if self.total == 0:
+            return 0
+        target = max(1, math.ceil(self.total * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.value_at(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0
+
+    def summary(self, unit=1e6, unit_name='ms'):
+        if self.total == 0:
+            return f"{self.name}: no samples"
+        values = ', '.join(f"p{p:g} {self.percentile(p) / unit:.3f}" for p in (50, 90, 99, 99.9))
+        return (f"{self.name}: count {self.total}, min {self.min / unit:.3f}, mean {self.mean() / unit:.3f}, "
+                f"{values}, max {self.max / unit:.3f} {unit_name}")
+
+    def distribution(self, unit=1e6):
+        """Lines of (value, cumulative percentile, count) for each non-empty bucket."""
+        lines = [f"{'Value (ms)':>12} {'Percentile':>12} {'TotalCount':>12}"]
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                seen += count
+                lines.append(f"{self.value_at(index) / unit:12.3f} {seen / self.total:12.6f} {seen:12d}")
+        return lines
+
+
+class ControlLoopLatency:
+    """Force-to-PLC latency and loop period histograms of send_data_to_plc."""
+
+    def __init__(self, nominal_period):
+        self.nominal_period_ns = int(nominal_period * 1e9)
+        self.lock = threading.Lock()
+        self.read_to_pack = LatencyHistogram('Sensor read -> struct.pack')
+        self.pack_to_sent = LatencyHistogram('struct.pack -> sendall done')
+        self.read_to_sent = LatencyHistogram('Sensor read -> sendall done')
+        self.loop_period = LatencyHistogram('Loop period')
+        self.loop_jitter = LatencyHistogram(f'Loop jitter vs {nominal_period * 1000:.2f} ms')
+        self.histograms = [self.read_to_pack, self.pack_to_sent, self.read_to_sent, self.loop_period, self.loop_jitter]
+        self.last_iteration_ns = None
+
+    def reset(self):
+        with self.lock:
+            for histogram in self.histograms:
+                histogram.reset()
+            self.last_iteration_ns = None
+
+    def record(self, read_ns, pack_ns, sent_ns):
+        with self.lock:
+            self.read_to_pack.record(pack_ns - read_ns)
+            self.pack_to_sent.record(sent_ns - pack_ns)
+            self.read_to_sent.record(sent_ns - read_ns)
+            if self.last_iteration_ns is not None:
+                period = pack_ns - self.last_iteration_ns
+                self.loop_period.record(period)
+                self.loop_jitter.record(abs(period - self.nominal_period_ns))
+            self.last_iteration_ns = pack_ns
+
+    def dump(self, path):
+        with self.lock:
+            with open(path, 'w') as f:
+                if self.loop_period.total:
+                    f.write(f"Control loop rate: {1e9 / self.loop_period.mean():.1f} Hz "
+                            f"(nominal {1e9 / self.nominal_period_ns:.1f} Hz)\n\n")
+                for histogram in self.histograms:
+                    f.write(histogram.summary() + '\n')
+                for histogram in self.histograms:
+                    if histogram.total:
+                        f.write(f"\n{histogram.name}\n")
+                        f.write('\n'.join(histogram.distribution()) + '\n')
+        print(f"Control loop latency written to {path}")
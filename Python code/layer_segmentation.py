@@ -0,0 +1,199 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from run_loader import load_run, FORCE_COLUMN, VELOCITY_COLUMN, TEMPERATURE_CH1_COLUMN, FORCE_THRESHOLD
+from run_archive import expand_paths
+from alignment import align_channel
+
+LAYERS = 3  # Cortical, cancellous, cortical
+GRID_RATE = 100  # Hz, common time grid of the force and velocity channels
+MIN_LAYER_TIME = 0.3  # s, shortest layer that can be found
+ENGAGED_FRACTION = 0.8  # The cut starts once the force reaches this fraction of its median
+REFINE_PASSES = 2
+ONSET_FRACTION = 0.1  # A boundary is moved back to where the signal has made this much of the step
+
+trapezoid = getattr(np, 'trapezoid', None) or np.trapz  # np.trapz before NumPy 2.0
+
+
+def drilling_interval(run):
+    """Start and end of the cut: full engagement of the drill and the PLC stop signal."""
+    times = run.times(FORCE_COLUMN)
+    forces = run.values(FORCE_COLUMN)
+    end = run.stop_time if run.stop_time is not None else times[-1]
+    loaded = forces[(forces > FORCE_THRESHOLD) & (times <= end)]
+    if not len(loaded):
+        return None
+    # Skips the approach and the force ramp, otherwise the first boundary lands on the ramp
+    engaged = (forces >= ENGAGED_FRACTION * np.median(loaded)) & (times <= end)
+    start = times[engaged.argmax()] if engaged.any() else None
+    return (start, end) if start is not None and end > start else None
+
+
+def resample(times, values, grid_start, grid_rate, size):
+    """Channel on a uniform grid: mean of the samples in each bin, interpolated over empty bins."""
+    grid = np.arange(size)
+    means = align_channel(times, values, grid_start + (grid + 0.5) / grid_rate, 'mean', width=1 / grid_rate)
+    filled = ~np.isnan(means)
+    if not filled.any():
+        return None
+    return np.interp(grid, grid[filled], means[filled])
+
+
+def standardize(signal):
+    """Channel divided by its noise level, estimated from the differences so steps do not inflate it."""
+    noise = np.median(np.abs(np.diff(signal))) / (0.6745 * np.sqrt(2))
+    if not noise > 0:
+        noise = signal.std() or 1.0
+    return (signal - signal.mean()) / noise
+
+
+def split_gain(cumsum, start, end, min_size):
+    """Best split of signal[start:end] into two constant-mean parts and its cost reduction.
+
+    cumsum has one row more than the signal and one column per channel, so
+    the gain of every candidate split is computed at once from prefix sums.
+    """
+    if end - start < 2 * min_size:
+        return None, 0.0
+    candidates = np.arange(start + min_size, end - min_size + 1)
+    left = cumsum[candidates] - cumsum[start]
+    right = cumsum[end] - cumsum[candidates]
+    total = cumsum[end] - cumsum[start]
+    left_size = (candidates - start)[:, None]
+    right_size = (end - candidates)[:, None]
+    gain = (left ** 2 / left_size + right ** 2 / right_size).sum(axis=1) - (total ** 2).sum() / (end - start)
+    best = int(gain.argmax())
+    return int(candidates[best]), float(gain[best])
+
+
+def change_points(signal, segments, min_size):
+    """Boundaries of `segments` constant-mean segments of a (samples, channels) signal.
+
+    Binary segmentation followed by a few passes that move each boundary to
+    its best position between its neighbors, and to the onset of its
+    transition. Every step is one vectorized pass over a segment, so the
+    cost is linear in the number of samples.
+    """
+    n = len(signal)
+    cumsum = np.vstack([np.zeros((1, signal.shape[1])), np.cumsum(signal, axis=0)])
+    boundaries = [0, n]
+    splits = {(0, n): split_gain(cumsum, 0, n, min_size)}
+    for _ in range(segments - 1):
+        (start, end), (split, gain) = max(splits.items(), key=lambda item: item[1][1])
+        if split is None:
+            break
+        del splits[(start, end)]
+        boundaries = sorted(boundaries + [split])
+        splits[(start, split)] = split_gain(cumsum, start, split, min_size)
+        splits[(split, end)] = split_gain(cumsum, split, end, min_size)
+
+    for _ in range(REFINE_PASSES):
+        for i in range(1, len(boundaries) - 1):
+            split, gain = split_gain(cumsum, boundaries[i - 1], boundaries[i + 1], min_size)
+            if split is not None:
+                boundaries[i] = split
+    return [boundaries[0]] + [onset(signal, *boundaries[i - 1:i + 2], min_size) for i in range(1, len(boundaries) - 1)] + [boundaries[-1]]
+
+
+def onset(signal, start, boundary, end, min_size):
+    """Start of the transition that ends at a boundary.
+
+    The regulated velocity follows a layer change with a lag, which puts the
+    constant-mean boundary in the middle of the transition. The signal is
+    projected onto the step between the two segment means, and the boundary
+    is moved back to the last sample before it still at the level of the
+    left segment, keeping the left segment at least min_size long.
+    """
+    left = signal[start:boundary].mean(axis=0)
+    step = signal[boundary:end].mean(axis=0) - left
+    size = (step ** 2).sum()
+    if not size > 0:
+        return boundary
+    progress = (signal[start + min_size:boundary] - left) @ step / size
+    before = np.flatnonzero(progress < ONSET_FRACTION)
+    return start + min_size + int(before[-1]) + 1 if len(before) else start + min_size
+
+
+def layer_statistics(run, edges):
+    """Per-layer values between consecutive edge times."""
+    force_times, forces = run.times(FORCE_COLUMN), run.values(FORCE_COLUMN)
+    has_velocity = run.has(VELOCITY_COLUMN)
+    has_temperature = run.has(TEMPERATURE_CH1_COLUMN)
+    layers = []
+    for i, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        in_layer = (force_times >= start) & (force_times < end)
+        layer = {
+            'layer': i + 1,
+            'start': start,
+            'end': end,
+            'duration': end - start,
+            'mean_force': forces[in_layer].mean() if in_layer.any() else np.nan,
+            'mean_velocity': np.nan,
+            'depth_mm': np.nan,
+            'temp_start': np.nan,
+            'temp_rise': np.nan,
+        }
+        if has_velocity:
+            times, velocity = run.times(VELOCITY_COLUMN), run.values(VELOCITY_COLUMN)
+            inside = (times >= start) & (times < end)
+            if inside.any():
+                layer['mean_velocity'] = velocity[inside].mean()
+                # Layer thickness, feed velocity integrated over the layer
+                grid = np.concatenate([[start], times[inside], [end]])
+                layer['depth_mm'] = trapezoid(np.interp(grid, times, velocity), grid)
+        if has_temperature:
+            times, temperature = run.times(TEMPERATURE_CH1_COLUMN), run.values(TEMPERATURE_CH1_COLUMN)
+            if len(times):
+                temp_start, temp_end = np.interp([start, end], times, temperature)
+                layer['temp_start'] = temp_start
+                layer['temp_rise'] = temp_end - temp_start
+        layers.append(layer)
+    return layers
+
+
+def segment_run(path, layers=LAYERS, grid_rate=GRID_RATE, min_layer_time=MIN_LAYER_TIME):
+    """Per-layer statistics of one run, an empty list if the run has no cut."""
+    run = load_run(path)
+    interval = drilling_interval(run)
+    if interval is None:
+        return []
+    start, end = interval
+    size = int((end - start) * grid_rate)
+    channels = [resample(run.times(column), run.values(column), start, grid_rate, size)
+                for column in (FORCE_COLUMN, VELOCITY_COLUMN) if run.has(column)]
+    channels = [standardize(channel) for channel in channels if channel is not None]
+    if not channels or size < layers * 2:
+        return []
+    boundaries = change_points(np.column_stack(channels), layers, max(1, int(min_layer_time * grid_rate)))
+    edges = [start] + [start + boundary / grid_rate for boundary in boundaries[1:-1]] + [end]
+    return [{'file': os.path.basename(path.rstrip(os.sep)), **layer} for layer in layer_statistics(run, edges)]
+
+
+def segment_runs(paths, layers=LAYERS, workers=None):
+    """Per-layer table of many runs, processed in parallel."""
+    runs = expand_paths(paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(segment_run, runs, [layers] * len(runs), chunksize=max(1, len(runs) // 32))
+        return pd.DataFrame([layer for run_layers in results for layer in run_layers])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Split drilling runs into layers and report per-layer statistics.")
+    parser.add_argument('paths', nargs='+', help="Directories, CSV files, .run directories or glob patterns")
+    parser.add_argument('--layers', type=int, default=LAYERS, help="Number of layers per run")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes (all CPUs by default)")
+    parser.add_argument('-o', '--output', default=None, help="Save the per-layer table to this CSV file")
+    args = parser.parse_args()
+
+    results = segment_runs(args.paths, args.layers, args.workers)
+    if results.empty:
+        print("No runs with a cut found")
+    else:
+        if args.output:
+            results.to_csv(args.output, index=False)
+        print(results.round(3).to_string(index=False))
+        print()
+        print("Mean per layer:")
+        print(results.drop(columns=['file', 'start', 'end']).groupby('layer').mean().round(3).to_string())
@@ -0,0 +1,289 @@
+import argparse
+import os
+import pickle
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+import numpy as np
+from decimation import decimate
+
+DASHBOARD_FPS = 20
+DASHBOARD_WINDOW = 30  # s of data shown
+DASHBOARD_POINTS = 1000  # Force samples drawn per frame after decimation
+FORCE_SETPOINT = 40  # N, axial force held by the PLC in regulation mode
+PENDING_VALUES = 100000  # Velocity and temperature values kept for a busy dashboard, the oldest are dropped
+
+
+class LiveFeed:
+    """Logger side of the live dashboard (--dashboard).
+
+    A thread wakes up once per frame, copies the new force samples out of
+    force_buffer and the velocity, temperature and stop signal values handed
+    to it by the logger, and pipes them to the dashboard process. The
+    acquisition threads only append to bounded deques and matplotlib runs in
+    its own process, so plotting never waits on or holds the GIL of the
+    acquisition and PLC threads.
+    """
+
+    def __init__(self, force_buffer, time_origin, setpoint=FORCE_SETPOINT, fps=DASHBOARD_FPS, window=DASHBOARD_WINDOW,
+                 title='Live dashboard'):
+        self.force_buffer = force_buffer
+        self.time_origin = time_origin  # Returns the start time of the current run, None before the first run
+        self.interval = 1 / fps
+        self.command = [sys.executable, os.path.abspath(__file__), '--fps', str(fps), '--window', str(window), '--title', title]
+        if setpoint is not None:
+            self.command += ['--setpoint', str(setpoint)]
+        self.velocity = deque(maxlen=PENDING_VALUES)
+        self.temperatures = deque(maxlen=PENDING_VALUES)
+        self.events = deque(maxlen=100)
+        self.running = False
+        self.process = None
+        self.thread = threading.Thread(target=self.run, name='live-feed', daemon=True)
+
+    def start(self):
+        # A separate script, not multiprocessing, so the dashboard does not import the sensor drivers again.
+        # Lower priority, so on a busy PC the acquisition threads get the CPU first
+        flags = subprocess.BELOW_NORMAL_PRIORITY_CLASS if os.name == 'nt' else 0
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, creationflags=flags)
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join(timeout=1)
+        try:
+            self.process.stdin.close()  # The dashboard closes its window at the end of the stream
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.terminate()
+
+    def add_velocity(self, timestamps, values):
+        self.velocity.extend(zip(timestamps, values))
+
+    def add_temperatures(self, batch):
+        """Readings by timestamp, as logged by log_temperature_sample."""
+        self.temperatures.extend(batch.items())
+
+    def add_event(self, timestamp):
+        self.events.append(timestamp)
+
+    @staticmethod
+    def drain(values):
+        # popleft() is atomic, the logger threads keep appending meanwhile
+        return [values.popleft() for _ in range(len(values))]
+
+    def run(self):
+        next_seq = self.force_buffer.next_seq
+        started = time.time()
+        while self.running and self.process.poll() is None:
+            samples, next_seq = self.force_buffer.read_since(next_seq)
+            origin = self.time_origin()
+            frame = (
+                origin if origin is not None else started,
+                [sample[0] for sample in samples],
+                [sample[1] for sample in samples],
+                self.drain(self.velocity),
+                self.drain(self.temperatures),
+                self.drain(self.events),
+            )
+            try:
+                pickle.dump(frame, self.process.stdin)
+                self.process.stdin.flush()
+            except OSError:
+                # Window closed by the operator, logging goes on without it
+                break
+            time.sleep(self.interval)
+
+
+class LiveDashboard:
+    """Dashboard window, same channels and colors as regulation_plot.py.
+
+    Only the lines are redrawn on every frame (blitting), axes, ticks and
+    the legend are drawn again only when the time window scrolls or a value
+    leaves the current limits.
+    """
+
+    def __init__(self, frames, setpoint=FORCE_SETPOINT, window=DASHBOARD_WINDOW, title='Live dashboard'):
+        import matplotlib.pyplot as plt
+
+        self.frames = frames
+        self.window = window
+        self.origin = None
+        self.now = 0.0
+        self.stop_time = None
+        self.data = {}
+
+        self.fig, (self.ax1, self.ax3) = plt.subplots(2, 1, sharex=True, figsize=(12, 8))
+        self.ax2 = self.ax1.twinx()
+        if self.fig.canvas.manager is not None:
+            self.fig.canvas.manager.set_window_title(title)
+        self.lines = {
+            'force': self.ax1.plot([], [], color='black', linewidth=2, label='Aksijalna sila', animated=True)[0],
+            'ch1': self.ax2.plot([], [], color='red', linewidth=2, label='Temperatura uzorka', animated=True)[0],
+            'ch2': self.ax2.plot([], [], color='green', linestyle='--', linewidth=2, label='Temperatura prostorije', animated=True)[0],
+            'velocity': self.ax3.plot([], [], color='blue', linewidth=2, label='Posmična brzina', animated=True)[0],
+        }
+        self.stop_line = self.ax1.plot([], [], color='gray', linestyle='dashed', linewidth=2, label='Detekcija proboja',
+                                       transform=self.ax1.get_xaxis_transform(), animated=True)[0]
+        if setpoint is not None:
+            self.ax1.axhline(y=setpoint, color='black', linestyle='--', linewidth=2, label='Zadana aksijalna sila')
+
+        self.ax1.set_ylabel('Aksijalna sila, N')
+        self.ax2.set_ylabel('Temperatura, °C')
+        self.ax3.set_ylabel('Posmična brzina, mm/s')
+        self.ax3.set_xlabel('Vrijeme, s')
+        self.ax1.grid(axis='both', linestyle='-', linewidth=1.0)
+        self.ax3.grid(axis='both', linestyle='-', linewidth=1.0)
+        handles = [line for ax in (self.ax1, self.ax2, self.ax3) for line in ax.get_lines()]
+        self.fig.legend(handles=handles, loc='lower center', ncol=3)
+        self.fig.tight_layout(rect=[0, 0.08, 1, 1])
+        self.clear()
+
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def clear(self):
+        """New run, start with empty lines and the default limits."""
+        empty = np.zeros(0)
+        self.data = {name: (empty, empty) for name in self.lines}
+        self.now = 0.0
+        self.stop_time = None
+        self.ax3.set_xlim(0, self.window)
+        self.ax1.set_ylim(-10, 50)
+        self.ax2.set_ylim(20, 40)
+        self.ax3.set_ylim(0, 1)
+
+    def on_draw(self, event):
+        # Full redraw (first show, resize, new limits): keep the static parts for blitting
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for line in list(self.lines.values()) + [self.stop_line]:
+            self.fig.draw_artist(line)
+
+    def append(self, name, times, values):
+        if not len(times):
+            return
+        times = np.concatenate([self.data[name][0], np.asarray(times, dtype=float) - self.origin])
+        values = np.concatenate([self.data[name][1], np.asarray(values, dtype=float)])
+        self.now = max(self.now, times[-1])
+        self.data[name] = (times, values)
+
+    def receive(self):
+        """Add all queued frames, return False once the logger has stopped."""
+        while True:
+            try:
+                frame = self.frames.get_nowait()
+            except queue.Empty:
+                return True
+            if frame is None:
+                return False
+            origin, force_times, forces, velocity, temperatures, events = frame
+            if origin != self.origin:
+                self.origin = origin
+                self.clear()
+            self.append('force', force_times, forces)
+            if velocity:
+                self.append('velocity', *zip(*velocity))
+            for channel, name in ((1, 'ch1'), (2, 'ch2')):
+                readings = [(timestamp, values[channel]) for timestamp, values in temperatures if values.get(channel) is not None]
+                if readings:
+                    self.append(name, *zip(*readings))
+            for timestamp in events:
+                self.stop_time = timestamp - self.origin
+
+    def rescale(self):
+        """Scroll the time axis and widen the value limits, True if a full redraw is needed."""
+        redraw = False
+        left, right = self.ax3.get_xlim()
+        if self.now > right:
+            # Scroll by a quarter window, so the axes are redrawn only every few seconds
+            left = self.now - 0.75 * self.window
+            self.ax3.set_xlim(left, left + self.window)
+            redraw = True
+        for name, (times, values) in self.data.items():
+            visible = times >= left
+            self.data[name] = (times[visible], values[visible])
+            values = values[visible]
+            values = values[np.isfinite(values)]
+            if not len(values):
+                continue
+            ax = self.lines[name].axes
+            bottom, top = ax.get_ylim()
+            low, high = values.min(), values.max()
+            if low < bottom or high > top:
+                margin = 0.1 * max(high - low, 1.0)
+                ax.set_ylim(min(bottom, low - margin), max(top, high + margin))
+                redraw = True
+        return redraw
+
+    def update(self):
+        if not self.receive():
+            self.close()
+            return
+        redraw = self.rescale()
+        for name, (times, values) in self.data.items():
+            if name == 'force':
+                times, values = decimate(times, values, DASHBOARD_POINTS)
+            self.lines[name].set_data(times, values)
+        if self.stop_time is not None:
+            self.stop_line.set_data([self.stop_time, self.stop_time], [0, 1])
+        else:
+            self.stop_line.set_data([], [])
+
+        canvas = self.fig.canvas
+        if redraw or self.background is None:
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self.draw_lines()
+            canvas.blit(self.fig.bbox)
+
+    def close(self):
+        import matplotlib.pyplot as plt
+
+        plt.close(self.fig)
+
+
+def read_frames(stream, frames):
+    """Reader thread of the dashboard process, None marks the end of the stream."""
+    try:
+        while True:
+            frames.put(pickle.load(stream))
+    except (EOFError, OSError, pickle.UnpicklingError):
+        frames.put(None)
+
+
+def run_dashboard(stream, setpoint=FORCE_SETPOINT, fps=DASHBOARD_FPS, window=DASHBOARD_WINDOW, title='Live dashboard'):
+    """Show the window until the logger stops or the window is closed."""
+    import matplotlib.pyplot as plt
+
+    frames = queue.Queue()
+    threading.Thread(target=read_frames, args=(stream, frames), daemon=True).start()
+    dashboard = LiveDashboard(frames, setpoint, window, title)
+    timer = dashboard.fig.canvas.new_timer(interval=int(1000 / fps))
+    timer.add_callback(dashboard.update)
+    timer.start()
+    plt.show()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Live dashboard of a logger run, started by regulation.py --dashboard.")
+    parser.add_argument('--fps', type=float, default=DASHBOARD_FPS, help="Frames per second")
+    parser.add_argument('--window', type=float, default=DASHBOARD_WINDOW, help="Seconds of data shown")
+    parser.add_argument('--setpoint', type=float, default=None, help="Force setpoint line in N")
+    parser.add_argument('--title', default='Live dashboard', help="Window title")
+    args = parser.parse_args()
+    # CTRL+C in the logger console stops the logger, which then closes the dashboard
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(os, 'nice'):
+        os.nice(10)
+    run_dashboard(sys.stdin.buffer, args.setpoint, args.fps, args.window, args.title)
@@ -0,0 +1,255 @@
+import bisect
+import http.server
+import math
+import threading
+import time
+from periodic import PeriodicScheduler
+
+# Acquisition health of a logger: counters, gauges and histograms updated by the logger
+# threads, served in the Prometheus text format with --metrics (http://127.0.0.1:9108/metrics)
+# and written to output_<timestamp>_metrics.txt at the end of every run. In the run summary,
+# counters and histograms hold what happened during the run, gauges and quantiles their value
+# at the end, so the files of different sessions can be compared directly.
+
+METRICS_PORT = 9108
+DURATION_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)  # s
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+def format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """One time series of a metric family.
+
+    `function`, if given, is called at every scrape instead of keeping a
+    value, for counts the logger already has (e.g. force_buffer.next_seq);
+    returning None leaves the series out.
+    """
+
+    type = 'untyped'
+
+    def __init__(self, name, help, labels, function=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.function = function
+        self.value = 0
+
+    def samples(self):
+        """(suffix, labels, value) of the exposed samples."""
+        value = self.function() if self.function is not None else self.value
+        if value is not None:
+            yield '', self.labels, value
+
+
+class Counter(Metric):
+    """Count that only goes up. inc() is a plain add, every counter is updated by one thread."""
+
+    type = 'counter'
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram(Metric):
+    """Counts of observed values in cumulative buckets, observe() is one bisect."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels, buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            yield '_bucket', {**self.labels, 'le': format_value(bound)}, cumulative
+        yield '_sum', self.labels, self.sum
+        yield '_count', self.labels, self.count
+
+
+class LatencySummary(Metric):
+    """Quantiles in s of a LatencyHistogram (ns), e.g. those of the logger's plc_latency.
+
+    histogram is a function returning the histogram, or None while there is none.
+    """
+
+    type = 'summary'
+
+    def __init__(self, name, help, labels, histogram):
+        super().__init__(name, help, labels)
+        self.histogram = histogram
+
+    def samples(self):
+        histogram = self.histogram()
+        if histogram is None:
+            return
+        for quantile in QUANTILES:
+            yield '', {**self.labels, 'quantile': f'{quantile:g}'}, histogram.percentile(quantile * 100) / 1e9
+        yield '_sum', self.labels, histogram.sum / 1e9
+        yield '_count', self.labels, histogram.total
+
+
+class MetricsRegistry:
+    """The metrics of one logger process, by family name in registration order."""
+
+    def __init__(self):
+        self.families = {}
+
+    def register(self, metric):
+        self.families.setdefault(metric.name, []).append(metric)
+        return metric
+
+    def counter(self, name, help, function=None, **labels):
+        return self.register(Counter(name, help, labels, function))
+
+    def gauge(self, name, help, function=None, **labels):
+        return self.register(Gauge(name, help, labels, function))
+
+    def histogram(self, name, help, buckets=DURATION_BUCKETS, **labels):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def latency_summary(self, name, help, histogram, **labels):
+        return self.register(LatencySummary(name, help, labels, histogram))
+
+    def collect(self):
+        """(family name, type, help, [(sample name, labels, value)]) of every family."""
+        for name, metrics in self.families.items():
+            samples = [(name + suffix, labels, value) for metric in metrics for suffix, labels, value in metric.samples()]
+            yield name, metrics[0].type, metrics[0].help, samples
+
+    def exposition(self, families=None):
+        lines = []
+        for name, metric_type, help, samples in families if families is not None else self.collect():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.extend(f'{sample}{format_labels(labels)} {format_value(value)}' for sample, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Time and sample values now, the start of a run for write_summary."""
+        values = {}
+        for name, metric_type, help, samples in self.collect():
+            for sample, labels, value in samples:
+                values[(sample, tuple(labels.items()))] = value
+        return time.time(), values
+
+    def write_summary(self, path, since):
+        """Metrics of one run as Prometheus text: counters and histograms since the snapshot `since`."""
+        start, start_values = since
+        families = [('drilling_run_duration_seconds', 'gauge', "Duration of the run", [('drilling_run_duration_seconds', {}, time.time() - start)])]
+        for name, metric_type, help, samples in self.collect():
+            run_samples = []
+            for sample, labels, value in samples:
+                cumulative = metric_type in ('counter', 'histogram') or sample.endswith(('_sum', '_count'))
+                if cumulative:
+                    value -= start_values.get((sample, tuple(labels.items())), 0)
+                run_samples.append((sample, labels, value))
+            families.append((name, metric_type, help, run_samples))
+        with open(path, 'w') as f:
+            f.write(self.exposition(families))
+        print(f"Run metrics written to {path}")
+
+
+class MetricsServer:
+    """Serves the registry at http://host:port/metrics from a daemon thread (--metrics)."""
+
+    def __init__(self, registry, port=METRICS_PORT, host='127.0.0.1'):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # No console line per scrape
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"Metrics at http://{host}:{port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def register_logger_metrics(registry, logger, stream=None):
+    """Metrics read from the logger's own state at each scrape, so the acquisition threads pay nothing for them.
+
+    `logger` is drilling_logger, `stream` its NetFTStream with -s.
+    Loops and histograms that run in another process with --multiprocess
+    are left out, the control process writes them to _latency.txt.
+    """
+    registry.counter('drilling_samples_total', "Samples acquired per channel", lambda: logger.force_buffer.next_seq, channel='force')
+
+    def force_age():
+        sample = logger.force_buffer.latest()
+        return time.time() - sample[0] if sample is not None else None
+    registry.gauge('drilling_force_sample_age_seconds', "Age of the newest force sample", force_age)
+    if stream is not None:
+        registry.counter('drilling_rdt_packets_total', "RDT packets received from the NetFT", lambda: stream.received)
+        registry.counter('drilling_samples_dropped_total', "Samples lost before they reached the logger", lambda: stream.dropped, channel='rdt')
+
+    writer = logger.csv_writer
+    registry.counter('drilling_samples_dropped_total', "Samples lost before they reached the logger", lambda: writer.dropped_total, channel='csv')
+    registry.counter('drilling_csv_rows_total', "Rows written by the CSV writer thread", lambda: writer.rows_written)
+    registry.gauge('drilling_csv_queue_rows', "Rows waiting for the CSV writer thread", lambda: writer.queue.qsize())
+    registry.counter('drilling_csv_busy_seconds_total', "Time the CSV writer thread spent writing and flushing", lambda: writer.busy_time)
+
+    def loop_value(name, read):
+        def value():
+            scheduler = logger.schedulers.get(name)
+            return read(scheduler) if isinstance(scheduler, PeriodicScheduler) else None
+        return value
+    for name in logger.schedulers:
+        registry.gauge('drilling_loop_rate_hz', "Rate achieved by a periodic loop since the run started",
+                       loop_value(name, PeriodicScheduler.achieved_rate), loop=name)
+        registry.counter('drilling_loop_overruns_total', "Ticks of a periodic loop that started after their deadline",
+                         loop_value(name, lambda scheduler: scheduler.overruns), loop=name)
+        registry.counter('drilling_loop_skipped_ticks_total', "Deadlines a periodic loop missed entirely",
+                         loop_value(name, lambda scheduler: scheduler.skipped), loop=name)
+
+    def plc_histogram(attribute):
+        return lambda: getattr(logger.plc_latency, attribute, None)
+    registry.latency_summary('drilling_plc_loop_period_seconds', "Period of the PLC send loop", plc_histogram('loop_period'))
+    registry.latency_summary('drilling_plc_latency_seconds', "Sensor read to sendall done of the force sent to the PLC", plc_histogram('read_to_sent'))
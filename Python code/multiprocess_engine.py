@@ -0,0 +1,400 @@
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from force_buffer import ForceRingBuffer
+from latency_histogram import ControlLoopLatency
+from netft_stream import NetFTStream
+from periodic import PeriodicScheduler
+from shared_ring import SharedRing, RingPublisher, SHARED_RING_NAME, temperature_records
+from stream_framing import FloatFrameReader
+from tc08_stream import TC08Stream
+
+# Processes of --multiprocess:
+#
+#   control      NetFT sensor -> force_buffer -> PLC send loop, and the PLC words on PORT_FORCE.
+#                Optionally pinned to one CPU (--control-cpu), raised priority where allowed.
+#   temperature  TC-08 readings at the temperature rate
+#   velocity     shear velocity values from PORT_VELOCITY (regulation only)
+#   logger       the process started from the command line: CSV writer, breakthrough
+#                detector, phase tracking, console, dashboard
+#
+# Force, temperature and velocity samples go to the logger through the rings of a SharedRing
+# (see shared_ring.py), each ring written by the process that produces the channel. The PLC
+# words go from the control process to the logger over a pipe, and the commands of the logger
+# (latency reset and dump) over another. The stop command of the detector (--detector-stop)
+# goes from the logger process to the PLC on its own connection. Nothing the logger
+# does, a slow disk, a console print or a dashboard frame, runs in the interpreter of the
+# control loop.
+
+RING_POLL_INTERVAL = 0.002  # s, how often the logger copies new samples out of the rings
+CONTROL_NICE = -10  # Unix niceness of the control process, needs root or CAP_SYS_NICE
+HIGH_PRIORITY_CLASS = 0x00000080  # Windows SetPriorityClass
+JOIN_TIMEOUT = 5  # s
+
+
+def logger_module():
+    # Set up by the logger script: fork copies it, spawn (Windows) imports the script again without its __main__ block
+    import drilling_logger
+    return drilling_logger
+
+
+def configure(logger, args):
+    """Settings of the logger's __main__ block that the processes need, and fresh loop state."""
+    logger.SERVER_HOST = args.plc_host
+    logger.TEMPERATURE_CHANNELS = sorted({int(channel) for channel in args.temp_channels.split(',')} | {1, 2})
+    logger.running = True
+    # Not the parent's objects, whose locks another thread may have held at the fork
+    logger.force_buffer = ForceRingBuffer()
+    logger.plc_latency = ControlLoopLatency(1 / args.plc_rate)
+    logger.schedulers = {'plc': PeriodicScheduler(args.plc_rate, 'PLC send')}
+    if not args.stream:
+        logger.schedulers['force'] = PeriodicScheduler(args.force_rate, 'Force acquisition')
+    # Ctrl+C reaches the whole console process group, the logger process stops the others
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def pin_process(cpus):
+    """Restrict this process to the given CPUs, where the OS allows it."""
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        elif os.name == 'nt':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            if not kernel32.SetProcessAffinityMask(kernel32.GetCurrentProcess(), sum(1 << cpu for cpu in cpus)):
+                return False
+        else:
+            return False
+        return True
+    except OSError:
+        return False
+
+
+def raise_priority():
+    """Raise the scheduling priority of this process, where the OS allows it."""
+    try:
+        if os.name == 'nt':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            return bool(kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), HIGH_PRIORITY_CLASS))
+        os.nice(CONTROL_NICE)
+        return True
+    except OSError:
+        return False
+
+
+def control_process(args, nula, ring, commands, signals):
+    """Sensor -> PLC control path, forwards the PLC words to the logger process."""
+    logger = logger_module()
+    configure(logger, args)
+    placement = []
+    if args.control_cpu is not None:
+        placement.append(f"CPU {args.control_cpu}" if pin_process({args.control_cpu}) else "not pinned")
+    placement.append("raised priority" if raise_priority() else "normal priority (no permission to raise it)")
+    print(f"Control process {os.getpid()}: {', '.join(placement)}")
+
+    if args.stream:
+        stream = NetFTStream(args.ip, sample_rate=args.rate)
+        stream.start()
+        sensor_thread = threading.Thread(target=logger.acquire_axial_force_stream, args=(stream, nula), daemon=True)
+    else:
+        sensor = logger.initialize_sensor(args.ip)
+        sensor_thread = threading.Thread(target=logger.acquire_axial_force, args=(sensor, nula, logger.schedulers['force']), daemon=True)
+    sensor_thread.start()
+    publisher = RingPublisher(logger.force_buffer, ring=ring, rings=('force',))
+    publisher.start()
+
+    client_socket = logger.connect_to_server(logger.PORT_FORCE)
+    send_thread = threading.Thread(target=logger.send_data_to_plc, args=(client_socket, logger.schedulers['plc']), daemon=True)
+    send_thread.start()
+    threading.Thread(target=control_commands, args=(logger, commands), daemon=True).start()
+
+    pending = b''
+    try:
+        while logger.running:
+            # select instead of the socket timeout, which also applies to sendall of the send loop
+            readable, _, _ = select.select([client_socket], [], [], 0.1)
+            if not readable:
+                continue
+            data = client_socket.recv(64)
+            if not data:
+                print("PLC closed the connection")
+                break
+            pending += data
+            while len(pending) >= 2:
+                signals.send_bytes(pending[:2])
+                pending = pending[2:]
+    except (OSError, ValueError) as e:
+        if logger.running:
+            print(f"Error receiving PLC data: {e}")
+    finally:
+        logger.running = False
+        sensor_thread.join(timeout=2)
+        send_thread.join(timeout=2)
+        publisher.stop()
+        signals.close()
+
+
+def control_commands(logger, commands):
+    """Commands of the logger process, see ControlChannel."""
+    try:
+        while True:
+            command, *arguments = commands.recv()
+            if command == 'reset':
+                logger.plc_latency.reset()
+                for scheduler in logger.schedulers.values():
+                    scheduler.reset()
+            elif command == 'dump':
+                logger.plc_latency.dump(arguments[0])
+                for scheduler in logger.schedulers.values():
+                    print(scheduler.summary())
+            elif command == 'quit':
+                break
+    except EOFError:
+        print("Logger process gone, stopping the control loop")
+    logger.running = False
+
+
+def temperature_process(args, ring, stop):
+    """TC-08 readings into the temperature ring, also between runs."""
+    logger = logger_module()
+    configure(logger, args)
+    logger.initialize_temperature_sensor()
+    temp_stream = None
+    if args.temp_stream:
+        temp_stream = TC08Stream(logger.temp_chandle, logger.TEMPERATURE_CHANNELS, args.temp_interval)
+        temp_stream.start()
+    scheduler = PeriodicScheduler(args.temp_rate, 'Temperature')
+    parent = multiprocessing.parent_process()
+    try:
+        while not stop.is_set() and parent.is_alive():
+            batch = temp_stream.read() if temp_stream is not None else {time.time(): logger.get_temperatures()}
+            ring.append('temperature', temperature_records(batch, ring.temperature_channels))
+            scheduler.wait()
+    finally:
+        if temp_stream is not None:
+            temp_stream.stop()
+
+
+def velocity_process(args, ring, stop):
+    """Shear velocity values of the PLC into the velocity ring."""
+    logger = logger_module()
+    configure(logger, args)
+    velocity_socket = logger.connect_to_server(logger.mode.PORT_VELOCITY)
+    velocity_socket.settimeout(0.1)
+    velocity_reader = FloatFrameReader()
+    parent = multiprocessing.parent_process()
+    try:
+        while not stop.is_set() and parent.is_alive():
+            try:
+                timestamps, values = velocity_reader.recv_from(velocity_socket)
+                ring.append('velocity', list(zip(timestamps, values)))
+            except socket.timeout:
+                pass
+    except (OSError, ConnectionError) as e:
+        print(f"Shear velocity process stopped: {e}")
+    finally:
+        velocity_socket.close()
+
+
+class ControlChannel:
+    """Logger end of the command pipe, in place of the logger's plc_latency.
+
+    log_axial_force resets and finalize_csv_logging dumps plc_latency, with
+    --multiprocess the histograms are in the control process, which does both.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()  # Sent to from several logging threads
+
+    def send(self, *message):
+        with self.lock:
+            try:
+                self.connection.send(message)
+            except (OSError, ValueError):
+                pass  # Control process already gone
+
+    def reset(self):
+        self.send('reset')
+
+    def dump(self, path):
+        self.send('dump', path)
+
+
+class ControlLoop:
+    """Stands in the logger's schedulers for a loop of the control process.
+
+    Its rate goes into the run metadata, the control process reports how the
+    loop ran when the latency is dumped.
+    """
+
+    def __init__(self, rate, name):
+        self.rate = rate
+        self.name = name
+
+    def reset(self):
+        pass
+
+    def summary(self):
+        return f"{self.name}: {self.rate:g} Hz configured, runs in the control process"
+
+
+class RingTemperatures:
+    """Readings of the temperature process, drained by log_temperature_sample like a TC08Stream."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.seq = ring.written('temperature')
+
+    def read(self):
+        records, self.seq = self.ring.read_since('temperature', self.seq)
+        channels = self.ring.temperature_channels
+        return {row[0]: dict(zip(channels, row[1:])) for row in records.tolist()}
+
+    def stop(self):
+        pass
+
+
+class MultiprocessEngine:
+    """--multiprocess: the control path and the devices in their own processes.
+
+    `logger` is drilling_logger, set up by the logger script (regulation or
+    constant_shear_velocity). Its CSV logging, detector and console threads run
+    unchanged in this process on a force_buffer fed from the force ring, the
+    PLC words are handled by its signal handlers as in receive_plc_data.
+    """
+
+    def __init__(self, logger, args, nula):
+        self.logger = logger
+        self.args = args
+        # fork keeps the fake devices of hil_simulator.py, Windows only has spawn
+        context = multiprocessing.get_context('spawn' if os.name == 'nt' else 'fork')
+        self.ring = SharedRing(args.shared_ring or f'{SHARED_RING_NAME}_{os.getpid()}', create=True,
+                               temperature_channels=logger.TEMPERATURE_CHANNELS)
+        self.signals, signals_end = context.Pipe(duplex=False)
+        commands_end, commands = context.Pipe(duplex=False)
+        self.control = ControlChannel(commands)
+        self.stop_event = context.Event()
+        self.control_process = context.Process(target=control_process, args=(args, nula, self.ring, commands_end, signals_end),
+                                               name='control', daemon=True)
+        self.workers = [context.Process(target=temperature_process, args=(args, self.ring, self.stop_event), name='temperature', daemon=True)]
+        self.has_velocity = hasattr(logger.mode, 'PORT_VELOCITY')
+        if self.has_velocity:
+            self.workers.append(context.Process(target=velocity_process, args=(args, self.ring, self.stop_event), name='velocity', daemon=True))
+        self.threads = []
+
+    def start(self):
+        logger = self.logger
+        sys.stdout.flush()  # Otherwise forked processes print the buffered output again
+        self.control_process.start()
+        if self.args.control_cpu is not None:
+            # Everything else off the control CPU
+            pin_process(set(range(os.cpu_count() or 1)) - {self.args.control_cpu} or {self.args.control_cpu})
+        for worker in self.workers:
+            worker.start()
+        print(f"Processes: control {self.control_process.pid}, " +
+              ', '.join(f"{worker.name} {worker.pid}" for worker in self.workers) + f", logger {os.getpid()}")
+
+        logger.plc_latency = self.control
+        # The temperature scheduler stays here, it paces log_temperature_sample draining the temperature ring
+        logger.schedulers = {name: scheduler if name == 'temperature' else ControlLoop(scheduler.rate, scheduler.name)
+                             for name, scheduler in logger.schedulers.items()}
+        logger.temp_stream = RingTemperatures(self.ring)
+        logger.shared_ring = RingPublisher(None, ring=self.ring, rings=('events',))
+        logger.shared_ring.start()
+        if self.args.shared_ring:
+            print(f"Shared memory ring buffer: {self.ring.name}")
+
+        self.start_thread(self.receive_signals)
+        self.start_thread(self.read_rings)
+        self.start_thread(logger.log_axial_force)
+        self.start_thread(logger.log_temperature, logger.schedulers['temperature'])
+        if logger.breakthrough_detector is not None:
+            self.start_thread(logger.detect_breakthrough)
+        if self.args.continuous:
+            self.start_thread(logger.print_axial_force)
+
+    def start_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def receive_signals(self):
+        """PLC words forwarded by the control process, handled as in receive_plc_data."""
+        logger = self.logger
+        try:
+            while logger.running:
+                if not self.signals.poll(0.1):
+                    continue
+                data = self.signals.recv_bytes()
+                if data == b'\x01\x00':  # Receiving TRUE signal
+                    logger.start_logging()
+                elif data in getattr(logger.mode, 'PHASE_SIGNALS', {}):  # Interval drilling phase words
+                    logger.mode.mark_phase_signal(data)
+                elif data == b'\x00\x00':  # Receiving FALSE signal
+                    logger.mark_stop_signal()
+                    # Post-stop tail for more temperature measurements
+                    extended_logging_start = time.time()
+                    while logger.running and time.time() - extended_logging_start < logger.POST_STOP_LOGGING_TIME:
+                        time.sleep(0.1)
+                    logger.stop_logging()
+        except (EOFError, OSError):
+            print("Control process closed the signal pipe")
+            logger.running = False
+
+    def read_rings(self):
+        """Copies new force and velocity samples to the logger."""
+        logger = self.logger
+        force_seq = self.ring.written('force')
+        velocity_seq = self.ring.written('velocity')
+        while logger.running:
+            records, force_seq = self.ring.read_since('force', force_seq)
+            if len(records):
+                logger.force_buffer.extend(records['time'].tolist(), records['force'].tolist())
+            if self.has_velocity:
+                records, velocity_seq = self.ring.read_since('velocity', velocity_seq)
+                if len(records):
+                    logger.mode.log_shear_velocity_values(records['time'].tolist(), records['velocity'].tolist())
+            if not self.control_process.is_alive():
+                print(f"Control process exited with code {self.control_process.exitcode}")
+                logger.running = False
+            time.sleep(RING_POLL_INTERVAL)
+
+    def wait(self):
+        while self.logger.running:
+            time.sleep(1)
+
+    def shutdown(self):
+        logger = self.logger
+        logger.running = False
+        for thread in self.threads:
+            thread.join(timeout=2)
+        # Sends the latency dump of the last run before the control process is told to quit
+        logger.finalize_csv_logging()
+        self.control.send('quit')
+        self.stop_event.set()
+        for process in [self.control_process] + self.workers:
+            process.join(timeout=JOIN_TIMEOUT)
+            if process.is_alive():
+                print(f"{process.name} process did not stop, terminating it")
+                process.terminate()
+        logger.shutdown()  # Before the ring is closed, the events publisher writes to it
+        self.ring.close()
+
+
+def run(logger, args, nula):
+    engine = MultiprocessEngine(logger, args, nula)
+    try:
+        engine.start()
+        engine.wait()
+    except KeyboardInterrupt:
+        print("\nReceived CTRL+C, shutting down...")
+    finally:
+        engine.shutdown()
+        print("Program successfully terminated.")
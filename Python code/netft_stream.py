@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+import argparse
+import math
+import random
+import socket
+import struct
+import time
+import numpy as np
+
+# ATI NetFT RDT (Raw Data Transfer) interface
+RDT_PORT = 49152
+RDT_HEADER = 0x1234
+RDT_CMD_STOP = 0x0000
+RDT_CMD_START_REALTIME = 0x0002  # High-speed real-time streaming
+RDT_REQUEST = struct.Struct('>HHI')  # header, command, sample count (0 = infinite)
+RDT_RECORD = struct.Struct('>3I6i')  # rdt_sequence, ft_sequence, status, Fx, Fy, Fz, Tx, Ty, Tz
+RDT_RECORD_DTYPE = np.dtype([
+    ('rdt_sequence', '>u4'),
+    ('ft_sequence', '>u4'),
+    ('status', '>u4'),
+    ('ft', '>i4', (6,)),
+])
+
+
+class NetFTStream:
+    """Continuous RDT streaming from the NetFT, received and decoded in batches."""
+
+    def __init__(self, ip_address, sample_rate=1000, batch_size=64, port=RDT_PORT):
+        self.address = (ip_address, port)
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.buffer = bytearray(batch_size * RDT_RECORD.size)
+        self.view = memoryview(self.buffer)
+        self.socket = None
+        self.last_rdt_sequence = None
+        self.received = 0
+        self.dropped = 0
+        self.late = 0
+
+    def start(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.socket.settimeout(1)
+        self.socket.sendto(RDT_REQUEST.pack(RDT_HEADER, RDT_CMD_START_REALTIME, 0), self.address)
+        print(f"RDT streaming started from {self.address[0]}:{self.address[1]}")
+
+    def stop(self):
+        if self.socket:
+            try:
+                self.socket.sendto(RDT_REQUEST.pack(RDT_HEADER, RDT_CMD_STOP, 0), self.address)
+            finally:
+                self.socket.close()
+                self.socket = None
+
+    def receive_batch(self):
+        """Receive up to batch_size packets and decode them in one go.
+
+        Blocks for the first packet, then drains whatever else is already
+        queued on the socket. Returns (timestamps, rdt_sequences, ft) where ft
+        is an (n, 6) array of raw counts, without late (reordered or
+        duplicate) packets.
+        """
+        count = 0
+        self.socket.settimeout(1)
+        try:
+            while count < self.batch_size:
+                offset = count * RDT_RECORD.size
+                nbytes = self.socket.recv_into(self.view[offset:offset + RDT_RECORD.size], RDT_RECORD.size)
+                if nbytes == RDT_RECORD.size:
+                    count += 1
+                if count == 1:
+                    self.socket.setblocking(False)
+        except (BlockingIOError, socket.timeout):
+            pass
+        received_time = time.time()
+
+        records = np.frombuffer(self.buffer, dtype=RDT_RECORD_DTYPE, count=count)
+        sequences = records['rdt_sequence'].astype(np.int64)
+        ft = records['ft'].astype(np.int64)
+        if count == 0:
+            return np.empty(0), sequences, ft
+
+        # Sequence steps since the last in-order packet, as signed 32-bit (the uint32 counter wraps around)
+        if self.last_rdt_sequence is None:
+            previous = int(sequences[0]) - 1
+        else:
+            previous = self.last_rdt_sequence
+        steps = (sequences - previous + (1 << 31)) % (1 << 32) - (1 << 31)
+        # A packet not past the newest one before it was reordered or duplicated on the way: skipped
+        # and counted as late. Only gaps between in-order packets are dropped packets.
+        newest = np.maximum.accumulate(np.concatenate(([0], steps)))[:-1]
+        in_order = steps > newest
+        self.late += count - int(np.count_nonzero(in_order))
+        self.dropped += int(np.sum(steps[in_order] - newest[in_order] - 1))
+        self.received += count
+        sequences, ft, steps = sequences[in_order], ft[in_order], steps[in_order]
+        if len(sequences) == 0:
+            return np.empty(0), sequences, ft
+        self.last_rdt_sequence = int((previous + steps[-1]) % (1 << 32))
+
+        # Timestamps are back-filled from the arrival of the newest packet at the sensor output rate
+        timestamps = received_time - (steps[-1] - steps) / self.sample_rate
+        return timestamps, sequences, ft
+
+
+def run_simulated_sensor(host='127.0.0.1', port=RDT_PORT, sample_rate=1000, drop_probability=0.0, stop_event=None):
+    """Local UDP stand-in for the NetFT RDT interface, for testing without hardware."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind((host, port))
+    server.settimeout(0.1)
+    print(f"Simulated NetFT streaming on {host}:{port} at {sample_rate} Hz")
+
+    client = None
+    rdt_sequence = 0
+    period = 1.0 / sample_rate
+    next_time = time.perf_counter()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            try:
+                request, address = server.recvfrom(RDT_REQUEST.size)
+                header, command, sample_count = RDT_REQUEST.unpack(request)
+                if header == RDT_HEADER and command == RDT_CMD_START_REALTIME:
+                    client = address
+                    next_time = time.perf_counter()
+                elif header == RDT_HEADER and command == RDT_CMD_STOP:
+                    client = None
+            except socket.timeout:
+                pass
+            except BlockingIOError:
+                pass
+
+            if client is None:
+                server.settimeout(0.1)
+                continue
+
+            # Send every packet that is due since the last pass
+            server.setblocking(False)
+            now = time.perf_counter()
+            while next_time <= now:
+                rdt_sequence = (rdt_sequence + 1) % (1 << 32)
+                t = rdt_sequence * period
+                fz = int(-40e6 * (1 - math.exp(-t)) + random.gauss(0, 2e5))
+                if random.random() >= drop_probability:
+                    server.sendto(RDT_RECORD.pack(rdt_sequence, rdt_sequence, 0, 0, 0, fz, 0, 0, 0), client)
+                next_time += period
+            time.sleep(max(0.0, min(next_time - time.perf_counter(), 0.001)))
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ATI NetFT RDT streaming test and local stand-in sensor.")
+    parser.add_argument('ip', metavar='ip address', type=str, nargs='?', default='127.0.0.1', help="The IP address of the sensor")
+    parser.add_argument('--simulate', action='store_true', help="Run a local stand-in sensor instead of reading one")
+    parser.add_argument('--rate', type=int, default=1000, help="RDT output rate of the sensor in Hz")
+    parser.add_argument('--drop', type=float, default=0.0, help="Packet drop probability of the stand-in sensor")
+    parser.add_argument('--duration', type=float, default=5.0, help="How long to read the sensor in seconds")
+    args = parser.parse_args()
+
+    if args.simulate:
+        try:
+            run_simulated_sensor(args.ip, sample_rate=args.rate, drop_probability=args.drop)
+        except KeyboardInterrupt:
+            print("Exiting simulated sensor.")
+    else:
+        stream = NetFTStream(args.ip, sample_rate=args.rate)
+        stream.start()
+        start = time.time()
+        try:
+            while time.time() - start < args.duration:
+                timestamps, sequences, ft = stream.receive_batch()
+                if len(sequences):
+                    print(f"{len(sequences):3d} packets, last Fz: {ft[-1, 2] / 1000000:.3f} N")
+        finally:
+            stream.stop()
+        elapsed = time.time() - start
+        print(f"Received {stream.received} packets ({stream.received / elapsed:.0f} Hz), dropped {stream.dropped}, late {stream.late}")
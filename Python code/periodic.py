@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+
+class PeriodicScheduler:
+    """Fixed-rate loop timing with absolute deadlines on time.perf_counter_ns.
+
+    Unlike work followed by time.sleep(period), the time spent in the loop body
+    does not add to the period, so the configured rate is the rate achieved.
+    A tick that starts after its deadline is counted as an overrun and the
+    missed deadlines are skipped instead of being caught up in a burst.
+    """
+
+    def __init__(self, rate, name=''):
+        self.name = name
+        self.rate = rate
+        self.period_ns = int(1e9 / rate)
+        self.next_deadline_ns = None
+        self.start_ns = None
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+
+    def next_delay(self):
+        """Advance to the next deadline and return how long to sleep until it, in s."""
+        now = time.perf_counter_ns()
+        if self.next_deadline_ns is None:
+            self.start_ns = now
+            self.next_deadline_ns = now + self.period_ns
+            return 0.0
+
+        delay = self.next_deadline_ns - now
+        if delay > 0:
+            self.next_deadline_ns += self.period_ns
+        else:
+            self.overruns += 1
+            missed = -delay // self.period_ns
+            self.skipped += missed
+            self.next_deadline_ns += (missed + 1) * self.period_ns
+            delay = 0
+        self.ticks += 1
+        return delay / 1e9
+
+    def wait(self):
+        """Block until the next deadline, the first call returns immediately."""
+        delay = self.next_delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """Same as wait() for loops running as asyncio tasks."""
+        delay = self.next_delay()
+        await asyncio.sleep(delay)
+
+    def reset(self):
+        """Restart the statistics, the deadlines keep their phase.
+
+        Safe to call from another thread while the loop is waiting.
+        """
+        self.start_ns = time.perf_counter_ns()
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+
+    def achieved_rate(self):
+        if self.start_ns is None or self.ticks == 0:
+            return 0.0
+        return self.ticks * 1e9 / (time.perf_counter_ns() - self.start_ns)
+
+    def summary(self):
+        return (f"{self.name}: {self.rate:g} Hz configured, {self.achieved_rate():.1f} Hz achieved, "
+                f"{self.overruns} overruns, {self.skipped} skipped ticks")
@@ -1,299 +1,67 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
-import NetFT
-import argparse
 import time
 import socket
-import struct
-import threading
-import csv
-import os
-import ctypes
-from picosdk.usbtc08 import usbtc08 as tc08
-from picosdk.functions import assert_pico2000_ok
+import sys
+import drilling_logger as logger
+from stream_framing import FloatFrameReader
 
-# TCP communication - server IP address
-SERVER_HOST = '192.168.0.2'
-PORT_FORCE = 2000
+# Axial force regulation: the PLC holds the force setpoint and sends the shear velocity on PORT_VELOCITY,
+# acquisition, recording and the PLC start/stop words are in drilling_logger.py
 PORT_VELOCITY = 3000
-BASE_CSV_DIR = r'C:\Users\Ivan\Desktop\data logging'
+RUN_MODE = 'regulation'
+DASHBOARD_OPTIONS = {'setpoint': 40, 'title': 'Regulacija aksijalne sile'}
+CSV_COLUMNS = ['Vrijeme (s)', 'Aksijalna sila (N)', 'Posmicna brzina (mm/s)', 'Temperatura Ch1 (°C)', 'Temperatura Ch2 (°C)', 'Signal Received Time']
 
-running = True
-logging_active = False
-start_time = None
-file = None
-writer = None
-last_shear_velocity = None
-velocity_received = False
-temp_chandle = None  # Temperature sensor
+velocity_samples = logger.metrics.counter('drilling_samples_total', "Samples acquired per channel", channel='velocity')
 
-file_lock = threading.Lock()
+def force_row(elapsed_time, Z_sila):
+    return [elapsed_time, Z_sila, '', '', '', '']
 
-# Checking if the desired directory exists
-def ensure_directory_exists(directory):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-        print(f"Directory created: {directory}")
-    else:
-        print(f"Directory exists: {directory}")
+def velocity_row(elapsed_time, shear_velocity):
+    return [elapsed_time, '', shear_velocity, '', '', '']
 
-def connect_to_server(port):
-    """Connect to a server at a given port."""
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    client_socket.connect((SERVER_HOST, port))
-    client_socket.settimeout(5)  
-    print(f'Connected to server {SERVER_HOST}:{port}')
-    return client_socket
+def temperature_row(elapsed_time, readings):
+    return [elapsed_time, '', '', readings.get(1, ''), readings.get(2, ''), ''] + logger.extra_temperatures(readings)
 
-def initialize_sensor(ip_address):
-    sensor = NetFT.Sensor(ip_address)
-    return sensor
+def event_row(elapsed_time, signal):
+    return [elapsed_time, '', '', '', '', signal]
 
-def initialize_temperature_sensor():
-    global temp_chandle
-    temp_chandle = ctypes.c_int16()
-    status = {}
+def start_run():
+    """The run starts with its first force sample."""
+    return None
 
-    
-    status["open_unit"] = tc08.usb_tc08_open_unit()
-    assert_pico2000_ok(status["open_unit"])
-    temp_chandle = status["open_unit"]
-
-    
-    status["set_mains"] = tc08.usb_tc08_set_mains(temp_chandle, 0)
-    assert_pico2000_ok(status["set_mains"])
-
-    # Channels 1 and 2
-    typeK = ctypes.c_int8(75)
-    status["set_channel_1"] = tc08.usb_tc08_set_channel(temp_chandle, 1, typeK)
-    status["set_channel_2"] = tc08.usb_tc08_set_channel(temp_chandle, 2, typeK)
-    assert_pico2000_ok(status["set_channel_1"])
-    assert_pico2000_ok(status["set_channel_2"])
-
-    return status
-
-def get_temperatures():
-    temp_buffer = (ctypes.c_float * 9)()
-    overflow = ctypes.c_int16(0)
-    units = tc08.USBTC08_UNITS["USBTC08_UNITS_CENTIGRADE"]
-
-    status = {}
-    status["get_single"] = tc08.usb_tc08_get_single(temp_chandle, ctypes.byref(temp_buffer), ctypes.byref(overflow), units)
-    assert_pico2000_ok(status["get_single"])
-
-    return temp_buffer[1], temp_buffer[2]  # Channels 1 and 2
-
-def get_unique_csv_file_path(base_dir):
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    return os.path.join(base_dir, f'output_{timestamp}.csv')
-
-def log_axial_force(sensor, nula, continuous):
-    global logging_active, start_time, file, writer, last_shear_velocity, velocity_received
-
-    try:
-        while running:
-            if logging_active:
-                if file is None:
-                    with file_lock:
-                        csv_file_path = get_unique_csv_file_path(BASE_CSV_DIR)
-                        print(f"Logging data to {csv_file_path}")
-
-                        file = open(csv_file_path, mode='a', newline='')
-                        writer = csv.writer(file)
-                        writer.writerow(['Vrijeme (s)', 'Aksijalna sila (N)', 'Posmicna brzina (mm/s)', 'Temperatura Ch1 (°C)', 'Temperatura Ch2 (°C)', 'Signal Received Time'])
-
-                sensor.getForce()
-                sensor_data = sensor.force()
-
-                if len(sensor_data) > 2:
-                    if start_time is None:
-                        start_time = time.time()
-
-                    elapsed_time = time.time() - start_time
-                    Z_sila = (nula - sensor_data[2]) / 1000000
-
-                    with file_lock:
-                        writer.writerow([elapsed_time, Z_sila, last_shear_velocity if velocity_received else '', '', '', ''])
-                        file.flush()
-                        velocity_received = False
-
-                    # Write force data if set to -c (continuous)
-                    if continuous:
-                        print(f"Vrijeme: {elapsed_time:.2f} s, Aksijalna sila: {Z_sila:.6f} N")
-
-            time.sleep(0.01)
-    except KeyboardInterrupt:
-        print("Exiting axial force logging.")
-    finally:
-        finalize_csv_logging()
-
-def log_temperature():
-    global logging_active, start_time, file, writer
-
-    try:
-        while running:
-            if logging_active and file is not None:
-                elapsed_time = time.time() - start_time
-                temp_ch1, temp_ch2 = get_temperatures()
-
-                with file_lock:
-                    if writer:
-                        writer.writerow([elapsed_time, '', '', temp_ch1, temp_ch2, ''])
-                        file.flush()
-
-            time.sleep(0.1)
-    except KeyboardInterrupt:
-        print("Exiting temperature logging.")
-    finally:
-        finalize_csv_logging()
+def log_shear_velocity_values(timestamps, values):
+    """Every received velocity value gets its own row with its arrival time."""
+    velocity_samples.inc(len(values))
+    if logger.live_feed is not None:
+        logger.live_feed.add_velocity(timestamps, values)
+    if logger.shared_ring is not None:
+        logger.shared_ring.add_velocity(timestamps, values)
+    start_time = logger.start_time
+    if logger.logging_active and start_time is not None and values:
+        for timestamp, shear_velocity in zip(timestamps, values):
+            logger.csv_writer.write_row(velocity_row(timestamp - start_time, shear_velocity))
 
 def log_shear_velocity(velocity_socket):
-    global logging_active, start_time, file, writer, last_shear_velocity, velocity_received
-
+    velocity_reader = FloatFrameReader()
+    velocity_socket.settimeout(0.1)
     try:
-        while running:
-            if logging_active:
-                try:
-                    velocity_socket.settimeout(0.01)
-                    velocity_data = velocity_socket.recv(4)
-                    if velocity_data:
-                        shear_velocity = convert_hex_to_decimal(velocity_data)
-                        if shear_velocity is not None:
-                            last_shear_velocity = shear_velocity
-                            velocity_received = True
-                except socket.error:
-                    pass
-            time.sleep(0.01)
-    except KeyboardInterrupt:
-        print("Exiting shear velocity logging.")
-    finally:
-        finalize_csv_logging()
-
-def send_data_to_plc(client_socket, sensor, nula):
-    global running
-    try:
-        while running:
-            sensor.getForce()
-            a = sensor.force()
-            if len(a) > 2:
-                Z_sila = (nula - a[2]) / 1000000
-                message = struct.pack('>f', Z_sila)
-                client_socket.sendall(message)
-            time.sleep(0.01538)  # 65 Hz
-    except KeyboardInterrupt:
-        print('Exiting send_data_to_plc thread')
-    finally:
-        client_socket.close()
-
-def finalize_csv_logging():
-    global file, writer
-    with file_lock:
-        if file:
-            print("Finalizing CSV logging...")
-            file.flush()
-            os.fsync(file.fileno())
-            file.close()
-            file = None
-            writer = None
-
-def receive_plc_data(client_socket):
-    global logging_active, start_time, writer, file
-    try:
-        while running:
+        while logger.running:
             try:
-                data = client_socket.recv(2)
-                if data:
-                    if data == b'\x01\x00':  # Receiving TRUE signal
-                        print("PLC Start Logging Signal Received (True)")
-                        logging_active = True
-                        start_time = None
-                    elif data == b'\x00\x00':  # Receiving FALSE signal
-                        print("PLC Stop Logging Signal Received (False)")
-                        false_signal_time = time.time() - start_time if start_time else 0
-
-                        with file_lock:
-                            if writer and file:
-                                writer.writerow([false_signal_time, '', '', '', '', "False Signal Received"])
-                                file.flush()
-
-                        # Continue logging data for 11 seconds after receiving FALSE signal, mostly used to get more temperature measurements
-                        extended_logging_start = time.time()
-                        while time.time() - extended_logging_start < 11:
-                            time.sleep(0.1)
-                        logging_active = False
-                        finalize_csv_logging()
+                timestamps, values = velocity_reader.recv_from(velocity_socket)
+                log_shear_velocity_values(timestamps, values)
             except socket.timeout:
-                print("Socket timeout, continuing...")
-            time.sleep(0.001)
-    except socket.error as e:
-        print(f"Error receiving PLC data: {e}")
+                pass
+    except KeyboardInterrupt:
+        print("Exiting shear velocity logging.")
     finally:
-        try:
-            client_socket.close()
-        except Exception as close_error:
-            print(f"Error closing socket: {close_error}")
+        logger.finalize_csv_logging()
 
-def convert_hex_to_decimal(hex_data):
-    if len(hex_data) == 4:
-        return struct.unpack('>f', hex_data)[0]
-    else:
-        print("Error: Invalid hex data length.")
-        return None
+logger.mode = sys.modules[__name__]
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Read data from ATI NetFT sensors, temperature sensor, and PLC.", add_help=False)
-    parser.add_argument('ip', metavar='ip address', type=str, help="The IP address of the sensor")
-    parser.add_argument('-c', '--continuous', dest='continuous', action='store_true', help="Print data continuously")
+    parser = logger.argument_parser()
     args = parser.parse_args()
-
-    sensor = initialize_sensor(args.ip)
-    sensor.getForce()
-    a = sensor.force()
-    if len(a) > 2:
-        nula = a[2]
-    else:
-        print("Error: Unable to read initial Z-force")
-        exit(1)
-
-    initialize_temperature_sensor()
-    ensure_directory_exists(BASE_CSV_DIR)
-
-    try:
-        client_socket_force = connect_to_server(PORT_FORCE)
-        velocity_socket = connect_to_server(PORT_VELOCITY)
-
-        plc_thread = threading.Thread(target=receive_plc_data, args=(client_socket_force,))
-        plc_thread.daemon = True
-        plc_thread.start()
-
-        force_thread = threading.Thread(target=log_axial_force, args=(sensor, nula, args.continuous))
-        force_thread.daemon = True
-        force_thread.start()
-
-        temp_thread = threading.Thread(target=log_temperature)
-        temp_thread.daemon = True
-        temp_thread.start()
-
-        velocity_thread = threading.Thread(target=log_shear_velocity, args=(velocity_socket,))
-        velocity_thread.daemon = True
-        velocity_thread.start()
-
-        plc_send_thread = threading.Thread(target=send_data_to_plc, args=(client_socket_force, sensor, nula))
-        plc_send_thread.daemon = True
-        plc_send_thread.start()
-
-        while running:
-            time.sleep(1)
-
-    except KeyboardInterrupt:
-        print("\nReceived CTRL+C, shutting down...")
-        running = False
-        force_thread.join(timeout=2)
-        velocity_thread.join(timeout=2)
-        temp_thread.join(timeout=2)
-        plc_send_thread.join(timeout=2)
-        plc_thread.join(timeout=2)
-    finally:
-        print("Program successfully terminated.")
-        time.sleep(0.1)
+    logger.run(parser, args)
@@ -1,14 +1,14 @@
 import matplotlib.pyplot as plt
-import pandas as pd
+from run_loader import load_run
+from decimation import decimate, keep_near, PLOT_POINTS
 from matplotlib.lines import Line2D
-from tkinter import Tk
-from tkinter.filedialog import askopenfilename
 from io import BytesIO
-from PIL import Image
-import win32clipboard
 
 
 def copy_to_clipboard_fullscreen(fig):
+    from PIL import Image
+    import win32clipboard
+
     
     buf = BytesIO()
     fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
@@ -29,94 +29,90 @@ def copy_to_clipboard_fullscreen(fig):
     print("Diagram copied to clipboard in full resolution!")
 
 
+def create_figure(csv_file_path, max_points=PLOT_POINTS, method='minmax'):
+    """Figure of one run, without showing it, also used by batch_render.py.
+
+    Every trace is decimated to about max_points points (None plots all samples).
+    """
+    run = load_run(csv_file_path)
+
+    # Cut all channels at the last timestamp of the temperature data
+    last_temp_time = run.temperature_end()
+
+    # Channels without the empty cells of the CSV file
+    axial_force_clean = run.channel('Aksijalna sila (N)', until=last_temp_time)
+    temp_ch1_clean = run.channel('Temperatura Ch1 (°C)', until=last_temp_time)
+    temp_ch2_clean = run.channel('Temperatura Ch2 (°C)', until=last_temp_time)
+    shear_velocity_clean = run.channel('Posmicna brzina (mm/s)', until=last_temp_time)
+
+    detection_time = run.stop_time
+
+    # Font 
+    font_properties = {'fontname': 'Times New Roman', 'fontsize': 22}
+    tick_label_size = 18
+
+    # Diagram
+    fig, (ax1, ax3) = plt.subplots(2, 1, sharex=True, figsize=(12, 8))
+
+    # Axial force
+    force_time = axial_force_clean['Vrijeme (s)'].to_numpy()
+    ax1.plot(*decimate(force_time, axial_force_clean['Aksijalna sila (N)'], max_points, method, keep_near(force_time, detection_time)), color='black', linewidth=3.5, label='Aksijalna sila')
+    ax1.axhline(y=40, color='black', linestyle='--', linewidth=3.5, label='Zadana aksijalna sila')
+    if detection_time is not None:
+        ax1.axvline(x=detection_time, color='gray', linestyle='dashed', linewidth=3.5, label='Detekcija proboja')
+
+    min_force = int(axial_force_clean['Aksijalna sila (N)'].min() // 10 * 10)
+    max_force = int(axial_force_clean['Aksijalna sila (N)'].max() // 10 * 10 + 10)
+    ax1.set_ylim(min_force, max_force)
+    ax1.set_yticks(range(min_force, max_force + 10, 10))
+
+    # Grid 
+    ax1.grid(axis='both', linestyle='-', linewidth=1.0)
+
+    ax1.set_ylabel('Aksijalna sila, N', labelpad=20, **font_properties)
+    ax1.tick_params(axis='both', labelsize=tick_label_size)
+
+    # Temperature
+    ax2 = ax1.twinx()
+    ax2.plot(*decimate(temp_ch1_clean['Vrijeme (s)'], temp_ch1_clean['Temperatura Ch1 (°C)'], max_points, method), color='red', linewidth=3.5, label='Temperatura uzorka')
+    ax2.plot(*decimate(temp_ch2_clean['Vrijeme (s)'], temp_ch2_clean['Temperatura Ch2 (°C)'], max_points, method), color='green', linestyle='--', linewidth=3.5, label='Temperatura prostorije')
+    min_temp = max(20, int(min(temp_ch1_clean['Temperatura Ch1 (°C)'].min(), temp_ch2_clean['Temperatura Ch2 (°C)'].min()) // 5 * 5))
+    max_temp = int(max(temp_ch1_clean['Temperatura Ch1 (°C)'].max(), temp_ch2_clean['Temperatura Ch2 (°C)'].max()) // 5 * 5 + 5)
+    ax2.set_ylim(min_temp, max_temp)
+    ax2.set_yticks(range(min_temp, max_temp + 5, 5))  # Brojevi na osi svakih 5 stupnjeva
+    ax2.set_ylabel('Temperatura, °C', labelpad=20, **font_properties)
+    ax2.tick_params(axis='both', labelsize=tick_label_size)
+
+    # Shear velocity
+    ax3.plot(*decimate(shear_velocity_clean['Vrijeme (s)'], shear_velocity_clean['Posmicna brzina (mm/s)'], max_points, method), color='blue', linewidth=3.5, label='Posmična brzina')
+    ax3.set_xlabel('Vrijeme, s', **font_properties)
+    ax3.set_ylabel('Posmična brzina, mm/s', labelpad=28, **font_properties)  # Podešen razmak naslova osi
+    ax3.tick_params(axis='both', labelsize=tick_label_size)
+    ax3.grid(axis='both', linestyle='-', linewidth=1.0)  # Grid s punom linijom
+
+    # Adding legend
+    legend_elements = [
+        Line2D([0], [0], color='black', lw=3.5, label='Aksijalna sila'),
+        Line2D([0], [0], color='black', lw=3.5, linestyle='--', label='Zadana aksijalna sila'),
+        Line2D([0], [0], color='red', lw=3.5, label='Temperatura uzorka'),
+        Line2D([0], [0], color='green', lw=3.5, linestyle='--', label='Temperatura prostorije'),
+        Line2D([0], [0], color='blue', lw=3.5, label='Posmična brzina'),
+        Line2D([0], [0], color='gray', lw=3.5, linestyle='dashed', label='Detekcija proboja')
+    ]
+    fig.legend(handles=legend_elements, loc='lower center', ncol=3, bbox_to_anchor=(0.5, -0.05), prop={'size': 16})
+
+    fig.tight_layout(rect=[0, 0.05, 1, 0.95])
+
+    return fig
+
+
 def plot_data(csv_file_path):
     try:
-        data = pd.read_csv(csv_file_path, encoding='ISO-8859-1')
-
-        # Data from CSV file
-        time = data['Vrijeme (s)']
-        axial_force = data['Aksijalna sila (N)']
-        temperature_ch1 = data['Temperatura Ch1 (°C)']
-        temperature_ch2 = data['Temperatura Ch2 (°C)']
-        shear_velocity = data['Posmicna brzina (mm/s)']
-
-        # Search for the last timestamp for temperature data
-        last_temp_ch1_time = data['Vrijeme (s)'][data['Temperatura Ch1 (°C)'].last_valid_index()]
-        last_temp_ch2_time = data['Vrijeme (s)'][data['Temperatura Ch2 (°C)'].last_valid_index()]
-        last_temp_time = min(last_temp_ch1_time, last_temp_ch2_time)
-        filtered_data = data[data['Vrijeme (s)'] <= last_temp_time]
-
-        # Ignoring empty cells from CSV files
-        axial_force_clean = filtered_data.dropna(subset=['Aksijalna sila (N)'])
-        temp_ch1_clean = filtered_data.dropna(subset=['Temperatura Ch1 (°C)'])
-        temp_ch2_clean = filtered_data.dropna(subset=['Temperatura Ch2 (°C)'])
-        shear_velocity_clean = filtered_data.dropna(subset=['Posmicna brzina (mm/s)'])
-
-        # 
-        detection_index = data[data['Signal Received Time'] == "False Signal Received"].index
-        detection_time = None
-        if not detection_index.empty:
-            detection_time = data.loc[detection_index[0], 'Vrijeme (s)']
-
-        # Font 
-        font_properties = {'fontname': 'Times New Roman', 'fontsize': 22}
-        tick_label_size = 18
-
-        # Diagram
-        fig, (ax1, ax3) = plt.subplots(2, 1, sharex=True, figsize=(12, 8))
-
-        # Axial force
-        ax1.plot(axial_force_clean['Vrijeme (s)'], axial_force_clean['Aksijalna sila (N)'], color='black', linewidth=3.5, label='Aksijalna sila')
-        ax1.axhline(y=40, color='black', linestyle='--', linewidth=3.5, label='Zadana aksijalna sila')
-        if detection_time is not None:
-            ax1.axvline(x=detection_time, color='gray', linestyle='dashed', linewidth=3.5, label='Detekcija proboja')
-
-        min_force = int(axial_force_clean['Aksijalna sila (N)'].min() // 10 * 10)
-        max_force = int(axial_force_clean['Aksijalna sila (N)'].max() // 10 * 10 + 10)
-        ax1.set_ylim(min_force, max_force)
-        ax1.set_yticks(range(min_force, max_force + 10, 10))
-
-        # Grid 
-        ax1.grid(axis='both', linestyle='-', linewidth=1.0)
-
-        ax1.set_ylabel('Aksijalna sila, N', labelpad=20, **font_properties)
-        ax1.tick_params(axis='both', labelsize=tick_label_size)
-
-        # Temperature
-        ax2 = ax1.twinx()
-        ax2.plot(temp_ch1_clean['Vrijeme (s)'], temp_ch1_clean['Temperatura Ch1 (°C)'], color='red', linewidth=3.5, label='Temperatura uzorka')
-        ax2.plot(temp_ch2_clean['Vrijeme (s)'], temp_ch2_clean['Temperatura Ch2 (°C)'], color='green', linestyle='--', linewidth=3.5, label='Temperatura prostorije')
-        min_temp = max(20, int(min(temp_ch1_clean['Temperatura Ch1 (°C)'].min(), temp_ch2_clean['Temperatura Ch2 (°C)'].min()) // 5 * 5))
-        max_temp = int(max(temp_ch1_clean['Temperatura Ch1 (°C)'].max(), temp_ch2_clean['Temperatura Ch2 (°C)'].max()) // 5 * 5 + 5)
-        ax2.set_ylim(min_temp, max_temp)
-        ax2.set_yticks(range(min_temp, max_temp + 5, 5))  # Brojevi na osi svakih 5 stupnjeva
-        ax2.set_ylabel('Temperatura, °C', labelpad=20, **font_properties)
-        ax2.tick_params(axis='both', labelsize=tick_label_size)
-
-        # Shear velocity
-        ax3.plot(shear_velocity_clean['Vrijeme (s)'], shear_velocity_clean['Posmicna brzina (mm/s)'], color='blue', linewidth=3.5, label='Posmična brzina')
-        ax3.set_xlabel('Vrijeme, s', **font_properties)
-        ax3.set_ylabel('Posmična brzina, mm/s', labelpad=28, **font_properties)  # Podešen razmak naslova osi
-        ax3.tick_params(axis='both', labelsize=tick_label_size)
-        ax3.grid(axis='both', linestyle='-', linewidth=1.0)  # Grid s punom linijom
-
-        # Adding legend
-        legend_elements = [
-            Line2D([0], [0], color='black', lw=3.5, label='Aksijalna sila'),
-            Line2D([0], [0], color='black', lw=3.5, linestyle='--', label='Zadana aksijalna sila'),
-            Line2D([0], [0], color='red', lw=3.5, label='Temperatura uzorka'),
-            Line2D([0], [0], color='green', lw=3.5, linestyle='--', label='Temperatura prostorije'),
-            Line2D([0], [0], color='blue', lw=3.5, label='Posmična brzina'),
-            Line2D([0], [0], color='gray', lw=3.5, linestyle='dashed', label='Detekcija proboja')
-        ]
-        fig.legend(handles=legend_elements, loc='lower center', ncol=3, bbox_to_anchor=(0.5, -0.05), prop={'size': 16})
-
-        fig.tight_layout(rect=[0, 0.05, 1, 0.95])
+        fig = create_figure(csv_file_path)
 
         # Copy to clipboard
         copy_to_clipboard_fullscreen(fig)
 
-        
         plt.show()
 
     except UnicodeDecodeError as e:
@@ -126,6 +122,9 @@ def plot_data(csv_file_path):
 
 
 def choose_csv_file():
+    from tkinter import Tk
+    from tkinter.filedialog import askopenfilename
+
     Tk().withdraw()
     filename = askopenfilename(
         title="Select a CSV file",
@@ -0,0 +1,319 @@
+import argparse
+import glob
+import hashlib
+import operator
+import os
+import re
+import numpy as np
+import pandas as pd
+from run_loader import load_run, run_statistics, TIME_COLUMN, FORCE_COLUMN, VELOCITY_COLUMN
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Archive layout, <archive> is any directory:
+#
+#   <archive>/summary.parquet                                one row per run, see run_summary()
+#   <archive>/mode=<mode>/material=<material>/<run>.parquet  samples of one run, sorted by time
+#
+# The samples table has a time column and one column per channel (force, velocity,
+# temperature_ch1, ...), NaN where a row belongs to another channel, as in the CSV.
+# Without pyarrow the same files are written as .npz, one array per column.
+
+MODES = ('constant_feed', 'interval', 'regulation_one_layer', 'regulation_three_layers')
+SUMMARY_FILE = 'summary'
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda column, values: np.isin(column, list(values)),
+    'not in': lambda column, values: ~np.isin(column, list(values)),
+}
+
+
+def archive_column_name(column):
+    """'Temperatura Ch1 (°C)' -> 'temperature_ch1', the other logger columns by their meaning."""
+    if column == TIME_COLUMN:
+        return 'time'
+    if column == FORCE_COLUMN:
+        return 'force'
+    if column == VELOCITY_COLUMN:
+        return 'velocity'
+    match = re.match(r'Temperatura Ch(\d+)', column)
+    if match:
+        return f'temperature_ch{match.group(1)}'
+    return re.sub(r'\W+', '_', column).strip('_').lower()
+
+
+def detect_mode(run):
+    """Drilling mode from the logged channels and phases.
+
+    One- and three-layer regulation runs log the same channels, so regulation
+    runs are detected as one layer, three-layer runs are ingested with
+    --mode regulation_three_layers.
+    """
+    if len(run.feed_times):
+        return 'interval'
+    return 'regulation_one_layer' if run.has(VELOCITY_COLUMN) else 'constant_feed'
+
+
+def run_identifier(path):
+    """File name of the run and a short hash of its absolute path, unique across source folders."""
+    path = os.path.abspath(path.rstrip(os.sep))
+    name = os.path.splitext(os.path.basename(path))[0]
+    return f'{name}_{hashlib.sha1(path.encode("utf-8")).hexdigest()[:8]}'
+
+
+def partition_value(value):
+    return re.sub(r'[^\w.-]+', '_', value)
+
+
+def samples_table(run):
+    """All channels of a run merged into one time-sorted table."""
+    names = list(run.channels)
+    times = np.concatenate([run.times(column) for column in names])
+    order = np.argsort(times, kind='stable')
+    table = {'time': times[order]}
+    offset = 0
+    for column in names:
+        values = np.full(len(times), np.nan)
+        count = len(run.values(column))
+        values[offset:offset + count] = run.values(column)
+        offset += count
+        table[archive_column_name(column)] = values[order]
+    return table
+
+
+def run_summary(run, run_id, mode, material, samples_path, table):
+    force = run.values(FORCE_COLUMN)
+    velocity = run.values(VELOCITY_COLUMN) if run.has(VELOCITY_COLUMN) else np.zeros(0)
+    stat = os.stat(os.path.join(run.path, 'header.json') if os.path.isdir(run.path) else run.path)
+    times = table['time']
+    return {
+        'run_id': run_id,
+        'mode': mode,
+        'material': material,
+        'source': run.path,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_size': stat.st_size,
+        'samples': samples_path,
+        'rows': len(times),
+        'duration': times[-1] - times[0] if len(times) else np.nan,
+        'force_samples': len(force),
+        'mean_force': force.mean() if len(force) else np.nan,
+        'max_velocity': velocity.max() if len(velocity) else np.nan,
+        'mean_velocity': velocity.mean() if len(velocity) else np.nan,
+        'stop_time': run.stop_time if run.stop_time is not None else np.nan,
+        **run_statistics(run),
+    }
+
+
+def filter_mask(columns, filters, length):
+    """Row mask of (column, operator, value) filters on a dict of arrays, all filters must match."""
+    mask = np.ones(length, dtype=bool)
+    for name, op, value in filters or ():
+        mask &= np.asarray(OPERATORS[op](np.asarray(columns[name]), value), dtype=bool)
+    return mask
+
+
+def filter_columns(filters):
+    return [name for name, op, value in filters or ()]
+
+
+class RunArchive:
+    """Partitioned columnar store of logged runs with per-run summaries.
+
+    Queries read only the requested columns. Filters are (column, operator,
+    value) tuples combined with AND, like pyarrow's filters: run filters are
+    applied to the summary table first, so only matching runs (and partitions)
+    are opened, sample filters are pushed down to the Parquet reader.
+    """
+
+    def __init__(self, path, backend=None):
+        self.path = path
+        if backend is None:
+            if os.path.exists(os.path.join(path, SUMMARY_FILE + '.parquet')):
+                backend = 'parquet'
+            elif os.path.exists(os.path.join(path, SUMMARY_FILE + '.npz')):
+                backend = 'npz'
+            else:
+                backend = 'parquet' if pa is not None else 'npz'
+        if backend == 'parquet' and pa is None:
+            raise RuntimeError("This archive is stored as Parquet, pyarrow is needed to read it")
+        self.backend = backend
+        self.extension = '.' + backend
+
+    # Storage of a table given as a dict of column arrays
+
+    def write_table(self, path, table):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + '.tmp' + self.extension
+        if self.backend == 'parquet':
+            pq.write_table(pa.table(table), temporary)
+        else:
+            arrays = {name: np.asarray(values) for name, values in table.items()}
+            # Text columns as fixed-width unicode, so the archive loads without pickle
+            np.savez(temporary, **{name: values.astype(str) if values.dtype == object else values
+                                   for name, values in arrays.items()})
+        os.replace(temporary, path)
+
+    def read_table(self, path, columns=None, filters=None):
+        if self.backend == 'parquet':
+            read_columns = None if columns is None else list(dict.fromkeys(list(columns) + filter_columns(filters)))
+            table = pq.read_table(path, columns=read_columns, filters=filters or None).to_pandas()
+            return table if columns is None else table[list(columns)]
+        with np.load(path) as stored:
+            names = stored.files if columns is None else list(columns)
+            # NPZ members are loaded one by one, unused columns are never read
+            needed = {name: stored[name] for name in dict.fromkeys(list(names) + filter_columns(filters))}
+        length = len(next(iter(needed.values()))) if needed else 0
+        mask = filter_mask(needed, filters, length)
+        return pd.DataFrame({name: needed[name][mask] for name in names})
+
+    # Runs
+
+    def summary_path(self):
+        return os.path.join(self.path, SUMMARY_FILE + self.extension)
+
+    def summaries(self, columns=None, filters=None):
+        """Per-run summary table, optionally projected and filtered."""
+        if not os.path.exists(self.summary_path()):
+            return pd.DataFrame(columns=columns or ['run_id'])
+        return self.read_table(self.summary_path(), columns, filters)
+
+    def ingest(self, paths, material='unknown', mode=None, force=False):
+        """Add runs (CSV files or .run directories) to the archive, return the ingested run ids.
+
+        Runs whose source, mode and material are unchanged since the last
+        ingestion are skipped.
+        """
+        current = self.summaries()
+        known = {row.source: row for row in current.itertuples()} if len(current) else {}
+        rows = []
+        for path in paths:
+            run = load_run(path)
+            previous = known.get(run.path)
+            stat = os.stat(os.path.join(run.path, 'header.json') if os.path.isdir(run.path) else run.path)
+            run_mode = mode or detect_mode(run)
+            unchanged = (previous is not None and previous.source_mtime_ns == stat.st_mtime_ns and previous.source_size == stat.st_size
+                         and previous.mode == run_mode and previous.material == material)
+            if unchanged and not force:
+                continue
+            run_id = run_identifier(run.path)
+            samples_path = os.path.join(f'mode={partition_value(run_mode)}', f'material={partition_value(material)}', run_id + self.extension)
+            table = samples_table(run)
+            self.write_table(os.path.join(self.path, samples_path), table)
+            if previous is not None and previous.samples != samples_path:
+                # Re-ingested under another mode or material
+                os.remove(os.path.join(self.path, previous.samples))
+            rows.append(run_summary(run, run_id, run_mode, material, samples_path, table))
+
+        if rows:
+            updated = pd.DataFrame(rows)
+            if len(current):
+                current = current[~current['source'].isin(updated['source'])]
+                updated = pd.concat([current, updated], ignore_index=True)
+            self.write_table(self.summary_path(), {name: updated[name].to_numpy() for name in updated.columns})
+        return [row['run_id'] for row in rows]
+
+    def query(self, columns=None, run_filters=None, filters=None):
+        """Samples of all runs matching run_filters, as one table with a run_id column.
+
+        columns selects the sample columns (all if None), filters applies to the samples.
+        """
+        runs = self.summaries(['run_id', 'samples'], run_filters)
+        frames = []
+        for run_id, samples_path in zip(runs['run_id'], runs['samples']):
+            samples = self.read_table(os.path.join(self.path, samples_path), columns, filters)
+            samples.insert(0, 'run_id', run_id)
+            frames.append(samples)
+        if not frames:
+            return pd.DataFrame(columns=['run_id'] + list(columns or []))
+        return pd.concat(frames, ignore_index=True)
+
+
+def expand_paths(paths):
+    """CSV files and .run directories given directly, inside directories, or as glob patterns."""
+    expanded = []
+    for path in paths:
+        for match in sorted(glob.glob(path)) or [path]:
+            if os.path.isdir(match) and not match.rstrip(os.sep).endswith('.run'):
+                names = os.listdir(match)
+                # A CSV exported from a binary run is the same run
+                binary_runs = {name[:-len('.run')] for name in names if name.endswith('.run')}
+                expanded.extend(sorted(os.path.join(match, name) for name in names
+                                       if name.endswith('.run') or (name.endswith('.csv') and name[:-len('.csv')] not in binary_runs)))
+            else:
+                expanded.append(match)
+    return expanded
+
+
+def parse_filter(name, op, value):
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown operator {op}, use one of {', '.join(OPERATORS)}")
+    values = [parse_value(item) for item in value.split(',')]
+    return name, op, values if op in ('in', 'not in') else values[0] if len(values) == 1 else value
+
+
+def parse_value(value):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class FilterAction(argparse.Action):
+    """Collects --where/--sample-where as parsed filters, a bad operator is a usage error."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        try:
+            where = parse_filter(*values)
+        except ValueError as e:
+            parser.error(f"{option_string}: {e}")
+        setattr(namespace, self.dest, (getattr(namespace, self.dest) or []) + [where])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Columnar archive of logged runs.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help="Add runs to the archive")
+    ingest_parser.add_argument('archive', help="Archive directory")
+    ingest_parser.add_argument('paths', nargs='+', help="CSV files, .run directories, directories or glob patterns")
+    ingest_parser.add_argument('--material', default='unknown', help="Material of the drilled samples, e.g. Sawbones")
+    ingest_parser.add_argument('--mode', choices=MODES, default=None, help="Drilling mode (detected from the channels if omitted, three-layer regulation runs need it)")
+    ingest_parser.add_argument('--force', action='store_true', help="Re-ingest runs that did not change")
+
+    for name, help_text in [('runs', "Print the per-run summaries"), ('query', "Export samples of matching runs")]:
+        query_parser = subparsers.add_parser(name, help=help_text)
+        query_parser.add_argument('archive', help="Archive directory")
+        query_parser.add_argument('--columns', nargs='+', default=None, help="Columns to read (all by default)")
+        query_parser.add_argument('--where', nargs=3, action=FilterAction, metavar=('COLUMN', 'OP', 'VALUE'),
+                                  help="Run filter on the summary columns, e.g. --where max_temp '>' 45 (comma separated values for in)")
+        query_parser.add_argument('-o', '--output', default=None, help="Save the result to this CSV file")
+    query_parser.add_argument('--sample-where', nargs=3, action=FilterAction, metavar=('COLUMN', 'OP', 'VALUE'),
+                              help="Filter on the sample columns, e.g. --sample-where temperature_ch1 '>' 45")
+
+    args = parser.parse_args()
+    if args.command == 'ingest':
+        archive = RunArchive(args.archive)
+        ingested = archive.ingest(expand_paths(args.paths), args.material, args.mode, args.force)
+        print(f"Ingested {len(ingested)} runs into {args.archive} ({archive.backend})")
+    else:
+        archive = RunArchive(args.archive)
+        run_filters = args.where or []
+        if args.command == 'runs':
+            result = archive.summaries(args.columns, run_filters)
+        else:
+            sample_filters = args.sample_where or []
+            result = archive.query(args.columns, run_filters, sample_filters)
+        if args.output:
+            result.to_csv(args.output, index=False)
+        print(result.to_string(index=False))
@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from run_loader import load_run, run_statistics
+from run_archive import MODES, detect_mode, expand_paths
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    material TEXT NOT NULL,
+    duration REAL,
+    max_force REAL,
+    drill_time REAL,
+    initial_temp REAL,
+    max_temp REAL,
+    temp_rise REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_directory ON runs (directory);
+CREATE INDEX IF NOT EXISTS runs_mode_material ON runs (mode, material);
+CREATE INDEX IF NOT EXISTS runs_hash ON runs (hash);
+"""
+
+STATISTICS = ('duration', 'max_force', 'drill_time', 'initial_temp', 'max_temp', 'temp_rise')
+STATISTICS_VERSION = 2  # PRAGMA user_version, raised when run_statistics changes so existing rows are analyzed again
+
+
+def source_stat(path):
+    return os.stat(os.path.join(path, 'header.json') if os.path.isdir(path) else path)
+
+
+def file_hash(path):
+    """SHA-256 of a CSV file, or of the header and channel files of a .run directory."""
+    digest = hashlib.sha256()
+    files = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+    for name in files:
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def index_run(path, previous_hash=None):
+    """Catalog values of one run, runs in the worker processes of RunCatalog.update.
+
+    If the content hash equals previous_hash the run is not parsed again and
+    only the file metadata is returned.
+    """
+    stat = source_stat(path)
+    values = {'path': path, 'hash': file_hash(path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    if values['hash'] == previous_hash:
+        return values
+    run = load_run(path, disk_cache=False)
+    times = np.concatenate([run.times(column) for column in run.channels] + [run.event_times])
+    return {
+        **values,
+        'detected_mode': detect_mode(run),
+        'duration': times.max() - times.min() if len(times) else np.nan,
+        **run_statistics(run),
+    }
+
+
+def sql_value(value):
+    # SQLite stores NaN as NULL, so missing values are left out of AVG and MAX
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class RunCatalog:
+    """Persistent SQLite index of logged runs, one row per CSV file or .run directory.
+
+    update() only parses files that are new or whose modification time or
+    size changed, and only if their content hash changed too, so re-running
+    it over a large folder costs one stat() per unchanged file.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] < STATISTICS_VERSION:
+            with self.connection:
+                # Forces the next update to parse every run again
+                self.connection.execute("UPDATE runs SET mtime_ns = -1, hash = ''")
+                self.connection.execute(f'PRAGMA user_version = {STATISTICS_VERSION}')
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, paths, material=None, mode=None, workers=None, prune=True):
+        """Index new and changed runs, return (indexed, unchanged, removed) run counts.
+
+        material defaults to the name of the directory the run is in, mode is
+        detected from the logged channels unless given. With prune, runs of
+        the scanned directories whose files were deleted are removed.
+        """
+        files = [os.path.abspath(path) for path in expand_paths(paths)]
+        known = {row[0]: row[1:] for row in self.connection.execute('SELECT path, mtime_ns, size, hash, mode, material FROM runs')}
+
+        changed = []
+        for path in files:
+            stat = source_stat(path)
+            run_material = material or os.path.basename(os.path.dirname(path))
+            previous = known.get(path)
+            if previous is not None and previous[0] == stat.st_mtime_ns and previous[1] == stat.st_size \
+                    and (mode is None or previous[3] == mode) and previous[4] == run_material:
+                continue
+            changed.append(path)
+
+        rows, touched = [], []
+        if changed:
+            previous_hashes = [known[path][2] if path in known else None for path in changed]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for values in executor.map(index_run, changed, previous_hashes, chunksize=max(1, len(changed) // 32)):
+                    path = values['path']
+                    run_material = material or os.path.basename(os.path.dirname(path))
+                    if 'detected_mode' not in values:
+                        # Same content, e.g. copied or touched, or only mode/material changed
+                        touched.append((values['mtime_ns'], values['size'], mode or known[path][3], run_material, path))
+                        continue
+                    rows.append((
+                        path, os.path.dirname(path), values['hash'], values['mtime_ns'], values['size'],
+                        mode or values['detected_mode'], run_material,
+                        *[sql_value(values[name]) for name in STATISTICS], time.time(),
+                    ))
+
+        removed = 0
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO runs (path, directory, hash, mtime_ns, size, mode, material, {', '.join(STATISTICS)}, indexed_at) "
+                f"VALUES ({', '.join('?' * (8 + len(STATISTICS)))})", rows)
+            self.connection.executemany('UPDATE runs SET mtime_ns = ?, size = ?, mode = ?, material = ? WHERE path = ?', touched)
+            if prune:
+                present = set(files)
+                for directory in {os.path.dirname(path) for path in files} | {os.path.abspath(path) for path in paths if os.path.isdir(path)}:
+                    for (path,) in self.connection.execute('SELECT path FROM runs WHERE directory = ?', (directory,)).fetchall():
+                        if path not in present and not os.path.exists(path):
+                            self.connection.execute('DELETE FROM runs WHERE path = ?', (path,))
+                            removed += 1
+        return len(rows), len(files) - len(rows), removed
+
+    def where(self, directory=None, mode=None, material=None):
+        conditions, parameters = [], []
+        for column, value in (('directory', directory), ('mode', mode), ('material', material)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                parameters.append(os.path.abspath(value) if column == 'directory' else value)
+        return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', parameters
+
+    def runs(self, directory=None, mode=None, material=None):
+        """Catalog rows as a DataFrame, filtered on the indexed columns."""
+        where, parameters = self.where(directory, mode, material)
+        return pd.read_sql_query(f'SELECT * FROM runs{where} ORDER BY path', self.connection, params=parameters)
+
+    def averages(self, directory=None, mode=None, material=None):
+        """Averages as printed by average_values.py (missing drill times and temperatures count as 0)."""
+        where, parameters = self.where(directory, mode, material)
+        row = self.connection.execute(
+            'SELECT COUNT(*), AVG(COALESCE(max_force, 0)), AVG(COALESCE(temp_rise, 0)), AVG(COALESCE(max_temp, 0)), '
+            f'AVG(COALESCE(drill_time, 0)) FROM runs{where}', parameters).fetchone()
+        count = row[0]
+        return tuple(round(value, 2) if count else 0 for value in row[1:]) + (count,)
+
+    def group_averages(self):
+        """Run count and mean statistics per mode and material."""
+        return pd.read_sql_query(
+            'SELECT mode, material, COUNT(*) AS runs, AVG(max_force) AS max_force, AVG(drill_time) AS drill_time, '
+            'AVG(temp_rise) AS temp_rise, AVG(max_temp) AS max_temp, AVG(duration) AS duration '
+            'FROM runs GROUP BY mode, material ORDER BY mode, material', self.connection)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SQLite catalog of logged runs.")
+    parser.add_argument('catalog', help="Catalog database file, e.g. runs.sqlite")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    update_parser = subparsers.add_parser('update', help="Index new and changed runs")
+    update_parser.add_argument('paths', nargs='+', help="Directories, CSV files, .run directories or glob patterns")
+    update_parser.add_argument('--material', default=None, help="Material of the runs (name of their directory by default)")
+    update_parser.add_argument('--mode', choices=MODES, default=None, help="Drilling mode (detected from the channels if omitted)")
+    update_parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes")
+
+    for name in ('runs', 'averages'):
+        query_parser = subparsers.add_parser(name, help="List the catalog" if name == 'runs' else "Averages per mode and material, or of a selection")
+        query_parser.add_argument('--directory', default=None)
+        query_parser.add_argument('--mode', choices=MODES, default=None)
+        query_parser.add_argument('--material', default=None)
+
+    args = parser.parse_args()
+    catalog = RunCatalog(args.catalog)
+    if args.command == 'update':
+        indexed, unchanged, removed = catalog.update(args.paths, args.material, args.mode, args.workers)
+        print(f"Indexed {indexed} runs, {unchanged} unchanged, {removed} removed")
+    elif args.command == 'runs':
+        print(catalog.runs(args.directory, args.mode, args.material).to_string(index=False))
+    elif args.directory or args.mode or args.material:
+        avg_max_force, avg_temp_rise, avg_max_temp, avg_drill_time, count = catalog.averages(args.directory, args.mode, args.material)
+        print(f"Runs: {count}, max force: {avg_max_force}, drill time: {avg_drill_time}, "
+              f"temperature rise: {avg_temp_rise}, max temperature: {avg_max_temp}")
+    else:
+        print(catalog.group_averages().round(2).to_string(index=False))
+    catalog.close()
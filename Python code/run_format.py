@@ -0,0 +1,211 @@
+import argparse
+import csv
+import json
+import math
+import os
+import numpy as np
+from csv_writer import BatchedCSVWriter
+
+# Binary run recording (--format binary), one directory per run:
+#
+#   output_<timestamp>.run/
+#       header.json      mode, nula, rates, start_time, CSV columns and the dtype of every channel file
+#       force.bin        records (time <f8, force <f8)
+#       velocity.bin     records (time <f8, velocity <f4), regulation only
+#       temperature.bin  records (time <f8, ch<N> <f4 per TEMPERATURE_CHANNELS), NaN where a channel has no reading
+#       events.bin       records (time <f8, code <u4), codes in header.json 'events'
+#
+# Channel files are plain little-endian record arrays without a header, so they can
+# be opened with numpy.memmap(path, dtype) and a torn last record after a crash is
+# simply ignored. Times are seconds since start_time, as in the CSV.
+
+FORMAT_NAME = 'drilling-run'
+FORMAT_VERSION = 1
+RUN_SUFFIX = '.run'
+
+FORCE_DTYPE = np.dtype([('time', '<f8'), ('force', '<f8')])
+VELOCITY_DTYPE = np.dtype([('time', '<f8'), ('velocity', '<f4')])
+EVENT_DTYPE = np.dtype([('time', '<f8'), ('code', '<u4')])
+
+EVENT_STOP_SIGNAL = 1
+EVENT_BREAKTHROUGH = 2  # Host-side detector, see breakthrough.py
+EVENT_FEED = 3  # Interval drilling phases, see constant_shear_velocity.py --interval
+EVENT_PAUSE = 4
+EVENTS = {EVENT_STOP_SIGNAL: 'False Signal Received', EVENT_BREAKTHROUGH: 'Breakthrough Detected', EVENT_FEED: 'Feed Start',
+          EVENT_PAUSE: 'Pause Start'}
+
+FORCE_COLUMN = 'Aksijalna sila (N)'
+VELOCITY_COLUMN = 'Posmicna brzina (mm/s)'
+
+
+def temperature_dtype(channels):
+    return np.dtype([('time', '<f8')] + [(f'ch{channel}', '<f4') for channel in channels])
+
+
+def temperature_column_channel(column):
+    """Channel number of a 'Temperatura ChN (°C)' column, None for other columns."""
+    if column.startswith('Temperatura Ch'):
+        return int(column[len('Temperatura Ch'):].split()[0])
+    return None
+
+
+class ColumnLayout:
+    """Where each channel lives in the logger's CSV rows.
+
+    Column 0 is the time, the 'Signal ...' column holds the PLC signal text.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.force = self.columns.index(FORCE_COLUMN)
+        self.velocity = self.columns.index(VELOCITY_COLUMN) if VELOCITY_COLUMN in self.columns else None
+        self.temperature = [(i, temperature_column_channel(column)) for i, column in enumerate(self.columns)
+                            if temperature_column_channel(column) is not None]
+        self.event = next(i for i, column in enumerate(self.columns) if column.startswith('Signal'))
+        self.channel_dtypes = {
+            'force': FORCE_DTYPE,
+            'temperature': temperature_dtype([channel for i, channel in self.temperature]),
+            'events': EVENT_DTYPE,
+        }
+        if self.velocity is not None:
+            self.channel_dtypes['velocity'] = VELOCITY_DTYPE
+
+
+class BinaryRunWriter(BatchedCSVWriter):
+    """BatchedCSVWriter that stores the rows as typed channel streams.
+
+    The logger threads queue the same rows as for the CSV file, the writer
+    thread sorts them into the channel files by the column that is filled.
+    """
+
+    def open(self, path, header, metadata=None):
+        super().open(os.path.splitext(path)[0] + RUN_SUFFIX, header, metadata)
+
+    def open_file(self, path, header, metadata):
+        os.makedirs(path, exist_ok=True)
+        self.run_path = path
+        self.layout = ColumnLayout(header)
+        self.metadata = metadata
+        self.files = {name: open(os.path.join(path, f'{name}.bin'), 'ab') for name in self.layout.channel_dtypes}
+        self.event_codes = {text: code for code, text in EVENTS.items()}
+        self.write_header()
+
+    def write_header(self):
+        header = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'columns': self.layout.columns,
+            'channels': {name: {'file': f'{name}.bin', 'dtype': np.lib.format.dtype_to_descr(dtype)}
+                         for name, dtype in self.layout.channel_dtypes.items()},
+            'events': {str(code): text for code, text in EVENTS.items()},
+        }
+        if self.metadata is not None:
+            header.update(self.metadata())
+        header_path = os.path.join(self.run_path, 'header.json')
+        with open(header_path + '.tmp', 'w') as f:
+            json.dump(header, f, indent=2, default=float)
+        os.replace(header_path + '.tmp', header_path)
+
+    def write_batch(self, batch):
+        layout = self.layout
+        records = {name: [] for name in self.files}
+        for row in batch:
+            if row[layout.force] != '':
+                records['force'].append((row[0], row[layout.force]))
+            elif layout.velocity is not None and row[layout.velocity] != '':
+                records['velocity'].append((row[0], row[layout.velocity]))
+            elif row[layout.event] != '':
+                records['events'].append((row[0], self.event_codes.get(row[layout.event], 0)))
+            else:
+                records['temperature'].append((row[0],) + tuple(math.nan if row[i] == '' else row[i] for i, channel in layout.temperature))
+        for name, channel_records in records.items():
+            if channel_records:
+                self.files[name].write(np.array(channel_records, dtype=layout.channel_dtypes[name]).tobytes())
+
+    def flush(self, fsync=False):
+        for f in self.files.values():
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+    def close_file(self):
+        self.flush(fsync=True)
+        for f in self.files.values():
+            f.close()
+        # start_time is only known after the first samples
+        self.write_header()
+
+
+class RunRecording:
+    """Read-only view of a binary run, every channel is a numpy.memmap record array."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as f:
+            self.header = json.load(f)
+        if self.header.get('format') != FORMAT_NAME:
+            raise ValueError(f"Not a binary run recording: {path}")
+        self.channels = {}
+        for name, info in self.header['channels'].items():
+            dtype = np.dtype([tuple(field) for field in info['dtype']])
+            channel_path = os.path.join(path, info['file'])
+            count = os.path.getsize(channel_path) // dtype.itemsize if os.path.exists(channel_path) else 0
+            if count:
+                self.channels[name] = np.memmap(channel_path, dtype=dtype, mode='r', shape=(count,))
+            else:
+                self.channels[name] = np.zeros(0, dtype=dtype)
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def to_rows(self):
+        """Rows in the logger's CSV layout, ordered by time."""
+        layout = ColumnLayout(self.header['columns'])
+        events = {int(code): text for code, text in self.header['events'].items()}
+        empty = [''] * len(layout.columns)
+        names = list(self.channels)
+        times = np.concatenate([self.channels[name]['time'] for name in names])
+        sources = np.concatenate([np.full(len(self.channels[name]), i) for i, name in enumerate(names)])
+        offsets = np.concatenate([np.arange(len(self.channels[name])) for name in names])
+        order = np.argsort(times, kind='stable')
+
+        values = {name: self.channels[name].tolist() for name in names}
+        for source, offset in zip(sources[order].tolist(), offsets[order].tolist()):
+            name = names[source]
+            record = values[name][offset]
+            row = list(empty)
+            row[0] = record[0]
+            if name == 'force':
+                row[layout.force] = record[1]
+            elif name == 'velocity':
+                row[layout.velocity] = record[1]
+            elif name == 'events':
+                row[layout.event] = events.get(record[1], '')
+            else:
+                for (i, channel), value in zip(layout.temperature, record[1:]):
+                    row[i] = '' if math.isnan(value) else value
+            yield row
+
+
+def export_csv(run_path, csv_path=None):
+    """Convert a binary run to the CSV layout the logger writes, return the CSV path."""
+    run = RunRecording(run_path)
+    if csv_path is None:
+        csv_path = os.path.splitext(run_path.rstrip(os.sep))[0] + '.csv'
+    with open(csv_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(run.header['columns'])
+        writer.writerows(run.to_rows())
+    return csv_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert binary run recordings to the logger's CSV layout.")
+    parser.add_argument('runs', nargs='+', help="output_<timestamp>.run directories")
+    parser.add_argument('-o', '--output', default=None, help="CSV file (only with a single run), next to the run by default")
+    args = parser.parse_args()
+    if args.output and len(args.runs) > 1:
+        parser.error("-o can only be used with a single run")
+
+    for run_path in args.runs:
+        print(f"{run_path} -> {export_csv(run_path, args.output)}")
@@ -0,0 +1,237 @@
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+TIME_COLUMN = 'Vrijeme (s)'
+FORCE_COLUMN = 'Aksijalna sila (N)'
+VELOCITY_COLUMN = 'Posmicna brzina (mm/s)'
+TEMPERATURE_CH1_COLUMN = 'Temperatura Ch1 (°C)'
+TEMPERATURE_CH2_COLUMN = 'Temperatura Ch2 (°C)'
+STOP_SIGNAL = "False Signal Received"
+BREAKTHROUGH_SIGNAL = "Breakthrough Detected"  # Written by the logger with --detect-breakthrough
+FEED_SIGNAL = "Feed Start"  # Interval drilling phases, written by constant_shear_velocity.py --interval
+PAUSE_SIGNAL = "Pause Start"
+FORCE_THRESHOLD = 0.5  # N, drilling starts at the first force above it
+
+CACHE_DIR = '.run_cache'  # Sidecar parse cache, created next to the CSV files
+CACHE_VERSION = 1
+LRU_SIZE = 32
+
+
+class Run:
+    """Parsed run, every channel as (times, values) without the blank cells of the CSV.
+
+    Channels keep the order of the rows in the file. Run objects are shared
+    through the cache, so callers must not modify the arrays in place.
+    """
+
+    def __init__(self, path, columns, channels, signal_column, event_times, event_texts):
+        self.path = path
+        self.columns = columns
+        self.channels = channels
+        self.signal_column = signal_column
+        self.event_times = event_times
+        self.event_texts = event_texts
+
+    def has(self, column):
+        return column in self.channels
+
+    def times(self, column):
+        return self.channels[column][0]
+
+    def values(self, column):
+        return self.channels[column][1]
+
+    def channel(self, column, until=None):
+        """DataFrame with the time and the values of one channel, up to `until` s if given."""
+        times, values = self.channels[column]
+        if until is not None:
+            mask = times <= until
+            times, values = times[mask], values[mask]
+        return pd.DataFrame({TIME_COLUMN: times, column: values})
+
+    def last_time(self, column):
+        times = self.times(column)
+        return times[-1] if len(times) else None
+
+    def temperature_end(self):
+        """Time of the last row with both Ch1 and Ch2, the plots cut all channels there."""
+        return min(self.last_time(TEMPERATURE_CH1_COLUMN), self.last_time(TEMPERATURE_CH2_COLUMN))
+
+    @property
+    def stop_times(self):
+        return self.event_times[self.event_texts == STOP_SIGNAL]
+
+    @property
+    def breakthrough_time(self):
+        """Time at which the logger's breakthrough detector fired, None if it did not run or fire."""
+        times = self.event_times[self.event_texts == BREAKTHROUGH_SIGNAL]
+        return times[0] if len(times) else None
+
+    @property
+    def feed_times(self):
+        return self.event_times[self.event_texts == FEED_SIGNAL]
+
+    @property
+    def pause_times(self):
+        """Start times of the retract/pause phases of an interval drilling run."""
+        return self.event_times[self.event_texts == PAUSE_SIGNAL]
+
+    @property
+    def stop_time(self):
+        """Time of the first PLC stop signal ("Detekcija proboja"), None if there is none."""
+        stop_times = self.stop_times
+        return stop_times[0] if len(stop_times) else None
+
+
+def run_statistics(run):
+    """Summary values of a run as used by average_values.py, NaN where a run lacks the data."""
+    force_times = run.times(FORCE_COLUMN)
+    force = run.values(FORCE_COLUMN)
+    temperature = run.values(TEMPERATURE_CH1_COLUMN) if run.has(TEMPERATURE_CH1_COLUMN) else np.zeros(0)
+
+    # First force above the threshold, then the first PLC stop signal after it
+    drill_time = np.nan
+    started = force > FORCE_THRESHOLD
+    if started.any():
+        start_time = force_times[started.argmax()]
+        stop_times = run.stop_times
+        stopped = stop_times >= start_time
+        if stopped.any():
+            drill_time = stop_times[stopped.argmax()] - start_time
+
+    initial_temp = max_temp = temp_rise = np.nan
+    if len(temperature):
+        initial_temp = temperature[0]
+        max_temp = temperature.max()
+        temp_rise = max_temp - initial_temp
+
+    return {
+        'max_force': force.max() if len(force) else np.nan,
+        'drill_time': drill_time,
+        'initial_temp': initial_temp,
+        'max_temp': max_temp,
+        'temp_rise': temp_rise,
+    }
+
+
+def clean_column_name(column):
+    # CSVs written as UTF-8 show up as 'Â°C' when read as ISO-8859-1
+    return column.replace('Â°', '°')
+
+
+def parse_csv(path):
+    data = pd.read_csv(path, encoding='ISO-8859-1')
+    data.columns = [clean_column_name(column) for column in data.columns]
+    signal_column = next((column for column in data.columns if column.startswith('Signal')), None)
+
+    times = data[TIME_COLUMN].to_numpy(dtype=float)
+    channels = {}
+    for column in data.columns:
+        if column in (TIME_COLUMN, signal_column):
+            continue
+        values = pd.to_numeric(data[column], errors='coerce').to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        channels[column] = (times[valid], values[valid])
+
+    event_times = np.zeros(0)
+    event_texts = np.zeros(0, dtype=str)
+    if signal_column is not None:
+        signal = data[signal_column]
+        valid = signal.notna().to_numpy()
+        event_times = times[valid]
+        event_texts = signal[valid].astype(str).to_numpy(dtype=str)
+    return Run(path, list(data.columns), channels, signal_column, event_times, event_texts)
+
+
+def parse_binary_run(path):
+    from run_format import RunRecording, ColumnLayout
+
+    recording = RunRecording(path)
+    columns = [clean_column_name(column) for column in recording.header['columns']]
+    layout = ColumnLayout(recording.header['columns'])
+    force = recording['force']
+    channels = {columns[layout.force]: (np.array(force['time']), np.array(force['force']))}
+    if layout.velocity is not None:
+        velocity = recording['velocity']
+        channels[columns[layout.velocity]] = (np.array(velocity['time']), velocity['velocity'].astype(float))
+    temperature = recording['temperature']
+    for i, channel in layout.temperature:
+        values = temperature[f'ch{channel}'].astype(float)
+        valid = ~np.isnan(values)
+        channels[columns[i]] = (np.array(temperature['time'])[valid], values[valid])
+    events = recording['events']
+    names = {int(code): text for code, text in recording.header['events'].items()}
+    event_texts = np.array([names.get(code, '') for code in events['code'].tolist()], dtype=str)
+    return Run(path, columns, channels, columns[layout.event], np.array(events['time']), event_texts)
+
+
+def cache_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, CACHE_DIR, name + '.npz')
+
+
+def cache_key(path, mtime_ns, size):
+    return f'{CACHE_VERSION}|{path}|{mtime_ns}|{size}'
+
+
+def read_cache(path, key):
+    try:
+        with np.load(cache_path(path)) as cached:
+            if str(cached['key']) != key:
+                return None
+            columns = cached['columns'].tolist()
+            channel_columns = cached['channel_columns'].tolist()
+            channels = {column: (cached[f't{i}'], cached[f'v{i}']) for i, column in enumerate(channel_columns)}
+            signal_column = str(cached['signal_column']) or None
+            return Run(path, columns, channels, signal_column, cached['event_times'], cached['event_texts'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def write_cache(path, key, run):
+    arrays = {}
+    for i, (times, values) in enumerate(run.channels.values()):
+        arrays[f't{i}'] = times
+        arrays[f'v{i}'] = values
+    target = cache_path(path)
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Written under a temporary name first, so a parallel reader never sees half a file
+        temporary = f'{target}.{os.getpid()}.tmp.npz'
+        np.savez(temporary, key=key, columns=np.array(run.columns, dtype=str),
+                 channel_columns=np.array(list(run.channels), dtype=str), signal_column=run.signal_column or '',
+                 event_times=run.event_times, event_texts=run.event_texts, **arrays)
+        os.replace(temporary, target)
+    except OSError as e:
+        print(f"Could not write the parse cache for {path}: {e}")
+
+
+@lru_cache(maxsize=LRU_SIZE)
+def load_run_cached(path, mtime_ns, size, disk_cache):
+    if os.path.isdir(path):
+        # Binary runs are memory-mapped already, parsing them is cheap
+        return parse_binary_run(path)
+    key = cache_key(path, mtime_ns, size)
+    run = read_cache(path, key) if disk_cache else None
+    if run is None:
+        run = parse_csv(path)
+        if disk_cache:
+            write_cache(path, key, run)
+    return run
+
+
+def load_run(path, disk_cache=True):
+    """Parsed run of a logger CSV file or .run directory.
+
+    Runs are kept in an in-process LRU cache and, for CSV files, in an NPZ
+    sidecar cache, both keyed by path, modification time and size, so an
+    edited or replaced file is parsed again.
+    """
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        stat = os.stat(os.path.join(path, 'header.json'))
+    else:
+        stat = os.stat(path)
+    return load_run_cached(path, stat.st_mtime_ns, stat.st_size, disk_cache)
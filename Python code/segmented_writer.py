@@ -0,0 +1,203 @@
+import argparse
+import csv
+import io
+import os
+import shutil
+import time
+import zlib
+from csv_writer import BatchedCSVWriter
+
+# Segmented CSV recording (--segment-size / --segment-time), one directory per run while logging:
+#
+#   output_<timestamp>.segments/
+#       segment_00001.csv   column header, rows, footer
+#       segment_00002.csv   ...
+#
+# Every segment is a CSV file with the column header. When the next segment starts, or
+# logging stops, the segment is sealed with the footer line
+#
+#   #segment,<index>,<rows>,<bytes>,<crc32>
+#
+# where bytes and the CRC-32 (8 hex digits) cover everything before the footer, and is
+# fsynced. At stop the segments are stitched into output_<timestamp>.csv and the directory
+# is removed. After a crash, `python segmented_writer.py output_<timestamp>.segments` does
+# the same: sealed segments are taken if their checksum matches, a segment without a footer
+# (the one being written at the crash) up to its last complete row.
+
+SEGMENTS_SUFFIX = '.segments'
+FOOTER_PREFIX = b'#segment,'
+COPY_CHUNK = 1 << 20
+
+
+def segment_name(index):
+    return f'segment_{index:05d}.csv'
+
+
+def fsync_directory(directory):
+    # New directory entries survive a power loss only after the directory is fsynced, not possible on Windows
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SegmentedCSVWriter(BatchedCSVWriter):
+    """BatchedCSVWriter that records a run as checksummed segments.
+
+    A new segment starts once the current one has reached segment_size bytes
+    or has been open for segment_time s, whichever comes first. Only the
+    segment being written can be lost or torn in a crash, the sealed ones are
+    fsynced and verifiable without fsyncing every row.
+    """
+
+    def __init__(self, flush_interval=0.1, batch_size=500, fsync_interval=None, max_pending=100000, segment_size=None,
+                 segment_time=None):
+        super().__init__(flush_interval, batch_size, fsync_interval, max_pending)
+        self.segment_size = segment_size
+        self.segment_time = segment_time
+
+    # The methods below only run on the writer thread
+
+    def open_file(self, path, header, metadata):
+        self.csv_path = path
+        self.directory = os.path.splitext(path)[0] + SEGMENTS_SUFFIX
+        os.makedirs(self.directory, exist_ok=True)
+        self.header = header
+        self.index = 0
+        self.text = io.StringIO()
+        self.text_writer = csv.writer(self.text)
+        self.start_segment()
+
+    def start_segment(self):
+        self.index += 1
+        self.file = open(os.path.join(self.directory, segment_name(self.index)), mode='w', newline='')
+        self.encoding = self.file.encoding
+        self.size = 0
+        self.rows = 0
+        self.crc = 0
+        self.started = time.monotonic()
+        self.write_text([self.header])
+        self.rows = 0
+        fsync_directory(self.directory)
+
+    def write_text(self, rows):
+        self.text.seek(0)
+        self.text.truncate()
+        self.text_writer.writerows(rows)
+        text = self.text.getvalue()
+        data = text.encode(self.encoding)
+        self.file.write(text)
+        self.size += len(data)
+        self.rows += len(rows)
+        self.crc = zlib.crc32(data, self.crc)
+
+    def write_batch(self, batch):
+        self.write_text(batch)
+        if (self.segment_size is not None and self.size >= self.segment_size) or \
+                (self.segment_time is not None and time.monotonic() - self.started >= self.segment_time):
+            self.seal_segment()
+            self.start_segment()
+
+    def seal_segment(self):
+        self.file.write(f'#segment,{self.index},{self.rows},{self.size},{self.crc:08x}\r\n')
+        self.flush(fsync=True)
+        self.file.close()
+
+    def close_file(self):
+        self.seal_segment()
+        stitch(self.directory, self.csv_path)
+        shutil.rmtree(self.directory)
+
+
+def read_footer(path):
+    """(rows, bytes, crc32) of a sealed segment, None if it has no footer."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 256))
+        tail = f.read()
+    start = tail.rfind(FOOTER_PREFIX)
+    if start < 0 or (start > 0 and tail[start - 1:start] != b'\n'):
+        return None
+    fields = tail[start:].strip().split(b',')
+    try:
+        return int(fields[2]), int(fields[3]), int(fields[4], 16)
+    except (IndexError, ValueError):
+        return None
+
+
+def segment_status(path):
+    """How much of a segment is usable: (status, bytes, rows)."""
+    footer = read_footer(path)
+    if footer is not None:
+        rows, size, expected_crc = footer
+        crc = 0
+        with open(path, 'rb') as f:
+            remaining = size
+            while remaining > 0:
+                data = f.read(min(COPY_CHUNK, remaining))
+                if not data:
+                    break
+                crc = zlib.crc32(data, crc)
+                remaining -= len(data)
+        if remaining == 0 and crc == expected_crc:
+            return 'sealed', size, rows
+        return 'corrupt', 0, 0
+    # Segment being written at the crash, or with a torn footer: everything up to the last complete row
+    with open(path, 'rb') as f:
+        data = f.read()
+    size = data.rfind(b'\n') + 1
+    return 'interrupted', size, max(0, data.count(b'\n', 0, size) - 1)
+
+
+def stitch(directory, csv_path=None):
+    """Join the usable segments of a run into one CSV file, return (CSV path, [(segment, status, rows)])."""
+    if csv_path is None:
+        csv_path = directory.rstrip(os.sep)[:-len(SEGMENTS_SUFFIX)] + '.csv'
+    names = sorted(name for name in os.listdir(directory) if name.startswith('segment_') and name.endswith('.csv'))
+    report = []
+    header = None
+    temporary = csv_path + '.tmp'
+    with open(temporary, 'wb') as output:
+        for name in names:
+            path = os.path.join(directory, name)
+            status, size, rows = segment_status(path)
+            report.append((name, status, rows))
+            if not size:
+                continue
+            with open(path, 'rb') as f:
+                segment_header = f.readline()
+                if header is None:
+                    header = segment_header
+                    output.write(header)
+                elif segment_header != header:
+                    report[-1] = (name, 'different header', 0)
+                    continue
+                remaining = size - len(segment_header)
+                while remaining > 0:
+                    data = f.read(min(COPY_CHUNK, remaining))
+                    if not data:
+                        break
+                    output.write(data)
+                    remaining -= len(data)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temporary, csv_path)
+    return csv_path, report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recover interrupted segmented runs: stitch their valid segments into one CSV file.")
+    parser.add_argument('runs', nargs='+', help="output_<timestamp>.segments directories")
+    parser.add_argument('--keep', action='store_true', help="Keep the segments after stitching")
+    args = parser.parse_args()
+
+    for directory in args.runs:
+        csv_path, report = stitch(directory)
+        for name, status, rows in report:
+            print(f"  {name}: {status}, {rows} rows")
+        print(f"{directory} -> {csv_path}: {sum(rows for name, status, rows in report)} rows")
+        if not args.keep and all(status in ('sealed', 'interrupted') for name, status, rows in report):
+            shutil.rmtree(directory)
@@ -0,0 +1,275 @@
+import argparse
+import math
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from run_format import FORCE_DTYPE, VELOCITY_DTYPE, EVENT_DTYPE, EVENTS, temperature_dtype
+
+# Shared memory ring buffers of a logger run (--shared-ring), for reader processes:
+#
+#   offset     size
+#   0          64          header: magic b'DRLRING1', version <u4, temperature channel mask <u4 (bit N = ChN),
+#                          run <u8 (incremented at every start signal), start_time <f8 (of that signal, NaN before)
+#   64         4 * 64      one descriptor per ring (force, velocity, temperature, events):
+#                          capacity <u8, written <u8 (records written since the logger started), offset <u8
+#   offset     capacity *  records of the ring, record number n is at index n % capacity,
+#              itemsize    dtypes as in run_format.py (temperature: ch<N> <f4 per channel in the mask)
+#
+# All values are little-endian, times are time.time() seconds (subtract start_time for run time).
+# Every ring has one writer, the logger (or with --multiprocess the process producing that
+# channel, see multiprocess_engine.py). It copies new records into their slots first and then
+# stores the new `written` count, a single aligned 8-byte store. A reader takes `written`,
+# copies the slots it wants and reads `written` again: records numbered below
+# written - capacity may have been overwritten during the copy and are dropped. The x86
+# store order of the lab PC keeps the records visible before the count.
+
+SHARED_RING_NAME = 'drilling_logger'
+MAGIC = b'DRLRING1'
+VERSION = 1
+RINGS = ('force', 'velocity', 'temperature', 'events')
+CAPACITIES = {'force': 1 << 17, 'velocity': 1 << 14, 'temperature': 1 << 12, 'events': 256}  # About 2 min of force at 1 kHz
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('temperature_mask', '<u4'), ('run', '<u8'), ('start_time', '<f8'),
+                         ('reserved', 'V32')])
+DESCRIPTOR_DTYPE = np.dtype([('capacity', '<u8'), ('written', '<u8'), ('offset', '<u8'), ('reserved', 'V40')])
+
+
+def record_dtypes(temperature_channels):
+    return {'force': FORCE_DTYPE, 'velocity': VELOCITY_DTYPE, 'temperature': temperature_dtype(temperature_channels), 'events': EVENT_DTYPE}
+
+
+def temperature_records(batch, channels):
+    """Temperature ring records of readings by timestamp, as logged by log_temperature_sample."""
+    return [(timestamp,) + tuple(readings.get(channel, math.nan) for channel in channels) for timestamp, readings in batch.items()]
+
+
+class SharedRing:
+    """The shared memory block, created by the logger (create=True) or attached by a reader.
+
+    rings[name] is a NumPy record array directly on the shared memory, so a
+    reader maps it without copying; read_since() returns a validated copy.
+    """
+
+    def __init__(self, name=SHARED_RING_NAME, create=False, temperature_channels=(1, 2), capacities=None):
+        self.name = name
+        self.create = create
+        if create:
+            capacities = {**CAPACITIES, **(capacities or {})}
+            dtypes = record_dtypes(temperature_channels)
+            offset = HEADER_DTYPE.itemsize + DESCRIPTOR_DTYPE.itemsize * len(RINGS)
+            offsets = {}
+            for ring in RINGS:
+                offsets[ring] = offset
+                offset += -(-capacities[ring] * dtypes[ring].itemsize // 64) * 64
+            self.memory = self.create_memory(name, offset)
+            self.map()
+            self.header['magic'] = MAGIC
+            self.header['version'] = VERSION
+            self.header['temperature_mask'] = sum(1 << channel for channel in temperature_channels)
+            self.header['start_time'] = math.nan
+            for ring in RINGS:
+                self.descriptors[ring]['capacity'] = capacities[ring]
+                self.descriptors[ring]['offset'] = offsets[ring]
+        else:
+            self.memory = self.attach_memory(name)
+            self.map()
+            if bytes(self.header['magic']) != MAGIC or int(self.header['version']) != VERSION:
+                raise ValueError(f"Shared memory {name} is not a logger ring buffer")
+        mask = int(self.header['temperature_mask'])
+        self.temperature_channels = [channel for channel in range(1, 9) if mask & (1 << channel)]
+        dtypes = record_dtypes(self.temperature_channels)
+        self.rings = {ring: np.ndarray(int(self.descriptors[ring]['capacity']), dtype=dtypes[ring], buffer=self.memory.buf,
+                                       offset=int(self.descriptors[ring]['offset'])) for ring in RINGS}
+
+    @staticmethod
+    def create_memory(name, size):
+        try:
+            return shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a logger that was killed
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            return shared_memory.SharedMemory(name, create=True, size=size)
+
+    @staticmethod
+    def attach_memory(name):
+        try:
+            return shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+        except TypeError:
+            memory = shared_memory.SharedMemory(name)
+            if os.name != 'nt':
+                # Otherwise the reader's resource tracker removes the logger's block when the reader exits
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(memory._name, 'shared_memory')
+            return memory
+
+    def __reduce__(self):
+        # Processes started with spawn (--multiprocess on Windows) attach to the block by name
+        return SharedRing, (self.name,)
+
+    def map(self):
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.memory.buf)
+        descriptors = np.ndarray(len(RINGS), dtype=DESCRIPTOR_DTYPE, buffer=self.memory.buf, offset=HEADER_DTYPE.itemsize)
+        self.descriptors = {ring: descriptors[i] for i, ring in enumerate(RINGS)}
+
+    @property
+    def run(self):
+        return int(self.header['run'])
+
+    @property
+    def start_time(self):
+        return float(self.header['start_time'])
+
+    def written(self, ring):
+        return int(self.descriptors[ring]['written'])
+
+    def append(self, ring, records):
+        """Writer only: add records (tuples in the ring's dtype) and publish them."""
+        if not len(records):
+            return
+        records = np.asarray(records, dtype=self.rings[ring].dtype)
+        buffer = self.rings[ring]
+        capacity = len(buffer)
+        written = self.written(ring)
+        # Of a batch larger than the ring only the tail fits, the records before it count as overwritten
+        skipped = max(0, len(records) - capacity)
+        kept = records[skipped:]
+        start = (written + skipped) % capacity
+        first = min(len(kept), capacity - start)
+        buffer[start:start + first] = kept[:first]
+        buffer[:len(kept) - first] = kept[first:]
+        self.descriptors[ring]['written'] = written + len(records)
+
+    def start_run(self, start_time):
+        self.header['start_time'] = start_time
+        self.header['run'] = self.run + 1
+
+    def read_since(self, ring, seq):
+        """Records numbered seq and later as a copy, and the number to continue from.
+
+        Records that were overwritten before or during the copy are skipped,
+        written - seq - len(records) of them.
+        """
+        buffer = self.rings[ring]
+        capacity = len(buffer)
+        written = self.written(ring)
+        start = max(seq, written - capacity, 0)
+        indices = np.arange(start, written) % capacity
+        records = buffer[indices]  # Fancy indexing copies
+        # Slots the writer may have reused while they were copied
+        overwritten = max(0, self.written(ring) - capacity - start)
+        return records[overwritten:], written
+
+    def latest(self, ring, count=1):
+        records, written = self.read_since(ring, self.written(ring) - count)
+        return records
+
+    def close(self):
+        # The record arrays must go before the memory they point into
+        self.rings = self.descriptors = self.header = None
+        self.memory.close()
+        if self.create:
+            self.memory.unlink()
+
+
+class RingPublisher:
+    """Logger side of the shared ring (--shared-ring), same taps as LiveFeed.
+
+    Force samples are copied from force_buffer by a thread that wakes up on
+    every new sample, velocity, temperature and event records are written
+    directly by the logger threads that produce them. With --multiprocess
+    every ring has its writer in another process, so a publisher is given
+    the ring and only the rings it writes; taps for the others are ignored.
+    """
+
+    def __init__(self, force_buffer, name=SHARED_RING_NAME, temperature_channels=(1, 2), ring=None, rings=RINGS):
+        self.force_buffer = force_buffer
+        self.owner = ring is None
+        self.ring = SharedRing(name, create=True, temperature_channels=temperature_channels) if ring is None else ring
+        self.rings = rings
+        self.lock = threading.Lock()  # The ring has one writer, the taps run on several threads
+        self.running = False
+        self.thread = threading.Thread(target=self.run, name='shared-ring', daemon=True)
+
+    def start(self):
+        self.running = True
+        if 'force' in self.rings:
+            self.thread.start()
+        if self.owner:
+            print(f"Shared memory ring buffer: {self.ring.name}")
+
+    def stop(self):
+        with self.lock:
+            self.running = False  # Taps called after this are ignored
+        if self.thread.is_alive():
+            self.thread.join(timeout=1)
+        if self.owner:
+            self.ring.close()
+
+    def append(self, ring, records):
+        with self.lock:
+            if self.running and ring in self.rings:
+                self.ring.append(ring, records)
+
+    def run(self):
+        next_seq = self.force_buffer.next_seq
+        while self.running:
+            samples, next_seq = self.force_buffer.read_since(next_seq)
+            if samples:
+                self.append('force', [(timestamp, force) for timestamp, force, seq in samples])
+            self.force_buffer.wait_for(next_seq, timeout=0.1)
+
+    def start_run(self, start_time):
+        with self.lock:
+            if self.running and 'events' in self.rings:
+                self.ring.start_run(start_time)
+
+    def add_velocity(self, timestamps, values):
+        self.append('velocity', list(zip(timestamps, values)))
+
+    def add_temperatures(self, batch):
+        """Readings by timestamp, as logged by log_temperature_sample."""
+        self.append('temperature', temperature_records(batch, self.ring.temperature_channels))
+
+    def add_event(self, timestamp, text):
+        codes = {event_text: code for code, event_text in EVENTS.items()}
+        self.append('events', [(timestamp, codes.get(text, 0))])
+
+
+def monitor(name=SHARED_RING_NAME, interval=1.0):
+    """Example reader process: rates and newest values of a running logger, once per interval."""
+    ring = SharedRing(name)
+    print(f"Attached to {name}, temperature channels {ring.temperature_channels}")
+    seqs = {ring_name: ring.written(ring_name) for ring_name in RINGS}
+    try:
+        while True:
+            time.sleep(interval)
+            counts = {}
+            for ring_name in RINGS:
+                records, seqs[ring_name] = ring.read_since(ring_name, seqs[ring_name])
+                counts[ring_name] = len(records)
+            force = ring.latest('force')
+            temperature = ring.latest('temperature')
+            line = f"run {ring.run}: force {counts['force'] / interval:.0f} Hz"
+            if len(force):
+                line += f", {force['force'][0]:.2f} N, {(time.time() - force['time'][0]) * 1000:.1f} ms old"
+            line += f", velocity {counts['velocity'] / interval:.0f} Hz"
+            if len(temperature):
+                line += ', ' + ', '.join(f"Ch{channel} {temperature[f'ch{channel}'][0]:.1f} °C" for channel in ring.temperature_channels)
+            for timestamp, code in ring.latest('events', counts['events']).tolist():
+                line += f", {EVENTS.get(code, code)} at {timestamp - ring.start_time:.2f} s"
+            print(line)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show the live data of a logger started with --shared-ring, from a separate process.")
+    parser.add_argument('name', nargs='?', default=SHARED_RING_NAME, help="Name of the shared memory block")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between lines")
+    args = parser.parse_args()
+    monitor(args.name, args.interval)
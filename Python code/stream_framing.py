@@ -0,0 +1,49 @@
+import time
+import numpy as np
+
+
+class FloatFrameReader:
+    """Splits a TCP byte stream into 4-byte big-endian floats.
+
+    TCP may coalesce several values into one segment or split a value across
+    two, so everything available is read into a reusable buffer, all complete
+    frames are decoded in one batch and leftover bytes are kept for the next
+    read.
+    """
+
+    FRAME_SIZE = 4
+
+    def __init__(self, buffer_size=4096):
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.pending = 0  # Bytes of an incomplete frame at the start of the buffer
+
+    def recv_from(self, sock):
+        """Read what the socket has and return (timestamps, values) of complete frames."""
+        nbytes = sock.recv_into(self.view[self.pending:])
+        if nbytes == 0:
+            raise ConnectionError("Connection closed by the PLC")
+        return self.decode(nbytes, time.time())
+
+    def feed(self, data):
+        """Same as recv_from for bytes that were already read, e.g. by an asyncio stream."""
+        timestamps, values = [], []
+        received_time = time.time()
+        data = memoryview(data)
+        while len(data):
+            chunk = min(len(data), len(self.buffer) - self.pending)
+            self.view[self.pending:self.pending + chunk] = data[:chunk]
+            data = data[chunk:]
+            chunk_timestamps, chunk_values = self.decode(chunk, received_time)
+            timestamps.extend(chunk_timestamps)
+            values.extend(chunk_values)
+        return timestamps, values
+
+    def decode(self, nbytes, received_time):
+        total = self.pending + nbytes
+        count = total // self.FRAME_SIZE
+        values = np.frombuffer(self.buffer, dtype='>f4', count=count).astype(np.float64).tolist()
+        leftover = total - count * self.FRAME_SIZE
+        self.buffer[:leftover] = self.buffer[count * self.FRAME_SIZE:total]
+        self.pending = leftover
+        return [received_time] * count, values
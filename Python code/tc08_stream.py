@@ -0,0 +1,74 @@
+import ctypes
+import math
+import time
+from picosdk.usbtc08 import usbtc08 as tc08
+from picosdk.functions import assert_pico2000_ok
+
+CHANNELS = range(1, 9)  # Thermocouple inputs of the TC-08, channel 0 is the cold junction
+
+
+class TC08Stream:
+    """Streaming mode of the USB TC-08 (usb_tc08_run + usb_tc08_get_temp).
+
+    The device samples all enabled channels on its own clock and buffers the
+    readings, so every read returns a batch per channel together with the
+    device's sample times instead of a single blocking conversion. Buffers are
+    allocated once and reused.
+    """
+
+    def __init__(self, handle, channels=(1, 2), interval_ms=None, buffer_length=600):
+        for channel in channels:
+            if channel not in CHANNELS:
+                raise ValueError(f"Invalid TC-08 channel: {channel}")
+        self.handle = handle
+        self.channels = list(channels)
+        self.interval_ms = interval_ms
+        self.buffer_length = buffer_length
+        self.temp_buffers = {channel: (ctypes.c_float * buffer_length)() for channel in self.channels}
+        self.times_buffers = {channel: (ctypes.c_int32 * buffer_length)() for channel in self.channels}
+        self.overflow = ctypes.c_int16(0)
+        self.units = tc08.USBTC08_UNITS["USBTC08_UNITS_CENTIGRADE"]
+        self.run_start = None
+        self.overflows = {channel: 0 for channel in self.channels}
+
+    def start(self):
+        minimum_interval = tc08.usb_tc08_get_minimum_interval_ms(self.handle)
+        assert_pico2000_ok(minimum_interval)
+        interval = max(self.interval_ms or minimum_interval, minimum_interval)
+        actual_interval = tc08.usb_tc08_run(self.handle, interval)
+        assert_pico2000_ok(actual_interval)
+        # Device sample times are ms since usb_tc08_run
+        self.run_start = time.time()
+        self.interval_ms = actual_interval
+        print(f"TC-08 streaming started, sample interval {actual_interval} ms")
+
+    def stop(self):
+        tc08.usb_tc08_stop(self.handle)
+        overflowed = {channel: count for channel, count in self.overflows.items() if count}
+        if overflowed:
+            print(f"TC-08 overflow (readings logged as NaN), batches per channel: {overflowed}")
+
+    def read(self):
+        """Return {time: {channel: temperature}} of all readings buffered since the last read.
+
+        Times are wall-clock seconds reconstructed from the device sample times.
+        The overflow bits of usb_tc08_get_temp cover the whole batch of a
+        channel, so a channel that overflowed reads NaN for that batch and is
+        counted in overflows.
+        """
+        readings = {}
+        for channel in self.channels:
+            count = tc08.usb_tc08_get_temp(self.handle, ctypes.byref(self.temp_buffers[channel]),
+                                           ctypes.byref(self.times_buffers[channel]), self.buffer_length,
+                                           ctypes.byref(self.overflow), channel, self.units, 0)
+            if count < 0:
+                raise Exception(f"usb_tc08_get_temp failed on channel {channel}")
+            temps = self.temp_buffers[channel]
+            times = self.times_buffers[channel]
+            # Bit n of overflow is channel n, bit 0 the cold junction
+            overflowed = count > 0 and bool(self.overflow.value & (1 << channel))
+            if overflowed:
+                self.overflows[channel] += 1
+            for i in range(count):
+                readings.setdefault(self.run_start + times[i] / 1000, {})[channel] = math.nan if overflowed else temps[i]
+        return dict(sorted(readings.items()))
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from interval_analysis import interval_statistics
+from run_loader import TIME_COLUMN, FORCE_COLUMN, TEMPERATURE_CH1_COLUMN, FEED_SIGNAL, PAUSE_SIGNAL, STOP_SIGNAL
+
+FEED_FORCE = 30.0  # N
+FEEDS = (1.0, 3.0, 5.0)  # s, 1 s feed and 1 s pause after the approach, the PLC stops during the last feed
+STOP_TIME = 6.0
+END_TIME = 9.0  # s, end of the post-stop tail
+
+
+def write_run(path, phase_words):
+    """Interval drilling run as constant_shear_velocity.py --interval logs it, with or without the PLC phase words."""
+    force_times = np.arange(0, END_TIME, 0.01)
+    feeding = np.zeros(len(force_times), dtype=bool)
+    for start in FEEDS:
+        feeding |= (force_times >= start) & (force_times < min(start + 1, STOP_TIME))
+    forces = np.where(feeding, FEED_FORCE, 0.0)
+    temperature_times = np.arange(0, END_TIME, 0.1)
+    # Heats 5 °C/s while feeding, cools 2 °C/s otherwise
+    temperatures = 25 + np.cumsum(np.where(np.interp(temperature_times, force_times, feeding.astype(float)) > 0.5, 0.5, -0.2))
+
+    rows = [(t, force, np.nan, '') for t, force in zip(force_times, forces)]
+    rows += [(t, np.nan, temperature, '') for t, temperature in zip(temperature_times, temperatures)]
+    rows.append((STOP_TIME, np.nan, np.nan, STOP_SIGNAL))
+    if phase_words:
+        rows += [(start, np.nan, np.nan, FEED_SIGNAL) for start in FEEDS]
+        rows += [(start + 1, np.nan, np.nan, PAUSE_SIGNAL) for start in FEEDS if start + 1 < STOP_TIME]
+    rows.sort(key=lambda row: row[0])
+    pd.DataFrame(rows, columns=[TIME_COLUMN, FORCE_COLUMN, TEMPERATURE_CH1_COLUMN, 'Signal OFF Received']) \
+        .to_csv(path, index=False, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('phase_words', [True, False], ids=['phase words', 'force detection'])
+def test_stop_signal_ends_last_feed(tmp_path, phase_words):
+    intervals = pd.DataFrame(interval_statistics(write_run(tmp_path / 'output_run.csv', phase_words)))
+
+    assert len(intervals) == len(FEEDS)
+    np.testing.assert_allclose(intervals['feed_time'], 1.0, atol=0.02)
+    np.testing.assert_allclose(intervals['mean_force'], FEED_FORCE, rtol=0.02)
+    np.testing.assert_allclose(intervals['pause_time'], [1.0, 1.0, END_TIME - STOP_TIME], atol=0.02)
+    np.testing.assert_allclose(intervals['cooling_rate'], 2.0, rtol=0.1)
+
+
+def test_phase_words_match_force_detection(tmp_path):
+    from_words = pd.DataFrame(interval_statistics(write_run(tmp_path / 'words.csv', True)))
+    from_force = pd.DataFrame(interval_statistics(write_run(tmp_path / 'force.csv', False)))
+
+    columns = ['feed_time', 'peak_force', 'mean_force', 'pause_time', 'cooling_rate']
+    np.testing.assert_allclose(from_words[columns], from_force[columns], atol=0.02)